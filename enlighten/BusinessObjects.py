@@ -3,6 +3,7 @@ import logging
 log = logging.getLogger(__name__)
 
 from enlighten.data.ModelInfoFeature import ModelInfoFeature
+from enlighten.device.AcquisitionFeature import AcquisitionFeature
 from enlighten.device.AccessoryControlXLFeature import AccessoryControlXLFeature
 from enlighten.device.AccessoryControlXSFeature import AccessoryControlXSFeature
 from enlighten.device.AmbientTemperatureFeature import AmbientTemperatureFeature
@@ -19,10 +20,12 @@ from enlighten.device.LaserTemperatureFeature import LaserTemperatureFeature
 from enlighten.device.LaserWatchdogFeature import LaserWatchdogFeature
 from enlighten.device.MultispecFeature import MultispecFeature
 from enlighten.factory.DFUFeature import DFUFeature
+from enlighten.factory.StageTimingFeature import StageTimingFeature
 from enlighten.factory.StripChartsFeature import StripChartsFeature
 from enlighten.file_io.ConfigurationFeature import ConfigurationFeature
 from enlighten.file_io.FileManagerFeature import FileManagerFeature
 from enlighten.file_io.LoggingFeature import LoggingFeature
+from enlighten.measurement.AnalysisCaptureFeature import AnalysisCaptureFeature
 from enlighten.measurement.AreaScanFeature import AreaScanFeature
 from enlighten.measurement.BatchCollectionFeature import BatchCollectionFeature
 from enlighten.measurement.MeasurementFactory import MeasurementFactory
@@ -34,15 +37,19 @@ from enlighten.Plugins.PluginControllerFeature import PluginControllerFeature
 from enlighten.post_processing.AbsorbanceFeature import AbsorbanceFeature
 from enlighten.post_processing.AutoRamanFeature import AutoRamanFeature
 from enlighten.post_processing.BaselineCorrectionFeature import BaselineCorrectionFeature
+from enlighten.post_processing.BatchProcessingFeature import BatchProcessingFeature
 from enlighten.post_processing.BoxcarFeature import BoxcarFeature
 from enlighten.post_processing.DalaiRamanFeature import DalaiRamanFeature
 from enlighten.post_processing.DarkFeature import DarkFeature
+from enlighten.post_processing.DespikingFeature import DespikingFeature
 from enlighten.post_processing.ElectricalDarkCorrectionFeature import ElectricalDarkCorrectionFeature
 from enlighten.post_processing.EtalonCorrectionFeature import EtalonCorrectionFeature
 from enlighten.post_processing.HorizROIFeature import HorizROIFeature
 from enlighten.post_processing.InGaAsCorrectionFeature import InGaAsCorrectionFeature
 from enlighten.post_processing.InterpolationFeature import InterpolationFeature
 from enlighten.post_processing.LibraryMatchingFeature import LibraryMatchingFeature
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+from enlighten.post_processing.ProcessingPipelineFeature import ProcessingPipelineFeature
 from enlighten.post_processing.RamanIntensityCorrectionFeature import RamanIntensityCorrectionFeature
 from enlighten.post_processing.ReferenceFeature import ReferenceFeature
 from enlighten.post_processing.RichardsonLucyFeature import RichardsonLucyFeature
@@ -54,6 +61,7 @@ from enlighten.scope.GraphFeature import GraphFeature
 from enlighten.scope.GridFeature import GridFeature
 from enlighten.scope.PresetFeature import PresetFeature
 from enlighten.scope.RamanShiftCorrectionFeature import RamanShiftCorrectionFeature
+from enlighten.scope.RenderSchedulerFeature import RenderSchedulerFeature
 from enlighten.scope.ScopeTableFeature import ScopeTableFeature
 from enlighten.ui.AuthenticationFeature import AuthenticationFeature
 from enlighten.ui.ClipboardFeature import ClipboardFeature
@@ -93,12 +101,15 @@ class BusinessObjects:
 
         ctl.absorbance = None
         ctl.accessory_control_xl = None
+        ctl.acquisition = None
         ctl.accessory_control_xs = None
+        ctl.analysis_capture = None
         ctl.area_scan = None
         ctl.authentication = None
         ctl.auto_raman = None
         ctl.baseline_correction = None
         ctl.batch_collection = None
+        ctl.batch_processing = None
         ctl.battery_feature = None
         ctl.ble_manager = None
         ctl.boxcar = None
@@ -108,6 +119,7 @@ class BusinessObjects:
         ctl.config = None
         ctl.cursor = None
         ctl.dark_feature = None
+        ctl.despiking = None
         ctl.detector_temperature = None
         ctl.eeprom_editor = None
         ctl.eeprom_writer = None
@@ -141,14 +153,18 @@ class BusinessObjects:
         ctl.multispec = None
         ctl.page_nav = None
         ctl.plugin_controller = None
+        ctl.processing_engine = None
+        ctl.processing_pipeline = None
         ctl.raman_intensity_correction = None
         ctl.raman_shift_correction = None
         ctl.reference_feature = None
+        ctl.render_scheduler = None
         ctl.resource_monitor = None
         ctl.richardson_lucy = None
         ctl.save_options = None
         ctl.scan_averaging = None
         ctl.sounds = None
+        ctl.stage_timing = None
         ctl.status_bar = None
         ctl.status_indicators = None
         ctl.strip_charts = None
@@ -183,6 +199,7 @@ class BusinessObjects:
         """
         ctl = self.ctl
 
+        ctl.processing_engine           = ProcessingEngine()
         ctl.resource_monitor            = ResourceMonitorFeature(ctl)
         ctl.focus_listener              = FocusListener(ctl)
         ctl.model_info                  = ModelInfoFeature(ctl)
@@ -191,12 +208,14 @@ class BusinessObjects:
         ctl.clipboard                   = ClipboardFeature(ctl)
         ctl.guide                       = GuideFeature(ctl)
 
+        ctl.render_scheduler            = RenderSchedulerFeature(ctl)
         ctl.graph                       = GraphFeature(ctl)
         ctl.alt_graph                   = GraphFeature(ctl, alt=True)
 
         ctl.cursor                      = CursorFeature(ctl)
         ctl.image_resources             = ImageResources()
         ctl.multispec                   = MultispecFeature(ctl)
+        ctl.acquisition                 = AcquisitionFeature(ctl)
         ctl.save_options                = SaveOptionsFeature(ctl)
         ctl.strip_charts                = StripChartsFeature(ctl)
         ctl.battery_feature             = BatteryFeature(ctl)
@@ -226,6 +245,7 @@ class BusinessObjects:
 
         ctl.baseline_correction         = BaselineCorrectionFeature(ctl)
         ctl.dark_feature                = DarkFeature(ctl)
+        ctl.despiking                   = DespikingFeature(ctl)
         ctl.edc                         = ElectricalDarkCorrectionFeature(ctl)
         ctl.reference_feature           = ReferenceFeature(ctl)
         ctl.raman_intensity_correction  = RamanIntensityCorrectionFeature(ctl)
@@ -255,6 +275,10 @@ class BusinessObjects:
         ctl.library_matching            = LibraryMatchingFeature(ctl)
         ctl.dalai                       = DalaiRamanFeature(ctl)
         ctl.correction_status           = CorrectionStatusFeature(ctl)
+        ctl.analysis_capture            = AnalysisCaptureFeature(ctl)
+        ctl.processing_pipeline         = ProcessingPipelineFeature(ctl)
+        ctl.batch_processing            = BatchProcessingFeature(ctl)
+        ctl.stage_timing                = StageTimingFeature(ctl)
 
     def destroy(self):
         log.info("destroying business objects")
@@ -266,7 +290,12 @@ class BusinessObjects:
         # anything with timers, observers etc
         for feature in [ self.ctl.marquee, 
                          self.ctl.guide,
-                         self.ctl.library_matching ]:
+                         self.ctl.library_matching,
+                         self.ctl.analysis_capture,
+                         self.ctl.baseline_correction,
+                         self.ctl.processing_pipeline,
+                         self.ctl.render_scheduler,
+                         self.ctl.stage_timing ]:
             feature.stop()
 
         log.info("done destroying business objects")
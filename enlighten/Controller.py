@@ -34,6 +34,7 @@ from enlighten import util
 from enlighten import common
 
 from enlighten.device.Spectrometer import Spectrometer
+from enlighten.post_processing.ProcessingEngine import ProcessingOptions
 from enlighten.ui.ThumbnailWidget import ThumbnailWidget
 from enlighten.ui.TimeoutDialog import TimeoutDialog
 from enlighten.EnlightenFeature import EnlightenFeature
@@ -624,6 +625,9 @@ class Controller:
         log.debug(f"connect_new: instantiating WasatchDeviceWrapper with {new_device_id}")
         wdw = WasatchDeviceWrapper(device_id=new_device_id, log_level=self.log_level, safe_mode=self.safe_mode)
 
+        # allow the wrapper to notify us when new Readings arrive
+        self.acquisition.attach(wdw)
+
         # flag that an attempt to connect to the WasatchDeviceWrapper is ongoing
         self.header(f"connect_new: setting in-process {new_device_id}")
         self.multispec.set_in_process(new_device_id, wdw)
@@ -1143,6 +1147,7 @@ class Controller:
         make_shortcut("Ctrl+T", self.integration_time_feature.set_focus)
         make_shortcut("Ctrl+X", self.page_nav.toggle_expert)
 
+        make_shortcut("Ctrl+Shift+A", self.analysis_capture.toggle_callback)
         make_shortcut("Ctrl+Shift+D", self.dalai.toggle_callback)
         make_shortcut("Ctrl+Shift+S", self.measurements.export_session)
 
@@ -1248,7 +1253,7 @@ class Controller:
         """ Create and start the timer to tick our event loop. """
         log.debug("Setup main event loops")
 
-        # @todo eventually move to AcquisitionFeature?
+        # @todo eventually move to AcquisitionFeature
         self.acquisition_timer = QtCore.QTimer()
         self.acquisition_timer.setSingleShot(True)
         self.acquisition_timer.timeout.connect(self.tick_acquisition)
@@ -1287,17 +1292,32 @@ class Controller:
         each new polling cycle 100ms after the last one finished, and it's 
         possible that some cycles (especially if using blocking plugins) may take
         many milliseconds to complete.
+
+        If AcquisitionFeature's event-driven mode is enabled, each spectrometer
+        signals the GUI thread when a new Reading arrives, and attempt_reading
+        is called from there instead. This timer then continues at a slower 
+        rate as a fallback (timeouts etc).
+
+        Whether only the latest Reading is processed (the default) or queued
+        Readings are processed in turn is determined by AcquisitionFeature's
+        backpressure policy.
         """
         if self.shutting_down:
             return
 
-        # poll all spectrometer threads for SPECTRA
-        for spec in self.multispec.get_spectrometers():
-            if not spec.app_state.hidden:
-                self.attempt_reading(spec)
+        # poll all spectrometer threads for SPECTRA (Readings from multiple 
+        # spectrometers may be post-processed together by BatchProcessingFeature)
+        self.batch_processing.begin()
+        try:
+            for spec in self.multispec.get_spectrometers():
+                if not spec.app_state.hidden:
+                    self.acquisition.service(spec)
+        finally:
+            self.batch_processing.flush()
 
         if not self.shutting_down:
-            self.acquisition_timer.start(self.ACQUISITION_TIMER_SLEEP_MS + (50 * (self.multispec.count() - 1)))
+            sleep_ms = self.ACQUISITION_TIMER_SLEEP_MS + (50 * (self.multispec.count() - 1))
+            self.acquisition_timer.start(self.acquisition.get_timer_sleep_ms(sleep_ms))
 
     def tick_status(self):
         if self.shutting_down:
@@ -1570,6 +1590,7 @@ class Controller:
         Poll the spectrometer thread (WasatchDeviceWrapper) for a 
         SpectrometerResponse.
         
+        @see AcquisitionFeature.acquire_data
         @see wasatch.WasatchDeviceWrapper.acquire_data
         @see wasatch.WasatchDevice.acquire_data
         
@@ -1593,7 +1614,7 @@ class Controller:
         device_id = spec.device_id
 
         try:
-            spectrometer_response = device.acquire_data() # wasatch.SpectrometerResponse
+            spectrometer_response = self.acquisition.acquire_data(spec) # wasatch.SpectrometerResponse
 
             if spectrometer_response.poison_pill:
                 log.error(f"acquire_reading: received poison-pill from spectrometer: {spectrometer_response}") # disposition AFTER displaying user message
@@ -1796,9 +1817,11 @@ class Controller:
             ref      = pr.reference,
             settings = settings)
 
-    def process_reading(self, reading, spec=None, dark=None, ref=None, settings=None):
+    def process_reading(self, reading, spec=None, dark=None, ref=None, settings=None, capture=False):
         """
-        @todo split into "update graphs" and "post-processing"
+        This has been split into "post-processing" (post_process_reading) and
+        "update graphs" (render_processed_reading), so that the former can 
+        optionally be run on a worker thread (see ProcessingPipelineFeature).
         
         Requested order of operations, per Michael Matthews:
         
@@ -1833,6 +1856,14 @@ class Controller:
         - perform processing
         - post-process
         - apply business logic
+
+        @par Analysis Capture
+
+        If capture is True, the Reading is being processed by 
+        AnalysisCaptureFeature, which processes every Reading rather than just
+        the latest. Only the post-processing chain is applied (through 
+        interpolation), and the ProcessedReading is returned without graphing,
+        DALAI, plugins, library matching or other UI side-effects.
         """
 
         if settings is None:
@@ -1858,23 +1889,90 @@ class Controller:
             app_state = spec.app_state
             selected = self.multispec.is_selected(spec.device_id)
 
+        # software scan averaging (live Readings only)
+        if not (reprocessing or capture):
+            reading = self.scan_averaging.process(reading, spec)
+
         # don't graph incomplete averages
-        if self.scan_averaging.enabled(spec) and not reading.averaged:
+        if self.scan_averaging.is_partial(spec, reading):
             log.debug("process_reading: scan averaging enabled but reading isn't averaged")
             return
 
         # graph the raw spectrum in the Scope Setup "live" window if nothing else
         # MZ: I don't think that graph normally includes an x-axis, so no reason to generate it
-        if selected:
+        if selected and not capture:
             # x_axis = self.generate_x_axis(settings=settings)
             # self.set_curve_data(self.graph.live_curve, x=x_axis, y=reading.spectrum, label="process_reading[live]")
             self.set_curve_data(self.graph.live_curve, y=reading.spectrum, label="process_reading[live]")
 
+        # Resolve dark and reference here on the GUI thread, so post-processing
+        # has a consistent snapshot even if run in the background. The stored
+        # dark and reference are read-only, so are shared rather than copied.
+        best_dark = dark                # use explicitly passed dark if given
+        if best_dark is None:
+            best_dark = reading.dark    # otherwise, what comes with Reading
+        if best_dark is None and app_state is not None:
+            best_dark = app_state.dark  # otherwise, what has been stored
+
+        if app_state and app_state.reference is not None:
+            best_ref = app_state.reference
+        elif ref is not None:
+            best_ref = np.copy(ref)
+        else:
+            best_ref = None
+
+        # Live spectra may be post-processed on a worker thread, in which case
+        # ProcessingPipelineFeature will call render_processed_reading when done,
+        # or batched with other spectrometers' Readings from the same acquisition
+        # tick, in which case BatchProcessingFeature will.
+        if not (reprocessing or capture):
+            if self.processing_pipeline.submit(reading, spec, settings, dark=best_dark, ref=best_ref):
+                return
+            if self.batch_processing.defer(reading, spec, settings, dark=best_dark, ref=best_ref):
+                return
+
+        pr = self.post_process_reading(reading, spec, settings, dark=best_dark, ref=best_ref, capture=capture)
+
+        # AnalysisCapture only wants the post-processed spectrum
+        if capture:
+            return pr
+
+        return self.render_processed_reading(pr, spec, settings, reprocessing=reprocessing)
+
+    def post_process_reading(self, reading, spec, settings, dark=None, ref=None, capture=False, pr=None, batched=False):
+        """
+        The "post-processing" half of process_reading: generates a 
+        ProcessedReading from the Reading and applies the configured chain of
+        corrections, through interpolation (see ProcessingEngine).
+
+        This may be called on ProcessingPipelineFeature's worker thread, so it
+        must not touch Qt widgets; curves computed along the way (baseline, 
+        DALAI) are graphed afterwards by render_processed_reading.
+
+        @param dark (Input) dark to subtract, as resolved by process_reading
+        @param ref  (Input) reference to use, as resolved by process_reading
+        @param pr   (Input) optional ProcessedReading already generated (and 
+                    potentially dark-corrected) by post_process_batch
+        @param batched (Input) if True, stop before boxcar and interpolation,
+                    which post_process_batch applies across the batch
+        @returns ProcessedReading
+        """
+        # per-stage timing (not collected for AnalysisCapture)
+        timed = self.stage_timing.time
+        timed_spec = None if capture else spec
+
         # todo: maybe make a ProcessedReadingFactory, which would automatically
         # associate the "at creation" x-axis and some of this other setup?
         #
         # Currently, this is where "recordable_dark" is snapped
-        pr = ProcessedReading(reading, settings=settings)
+        if pr is None:
+            pr = ProcessedReading(reading, settings=settings)
+
+        # per-pixel noise of a software scan average (see ScanAveragingFeature)
+        pr.noise = getattr(reading, "noise", None)
+
+        if spec is not None:
+            spec.app_state.array_pool.begin_frame()
 
         ########################################################################
         # Saturation Check
@@ -1884,131 +1982,158 @@ class Controller:
         # lesser value and reserved 0xffff for "frame markers". Raw should match 
         # processed at this point, but "raw" is preferred to clarify saturation 
         # is irrespective of dark correction or any post-processing.
-        if pr.raw.max() >= 0xfffe and not spec.settings.is_ids():
+        if not capture and pr.raw.max() >= 0xfffe and not spec.settings.is_ids():
             # todo: self.status_indicators.detector_warning("detector saturated")
             self.marquee.error("detector saturated")
 
         ########################################################################
-        # Dark Correction
+        # Processing Chain
         ########################################################################
 
-        best_dark = dark                # use explicitly passed dark if given
-        if best_dark is None:
-            best_dark = reading.dark    # otherwise, what comes with Reading
-        if best_dark is None and app_state is not None:
-            best_dark = app_state.dark  # otherwise, what has been stored
+        # (dark and ref were resolved by process_reading, and the dark may 
+        # already have been subtracted by post_process_batch)
+        options = self.get_processing_options(spec, settings, capture)
+        hooks = self.get_processing_hooks(spec, settings)
+        timed_stage = lambda stage: timed(timed_spec, stage)
 
-        pr.correct_dark(best_dark)
+        return self.processing_engine.process(reading, settings, options, dark=dark, ref=ref, pr=pr, hooks=hooks, timed=timed_stage, batched=batched)
 
-        ########################################################################
-        # InGaAs Correction (experimental)
-        ########################################################################
+    def get_processing_options(self, spec, settings, capture=False):
+        """
+        Configures ProcessingEngine from the current state of the GUI. Stages
+        whose behavior depends on more than these options are run through 
+        get_processing_hooks.
+        """
+        options = ProcessingOptions()
+        options.horiz_roi                  = self.horiz_roi.enabled
+        options.etalon_correction          = self.etalon_correction.enabled
+        options.using_reference            = self.page_nav.using_reference()
+        options.raman_intensity_correction = self.page_nav.doing_raman()
+        options.dalai                      = not capture
+        if options.using_reference:
+            if self.page_nav.doing_transmission():
+                options.technique = "transmission"
+            elif self.page_nav.doing_absorbance():
+                options.technique = "absorbance"
+        if spec is not None:
+            options.pool = spec.app_state.array_pool
+        return options
 
-        if settings.ingaas_correction:
-            self.ingaas_correction.process(pr)
-        
-        ########################################################################
-        # Etalon Correction (experimental)
-        ########################################################################
-       
-        if settings.etalon_correction:
-            self.etalon_correction.process(pr)
+    def get_processing_hooks(self, spec, settings):
+        """
+        Binds ProcessingEngine stages to the business objects which wrap them
+        with GUI behavior (marquee messages, curves, per-spectrometer caches).
+        """
+        app_state = spec.app_state if spec is not None else None
+        return {
+            "transmission"               : lambda pr: self.transmission.process(pr, settings, app_state),
+            "absorbance"                 : lambda pr: self.absorbance.process(pr, settings, app_state),
+            "despike"                    : lambda pr: self.despiking.process(pr, spec),
+            "raman_intensity_correction" : lambda pr: self.raman_intensity_correction.process(pr, spec),
+            "baseline_correction"        : lambda pr: self.baseline_correction.process(pr, spec),
+            "richardson_lucy"            : lambda pr: self.richardson_lucy.process(pr, spec),
+            "dalai"                      : lambda pr: self.dalai.process(pr),
+            "boxcar"                     : lambda pr: self.boxcar.process(pr, spec),
+            "interp"                     : lambda pr: self.interp.process(pr)
+        }
+
+    def post_process_batch(self, jobs):
+        """
+        Batched equivalent of post_process_reading, for Readings of equal pixel
+        count from different spectrometers (or successive Readings from one).
 
-        ########################################################################
-        # Cropping
-        ########################################################################
+        Dark correction and boxcar are applied once across a 2D array of the
+        batch; the remaining stages (which depend on per-device settings, 
+        wavecal, ROI etc) are run per-device by post_process_reading. Stage
+        timings for batched stages are amortized across the batch.
 
-        # This should be done before any processing that involves multiple
-        # pixels, e.g. offset, boxcar, baseline correction, or Richardson-Lucy.
-        # It should be done BEFORE interpolation.
-        self.horiz_roi.process(pr)
+        @param jobs (In/Out) list of ProcessingJob, each of which will have its
+                    .pr populated
+        """
+        record = self.stage_timing.record
+        count = len(jobs)
 
         ########################################################################
-        # Reference
+        # Dark Correction
         ########################################################################
 
-        # add reference to ProcessedReading whether or not we're actively in a
-        # reference view, so plugins etc can access it
-        if app_state and app_state.reference is not None:
-            pr.reference = np.copy(spec.app_state.reference)
-        elif ref is not None:
-            pr.reference = np.copy(ref)
-        else:
-            pr.reference = None
+        start = time.perf_counter()
+        prs = [ ProcessedReading(job.reading, settings=job.settings) for job in jobs ]
+        pixels = len(prs[0].processed)
 
-        if self.page_nav.using_reference():
-            if self.page_nav.doing_transmission():
-                self.transmission.process(pr, settings, spec.app_state)
-            elif self.page_nav.doing_absorbance():
-                self.absorbance.process(pr, settings, spec.app_state)
+        dark_indices = [ i for i, job in enumerate(jobs) if job.dark is not None and len(job.dark) == pixels ]
+        if dark_indices:
+            darks = np.array([ jobs[i].dark for i in dark_indices ], dtype=np.float64)
+            corrected = np.array([ prs[i].processed for i in dark_indices ]) - darks
+            for row, i in enumerate(dark_indices):
+                pr = prs[i]
+                pr.dark = jobs[i].dark # shared, as in DarkFeature.correct
+                pr.processed = corrected[row]
+                pr.dark_corrected = True
+                pr.recordable_reference = np.copy(pr.processed)
+
+        if self.stage_timing.enabled:
+            elapsed = (time.perf_counter() - start) / count
+            for job in jobs:
+                record(job.spec.device_id, "correct_dark", elapsed)
 
         ########################################################################
-        # non-reference views
+        # per-device stages (InGaAs through DALAI)
         ########################################################################
 
-        else:
-
-            ####################################################################
-            # Raman intensity correction
-            ####################################################################
-
-            # This MUST be done before interpolation.
-            if self.page_nav.doing_raman():
-                self.raman_intensity_correction.process(pr, spec)
-
-            # Dieter goes back and forth on the order of these next two:
-
-            # a potentially better approach might be:
-            # - trim spectrum to useful range
-            # - intensity correction using SRM on nominal wavenumber axis
-            # - BASELINE CORRECTION
-            # - DECONVOLUTION
-            # - wavenumber axis calibration --WP-00413 report, p200
-
-            # If we invert the order of operation, applying the intensity
-            # correction first, then the DECONVOLUTION, and the BASELINE
-            # CORRECTION last, we see a better performance, especially with the
-            # alternate baseline method "ALS". --WP-00413 report, p217
-
-            ####################################################################
-            # baseline correction
-            ####################################################################
-
-            self.baseline_correction.process(pr, spec)
-
-            # on 2020-05-19 Deiter asked this to be moved before cropping
-            # (yet clearly we haven't...)
-            if not self.page_nav.using_reference():
-                self.richardson_lucy.process(pr, spec)
+        for job, pr in zip(jobs, prs):
+            job.pr = self.post_process_reading(job.reading, job.spec, job.settings, dark=job.dark, ref=job.ref, pr=pr, batched=True)
 
         ########################################################################
-        # Despiking
+        # Boxcar Smoothing
         ########################################################################
 
-        # if self.form.ui.checkBox_despike_enable.isChecked():
-        #     pr = self.despiking_feature.process(pr)
+        start = time.perf_counter()
+        self.boxcar.process_batch(prs, [ job.spec for job in jobs ])
+        if self.stage_timing.enabled:
+            elapsed = (time.perf_counter() - start) / count
+            for job in jobs:
+                record(job.spec.device_id, "boxcar", elapsed)
 
         ########################################################################
-        # DALAI-RAMAN
+        # Interpolation
         ########################################################################
 
-        self.dalai.process(pr)
+        # arrays are grouped by wavecal (one cached InterpolationOperator each)
+        start = time.perf_counter()
+        self.interp.process_batch([ job.pr for job in jobs ])
+        if self.stage_timing.enabled:
+            elapsed = (time.perf_counter() - start) / count
+            for job in jobs:
+                record(job.spec.device_id, "interp", elapsed)
 
-        ########################################################################
-        # Boxcar Smoothing
-        ########################################################################
+    def render_processed_reading(self, pr, spec, settings, reprocessing=False):
+        """
+        The "GUI" half of process_reading: graphs the ProcessedReading generated
+        by post_process_reading, and passes it to plugins, library matching,
+        TakeOne, BatchCollection, StatusBar etc.
 
-        # One could argue whether boxcar should be before or after interpolation;
-        # however, it currently calls ProcessedReading.set_processed which does
-        # NOT update .interpolated, so for now it must remain before.
+        **This method should always be called on the GUI thread.**
 
-        self.boxcar.process(pr, spec)
+        @returns the ProcessedReading if reprocessing
+        """
+        app_state = None
+        selected = False
+        if spec is not None:
+            app_state = spec.app_state
+            selected = self.multispec.is_selected(spec.device_id)
 
-        ########################################################################
-        # Interpolation
-        ########################################################################
+        timed = self.stage_timing.time
+        timed_spec = None if reprocessing else spec
 
-        self.interp.process(pr)
+        # snapshot backpressure counters, so they persist with any Measurement
+        if app_state and not reprocessing:
+            pr.queue_depth = app_state.queue_depth
+            pr.dropped_reading_count = app_state.dropped_reading_count
+
+        # curves generated during post-processing
+        self.baseline_correction.display(pr, spec)
+        self.dalai.display(pr)
 
         ########################################################################
         # Plugins
@@ -2022,7 +2147,8 @@ class Controller:
         # affect ProcessedReading.processed), we kind of need that to happen 
         # here.
 
-        self.plugin_controller.process_reading(pr, settings, spec)
+        with timed(timed_spec, "plugin_controller"):
+            self.plugin_controller.process_reading(pr, settings, spec)
 
         ########################################################################
         # Graph 
@@ -2038,13 +2164,17 @@ class Controller:
         else:
             graphed = False
             if pr.has_processed():
-                if self.graph.in_wavelengths():
-                    graphed = self.set_curve_data(spec.curve, x=pr.get_wavelengths(), y=pr.get_processed(), label="nm")
-                elif self.graph.in_wavenumbers():
-                    graphed = self.set_curve_data(spec.curve, x=pr.get_wavenumbers(), y=pr.get_processed(), label="cm")
-                else:
-                    pixel_axis = pr.get_pixel_axis()
-                    graphed = self.set_curve_data(spec.curve, x=pixel_axis, y=pr.get_processed(), label="px")
+                # (fast getters return the arrays themselves, e.g. views into
+                # the full spectrum and shared axes, rather than list copies;
+                # drawing is timed as "graphing" by RenderSchedulerFeature)
+                with timed(timed_spec, "render queue"):
+                    if self.graph.in_wavelengths():
+                        graphed = self.set_curve_data(spec.curve, x=pr.get_wavelengths(fast=True), y=pr.get_processed(fast=True), label="nm")
+                    elif self.graph.in_wavenumbers():
+                        graphed = self.set_curve_data(spec.curve, x=pr.get_wavenumbers(fast=True), y=pr.get_processed(fast=True), label="cm")
+                    else:
+                        pixel_axis = pr.get_pixel_axis()
+                        graphed = self.set_curve_data(spec.curve, x=pixel_axis, y=pr.get_processed(fast=True), label="px")
 
             if not graphed:
                 # This can happen in transmission or absorbance mode before a reference
@@ -2069,7 +2199,8 @@ class Controller:
 
         # only attempt library matching on the "foreground" spectrometer
         if selected:
-            self.library_matching.process(pr)
+            with timed(timed_spec, "library_matching"):
+                self.library_matching.process(pr)
 
         ########################################################################
         # Re-Processing complete
@@ -2111,6 +2242,9 @@ class Controller:
         wavecal of [0, 1, 0, 0] and positive excitation in wavenumber space).
         Also traps for unequal array lengths, etc.
         
+        Drawing is deferred to the next display frame (and decimated to the
+        plot width) by RenderSchedulerFeature.
+
         @todo merge into Graph.set_data (calling it is a start)
         @returns True if graph was updated
         """
@@ -2122,7 +2256,7 @@ class Controller:
             log.error(f"set_curve_data[{label}]: no y")
             return False
 
-        if x is None or x == []:
+        if x is None or len(x) == 0:
             log.debug(f"set_curve_data[{label}]: no x (y_len {len(y)}, y {y[:5]}, curve {curve})")
             self.graph.set_data(curve=curve, y=y)
             return True
@@ -2368,10 +2502,6 @@ class Controller:
         
         @todo need to update for DetectorRegions
         """
-        # x_axis = None
-        retval = None
-
-
         if settings is None:
             if spec is None:
                 spec = self.current_spectrometer()
@@ -2384,31 +2514,12 @@ class Controller:
 
         log.debug(f"generate_x_axis: spec {spec}, settings {settings}, unit {unit}, cropped {cropped}")
 
-        regions = settings.state.detector_regions
-        # log.debug(f"generate_x_axis: regions = {regions}")
-
-        if unit is not None:
-            if   unit == "cm": retval = np.copy(settings.wavenumbers)
-            elif unit == "nm": retval = np.copy(settings.wavelengths)
-            elif unit == "px": retval = np.array(list(range(settings.pixels())), dtype=np.float32)
-        elif self.graph.current_x_axis == common.Axes.WAVELENGTHS:
-            retval = settings.wavelengths
-        elif self.graph.current_x_axis == common.Axes.WAVENUMBERS:
-            retval = settings.wavenumbers
-            if retval is None:
-                log.debug("spectrometer has no wavenumber axis")
-        else:
-            retval = np.array(list(range(settings.pixels())), dtype=np.float32) 
-
-        if cropped and self.horiz_roi.enabled:
-            return self.horiz_roi.crop(retval, roi=settings.eeprom.get_horizontal_roi())
-
-        if regions:
-            log.debug("generate_x_axis: chopping into regions")
-            retval = regions.chop(retval, flatten=True, orig_roi=settings.eeprom.get_horizontal_roi()) # which region?
-            log.debug(f"generate_x_axis: got back {len(retval)} values ({retval[:3]}...{retval[:-3]})")
+        if unit is None:
+            if   self.graph.current_x_axis == common.Axes.WAVELENGTHS: unit = "nm"
+            elif self.graph.current_x_axis == common.Axes.WAVENUMBERS: unit = "cm"
+            else:                                                       unit = "px"
 
-        return retval
+        return self.processing_engine.generate_x_axis(settings, unit=unit, cropped=cropped and self.horiz_roi.enabled)
 
     def perform_fpga_reset(self, spec=None):
         self.multispec.change_device_setting("reset_fpga")
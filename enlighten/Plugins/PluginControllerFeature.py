@@ -1219,7 +1219,7 @@ class PluginControllerFeature(EnlightenFeature):
         try:
             for curve in self.plugin_curves.keys():
                 log.info(f"attempting to remove curve {curve}")
-                self.plugin_curves[curve].setData([],[])
+                self.ctl.graph.set_data(self.plugin_curves[curve], y=[], x=[])
                 self.ctl.graph.remove_curve(self.plugin_curves[curve].name())
         except:
             log.error(f"While attempting to clear main graph of plugins encountered error", exc_info=1)
@@ -0,0 +1,96 @@
+import threading
+import logging
+import numpy as np
+
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+class ArrayPool:
+    """
+    Recycles scratch numpy buffers used within individual post-processing
+    stages (Richardson-Lucy iterations, boxcar cumulative sums etc), so that
+    processing a spectrum doesn't allocate (and later garbage-collect) several
+    pixel-sized arrays per stage per frame.
+
+    Each Spectrometer has its own pool (SpectrometerApplicationState.array_pool).
+    Buffers are keyed by (shape, dtype), and are returned UNINITIALIZED.
+
+    Only use pooled buffers for intermediate results which don't escape the
+    stage: anything stored in a ProcessedReading may end up in a Measurement,
+    so must never be recycled.
+
+        with pool.borrow(pixels, pixels) as (a, b):
+            np.multiply(x, y, out=a)
+            ...
+
+    Buffers may be borrowed from the GUI thread and ProcessingPipelineFeature's
+    worker, so the free-lists are locked.
+
+    The counters (total allocations, allocations during the latest frame) are
+    shown on the Factory View via StageTimingFeature.
+    """
+
+    MAX_FREE = 8 # per (shape, dtype)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.free = {} # (shape, dtype) -> list of ndarray
+
+        self.frames = 0
+        self.allocations = 0
+        self.reused = 0
+        self.frame_allocations = 0
+        self.last_frame_allocations = 0
+
+    def __str__(self):
+        return f"ArrayPool <frames {self.frames}, allocations {self.allocations}, reused {self.reused}, last frame {self.last_frame_allocations}>"
+
+    def clear(self):
+        with self.lock:
+            self.free = {}
+
+    def begin_frame(self):
+        """ called by Controller.post_process_reading for each new spectrum """
+        with self.lock:
+            self.last_frame_allocations = self.frame_allocations
+            self.frame_allocations = 0
+            self.frames += 1
+
+    def acquire(self, shape, dtype=np.float64):
+        if isinstance(shape, int):
+            shape = (shape,)
+        key = (tuple(shape), np.dtype(dtype))
+
+        with self.lock:
+            buffers = self.free.get(key, None)
+            if buffers:
+                self.reused += 1
+                return buffers.pop()
+            self.allocations += 1
+            self.frame_allocations += 1
+
+        return np.empty(key[0], dtype=key[1])
+
+    def release(self, *arrays):
+        with self.lock:
+            for a in arrays:
+                if a is None:
+                    continue
+                key = (a.shape, a.dtype)
+                if key not in self.free:
+                    self.free[key] = []
+                if len(self.free[key]) < self.MAX_FREE:
+                    self.free[key].append(a)
+
+    @contextmanager
+    def borrow(self, *shapes, dtype=np.float64):
+        """ acquire one buffer per shape, releasing them on exit """
+        buffers = [ self.acquire(shape, dtype) for shape in shapes ]
+        try:
+            yield buffers
+        finally:
+            self.release(*buffers)
+
+    def get_allocations_per_frame(self):
+        return self.allocations / self.frames if self.frames else 0
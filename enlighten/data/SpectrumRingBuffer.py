@@ -0,0 +1,75 @@
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+class SpectrumRingBuffer:
+    """
+    Fixed-capacity, pre-allocated ring buffer of equal-length spectra, with the
+    session_count and timestamp (epoch seconds) of each.
+
+    Once full, each new spectrum overwrites the oldest. If a spectrum of a
+    different length is added (e.g. the horizontal ROI changed), the buffer is
+    re-allocated and previous contents discarded.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.clear()
+
+    def clear(self):
+        self.spectra = None
+        self.session_counts = None
+        self.timestamps = None
+        self.pixels = 0
+        self.next = 0  # index which the next spectrum will be written to
+        self.count = 0 # number of valid spectra currently held
+
+    def __len__(self):
+        return self.count
+
+    def __str__(self):
+        return f"SpectrumRingBuffer(capacity {self.capacity}, count {self.count}, pixels {self.pixels})"
+
+    def allocate(self, pixels):
+        if self.count:
+            log.debug(f"re-allocating from {self.pixels} to {pixels} pixels (discarding {self.count} spectra)")
+        self.clear()
+        self.pixels = pixels
+        self.spectra = np.zeros((self.capacity, pixels), dtype=np.float64)
+        self.session_counts = np.zeros(self.capacity, dtype=np.int64)
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+
+    def add(self, spectrum, session_count=0, timestamp=0.0):
+        if self.spectra is None or len(spectrum) != self.pixels:
+            self.allocate(len(spectrum))
+
+        i = self.next
+        self.spectra[i] = spectrum
+        self.session_counts[i] = session_count
+        self.timestamps[i] = timestamp
+
+        self.next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def get_order(self):
+        """ indices of the held spectra, oldest first """
+        if self.count < self.capacity:
+            return np.arange(self.count)
+        return (np.arange(self.capacity) + self.next) % self.capacity
+
+    def get_spectra(self):
+        """ @returns a 2D (count, pixels) copy, oldest first """
+        if self.spectra is None:
+            return None
+        return self.spectra[self.get_order()]
+
+    def get_session_counts(self):
+        if self.session_counts is None:
+            return None
+        return self.session_counts[self.get_order()]
+
+    def get_timestamps(self):
+        if self.timestamps is None:
+            return None
+        return self.timestamps[self.get_order()]
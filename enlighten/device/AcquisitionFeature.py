@@ -0,0 +1,272 @@
+import threading
+import logging
+
+from queue import Queue, Empty
+
+from enlighten.EnlightenFeature import EnlightenFeature
+from enlighten import common
+
+from wasatch.SpectrometerResponse import SpectrometerResponse
+from wasatch.Reading import Reading
+
+if common.use_pyside2():
+    from PySide2 import QtCore
+else:
+    from PySide6 import QtCore
+
+log = logging.getLogger(__name__)
+
+class NotifyingQueue(Queue):
+    """
+    Drop-in replacement for WasatchDeviceWrapper.response_queue which calls the
+    given callback (from the WrapperWorker thread) with the device_id and
+    SpectrometerResponse each time one is enqueued.
+
+    Note that Queue.put_nowait calls put, so both paths are covered.
+    """
+    def __init__(self, device_id, callback):
+        super().__init__()
+        self.device_id = device_id
+        self.callback = callback
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        try:
+            self.callback(self.device_id, item)
+        except:
+            log.error(f"NotifyingQueue: exception in callback for {self.device_id}", exc_info=1)
+
+class AcquisitionFeature(EnlightenFeature):
+    """
+    Provides an optional "event-driven" acquisition mode, in which each
+    spectrometer's WrapperWorker notifies the GUI thread as soon as a new
+    Reading lands in its response queue, so Controller.attempt_reading can run
+    immediately rather than waiting for the next tick_acquisition.
+
+    Notifications are coalesced per-device: if the GUI thread hasn't yet
+    serviced the previous notification from a given spectrometer, no new signal
+    is emitted (attempt_reading drains the whole queue anyway).
+
+    Controller.tick_acquisition remains as a slower fallback when event-driven
+    mode is enabled (covering acquisition timeouts, spectrometers which
+    connected before the mode was enabled, etc), and is the only mechanism when
+    it's disabled.
+
+    It also applies a "backpressure" policy determining what happens when
+    Readings arrive faster than ENLIGHTEN can process them:
+
+    - latest: process only the newest Reading in the queue, dropping the rest
+      (the traditional behavior, via WasatchDeviceWrapper.acquire_data)
+    - all: process every queued Reading, oldest first
+    - every_nth: process every Nth Reading, oldest first, dropping the others
+
+    With "all" and "every_nth", each service() call processes at most
+    MAX_READINGS_PER_SERVICE Readings before yielding back to the event loop.
+    Queue depth (at each poll) and the number of dropped Readings are tracked 
+    in SpectrometerApplicationState, and shown on the StatusBar. When scan 
+    averaging, only completed averages are counted as dropped.
+
+    Currently this is only configured through enlighten.ini (section
+    "acquisition", keys "event_driven", "policy" and "every_nth").
+
+    @todo move tick_acquisition, attempt_reading and acquire_reading here
+    """
+
+    SECTION = "acquisition"
+    FALLBACK_TIMER_SLEEP_MS = 500
+    MAX_READINGS_PER_SERVICE = 20
+
+    POLICY_LATEST    = "latest"
+    POLICY_ALL       = "all"
+    POLICY_EVERY_NTH = "every_nth"
+    POLICIES = [ POLICY_LATEST, POLICY_ALL, POLICY_EVERY_NTH ]
+
+    class ReadingAvailable(QtCore.QObject):
+        # emits the DeviceID of the spectrometer with a new SpectrometerResponse
+        available = QtCore.Signal(object)
+
+    def __init__(self, ctl):
+        super().__init__(ctl)
+
+        self.lock = threading.Lock()
+        self.pending = set() # device_ids with an un-serviced notification
+        self.in_attempt = False
+
+        self.enabled = self.ctl.config.get_bool(self.SECTION, "event_driven")
+
+        self.policy = self.ctl.config.get(self.SECTION, "policy", default=self.POLICY_LATEST)
+        if self.policy not in self.POLICIES:
+            log.error(f"invalid acquisition policy {self.policy} (expected {self.POLICIES})")
+            self.policy = self.POLICY_LATEST
+        self.every_nth = max(1, self.ctl.config.get_int(self.SECTION, "every_nth", default=2))
+        self.nth_counts = {} # device_id -> complete Readings seen under every_nth
+
+        # created on the GUI thread, so queued connections will dispatch there
+        self.signal = self.ReadingAvailable()
+        self.signal.available.connect(self.reading_available_callback, QtCore.Qt.QueuedConnection)
+
+        log.debug(f"event-driven acquisition enabled {self.enabled}")
+
+    def attach(self, wdw):
+        """
+        Called by Controller.connect_new BEFORE WasatchDeviceWrapper.connect(),
+        as the response_queue is handed to the WrapperWorker at that time.
+        """
+        wdw.response_queue = NotifyingQueue(wdw.device_id, self.enqueued)
+
+    def set_enabled(self, flag):
+        self.enabled = bool(flag)
+        self.ctl.config.set(self.SECTION, "event_driven", self.enabled)
+        log.debug(f"event-driven acquisition enabled {self.enabled}")
+
+    def set_policy(self, policy):
+        if policy not in self.POLICIES:
+            log.error(f"invalid acquisition policy {policy} (expected {self.POLICIES})")
+            return
+        self.policy = policy
+        self.ctl.config.set(self.SECTION, "policy", policy)
+        log.debug(f"acquisition policy {policy}")
+
+    def get_timer_sleep_ms(self, sleep_ms):
+        """ Controller.tick_acquisition only needs to run as a fallback in event-driven mode """
+        if self.enabled:
+            return max(sleep_ms, self.FALLBACK_TIMER_SLEEP_MS)
+        return sleep_ms
+
+    ############################################################################
+    # WrapperWorker thread
+    ############################################################################
+
+    def enqueued(self, device_id, response):
+        """
+        Note that "enqueued" observers (e.g. AnalysisCaptureFeature) are called
+        with (device_id, SpectrometerResponse) on the WrapperWorker thread, so 
+        must be thread-safe and quick.
+        """
+        self.notify_observers_with_value((device_id, response), "enqueued")
+
+        if not self.enabled:
+            return
+
+        with self.lock:
+            if device_id in self.pending:
+                return
+            self.pending.add(device_id)
+
+        self.signal.available.emit(device_id)
+
+    ############################################################################
+    # GUI thread
+    ############################################################################
+
+    def service(self, spec):
+        """
+        Call Controller.attempt_reading as many times as the current policy
+        warrants. Called from Controller.tick_acquisition and
+        reading_available_callback.
+        """
+        for _ in range(self.MAX_READINGS_PER_SERVICE):
+            self.ctl.attempt_reading(spec)
+
+            if self.policy == self.POLICY_LATEST or self.ctl.shutting_down:
+                break
+
+            # attempt_reading may have disconnected the spectrometer
+            device = spec.device
+            if device is None or device.response_queue is None or device.response_queue.empty():
+                break
+
+    def acquire_data(self, spec):
+        """
+        Called by Controller.acquire_reading in place of 
+        WasatchDeviceWrapper.acquire_data, applying the backpressure policy.
+
+        @returns SpectrometerResponse
+        """
+        device = spec.device
+        app_state = spec.app_state
+        q = device.response_queue
+
+        app_state.queue_depth = q.qsize() if q is not None else 0
+
+        # let Wasatch.PY generate poison-pills when closing / disconnected
+        if q is None or device.closing or not device.connected:
+            return device.acquire_data()
+
+        if self.policy == self.POLICY_LATEST:
+            # acquire_data will purge the queue, so count what it discards
+            with q.mutex:
+                complete = sum(1 for response in q.queue if self.is_complete(spec, response))
+            if complete > 1:
+                app_state.dropped_reading_count += complete - 1
+            return device.acquire_data()
+
+        return self.get_next_item(spec)
+
+    def get_next_item(self, spec):
+        """
+        Like WasatchDeviceWrapper.get_final_item, but returns the OLDEST 
+        unprocessed Reading (subject to every_nth), leaving the rest queued.
+        """
+        q = spec.device.response_queue
+        app_state = spec.app_state
+        device_id = spec.device_id
+
+        while True:
+            try:
+                response = q.get_nowait()
+            except Empty:
+                return SpectrometerResponse(keep_alive=True)
+
+            if response is None:
+                continue
+
+            if response.poison_pill:
+                log.critical("get_next_item: poison-pill!")
+                return response
+
+            # ignore keepalives, unless they carry an error
+            if response.keep_alive or response.data is None:
+                if response.keep_alive and response.error_msg:
+                    return response
+                continue
+
+            if self.policy == self.POLICY_EVERY_NTH and self.is_complete(spec, response):
+                count = self.nth_counts.get(device_id, 0) + 1
+                self.nth_counts[device_id] = count
+                if count % self.every_nth != 0:
+                    app_state.dropped_reading_count += 1
+                    continue
+
+            return response
+
+    def is_complete(self, spec, response):
+        """ 
+        Whether the SpectrometerResponse is a Reading which would be processed
+        (i.e. not a partial scan average).
+        """
+        if response is None or response.keep_alive or type(response.data) is not Reading:
+            return False
+        return spec.settings.state.scans_to_average <= 1 or response.data.averaged or self.ctl.scan_averaging.is_software()
+
+    def reading_available_callback(self, device_id):
+        with self.lock:
+            self.pending.discard(device_id)
+
+        if not self.enabled or self.ctl.shutting_down:
+            return
+
+        # attempt_reading can open modal dialogs, which run a nested event loop;
+        # don't recurse into it (the fallback timer will catch-up)
+        if self.in_attempt:
+            return
+
+        spec = self.ctl.multispec.get_spectrometer(device_id)
+        if spec is None or spec.app_state.hidden:
+            return
+
+        self.in_attempt = True
+        try:
+            self.service(spec)
+        finally:
+            self.in_attempt = False
@@ -1,9 +1,27 @@
 import logging
+import numpy as np
 
 from enlighten.common import LaserStates
+from enlighten.data.ArrayPool import ArrayPool
+from enlighten.post_processing.AveragingEngine import AveragingEngine
+from enlighten.post_processing.BaselineEngine import BaselineEngine
+from enlighten.post_processing.DespikingEngine import DespikingEngine
 
 log = logging.getLogger(__name__)
 
+def freeze(spectrum):
+    """
+    @returns a read-only float64 copy of the spectrum (or the spectrum itself,
+             if already a read-only float64 array)
+    """
+    if spectrum is None:
+        return None
+    if isinstance(spectrum, np.ndarray) and spectrum.dtype == np.float64 and not spectrum.flags.writeable:
+        return spectrum
+    a = np.array(spectrum, dtype=np.float64)
+    a.flags.writeable = False
+    return a
+
 ##
 # These are things that are very much ENLIGHTEN-specific and not generic
 # enough to be in Wasatch.PY's SpectrometerState.  That class is for spectrometer
@@ -17,6 +35,11 @@ log = logging.getLogger(__name__)
 # temperatures) and "heavyweight things we don't" (waterfall, historical 
 # temperatures).
 #
+# The stored dark and reference are immutable (read-only) snapshots, replaced
+# rather than modified (see set_dark and set_reference). This allows every 
+# ProcessedReading (and any Measurements saved from them) to share the same 
+# arrays rather than each holding a private copy.
+#
 # @todo consider moving to enlighten.device
 class SpectrometerApplicationState:
 
@@ -25,8 +48,8 @@ class SpectrometerApplicationState:
         self.processed_reading = None
         self.technique_name = None
 
-        self.dark                = None
-        self.reference           = None
+        self.dark                = None # read-only (see set_dark)
+        self.reference           = None # read-only (see set_reference)
 
         self.dark_timestamp      = None
         self.reference_timestamp = None
@@ -49,6 +72,13 @@ class SpectrometerApplicationState:
         self.spec_timeout_prompt_shown = False
         self.last_status_message_time = None
         self.missed_reading_count = 0
+        self.queue_depth = 0            # Readings in the response queue when last polled
+        self.dropped_reading_count = 0  # Readings discarded by AcquisitionFeature's policy
+        self.array_pool = ArrayPool()   # scratch buffers for post-processing
+        self.baseline_engine = BaselineEngine() # warm-started baseline state
+        self.despiking_engine = DespikingEngine() # temporal despiking history
+        self.averaging_engine = AveragingEngine() # software scan averaging
+        self.scans_to_average = None    # N for software scan averaging (SpectrometerState's is the driver's)
         self.received_reading_at_current_integration_time = False
         self.laser_state = LaserStates.DISABLED
 
@@ -72,6 +102,8 @@ class SpectrometerApplicationState:
         log.info("  Reference:                  %s (%s)", None if self.reference is None else self.reference[:5], self.reference_timestamp)
         log.info("  Reference Dark-Corrected:   %s", self.reference_is_dark_corrected)
         log.info("  Reading Count:              %d", self.reading_count)
+        log.info("  Queue Depth:                %d", self.queue_depth)
+        log.info("  Dropped Readings:           %d", self.dropped_reading_count)
         log.info("  Paused:                     %s", self.paused)
         log.info("  Take One Request            %s", self.take_one_request)
         log.info("  Hidden:                     %s", self.hidden)
@@ -118,6 +150,14 @@ class SpectrometerApplicationState:
     def has_reference(self):
         return self.reference is not None
 
+    def set_dark(self, dark):
+        """ store a read-only snapshot of the given dark (caller sets timestamp etc) """
+        self.dark = freeze(dark)
+
+    def set_reference(self, reference):
+        """ store a read-only snapshot of the given reference (caller sets timestamp etc) """
+        self.reference = freeze(reference)
+
     def clear_dark(self):
         self.dark = None
         self.dark_timestamp = None
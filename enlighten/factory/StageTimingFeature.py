@@ -0,0 +1,248 @@
+import threading
+import datetime
+import logging
+import time
+import os
+
+import numpy as np
+
+from collections import deque
+from contextlib import contextmanager
+
+from enlighten import common
+from enlighten.EnlightenFeature import EnlightenFeature
+
+if common.use_pyside2():
+    from PySide2 import QtCore
+    from PySide2.QtGui import QFont
+    from PySide2.QtWidgets import QCheckBox, QHBoxLayout, QLabel, QPushButton, QSizePolicy, QSpacerItem, QTableWidget, QTableWidgetItem, QVBoxLayout, QAbstractItemView
+else:
+    from PySide6 import QtCore
+    from PySide6.QtGui import QFont
+    from PySide6.QtWidgets import QCheckBox, QHBoxLayout, QLabel, QPushButton, QSizePolicy, QSpacerItem, QTableWidget, QTableWidgetItem, QVBoxLayout, QAbstractItemView
+
+log = logging.getLogger(__name__)
+
+class StageTimingFeature(EnlightenFeature):
+    """
+    Instruments the individual stages of Controller.process_reading (dark
+    correction, horizontal ROI, Raman intensity correction, baseline correction,
+    Richardson-Lucy, DALAI, boxcar, interpolation, plugins, render queue, library
+    matching etc), keeping a rolling window of elapsed times for each stage per
+    spectrometer. The actual drawing of each spectrometer's curve is recorded as
+    "graphing" by RenderSchedulerFeature when it flushes.
+
+    Stages are timed with:
+
+        with self.stage_timing.time(spec, "boxcar"):
+            self.boxcar.process(pr, spec)
+
+    which may be called from ProcessingPipelineFeature's worker thread as well as
+    the GUI thread.
+
+    A table on the Factory View shows p50 / p95 / max per stage for the current
+    spectrometer (refreshed at 1Hz), and can be saved to CSV (in the SaveOptions
+    "today" directory) or copied to the clipboard. Below it are the allocation
+    counters of the spectrometer's ArrayPool.
+
+    Configuration (section "StageTiming"): enabled (default True), window
+    (samples per stage, default 200).
+    """
+
+    SECTION = "StageTiming"
+    TICK_MS = 1000
+    COLUMNS = [ "Stage", "Count", "p50 (ms)", "p95 (ms)", "Max (ms)" ]
+
+    def __init__(self, ctl):
+        super().__init__(ctl)
+
+        cfu = ctl.form.ui
+
+        self.layout_parent = cfu.layout_strip_charts
+        self.parent = cfu.stackedWidget_hardware_capture_details_spectrum
+
+        self.enabled = self.ctl.config.get_bool(self.SECTION, "enabled", default=True)
+        self.window = self.ctl.config.get_int(self.SECTION, "window", default=200)
+
+        self.lock = threading.Lock()
+        self.timings = {} # device_id -> { stage -> deque of sec }
+
+        self.create_widgets()
+
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+        self.timer.start(self.TICK_MS)
+
+    def stop(self):
+        self.timer.stop()
+
+    ############################################################################
+    # instrumentation
+    ############################################################################
+
+    @contextmanager
+    def time(self, spec, stage):
+        """
+        Context manager recording the elapsed time of the enclosed block.
+        Does nothing if spec is None (e.g. reprocessing or AnalysisCapture).
+        """
+        if not self.enabled or spec is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(spec.device_id, stage, time.perf_counter() - start)
+
+    def record(self, device_id, stage, sec):
+        with self.lock:
+            if device_id not in self.timings:
+                self.timings[device_id] = {}
+            stages = self.timings[device_id]
+            if stage not in stages:
+                stages[stage] = deque(maxlen=self.window)
+            stages[stage].append(sec)
+
+    def get_stats(self, device_id):
+        """
+        @returns list of (stage, count, p50_ms, p95_ms, max_ms) in the order
+                 stages were first recorded
+        """
+        with self.lock:
+            stages = self.timings.get(device_id, {})
+            samples = [ (stage, np.array(values)) for stage, values in stages.items() ]
+
+        stats = []
+        for stage, values in samples:
+            if len(values) == 0:
+                continue
+            ms = values * 1000.0
+            p50, p95 = np.percentile(ms, [50, 95])
+            stats.append( (stage, len(ms), p50, p95, ms.max()) )
+        return stats
+
+    def clear(self):
+        with self.lock:
+            self.timings = {}
+
+    ############################################################################
+    # GUI
+    ############################################################################
+
+    def create_widgets(self):
+        """
+        Processing Stage Timings          [x] Enable [Save] [Copy] [Clear]
+        Stage | Count | p50 (ms) | p95 (ms) | Max (ms)
+        """
+        self.layout = QVBoxLayout()
+
+        font = QFont()
+        font.setPointSize(10)
+        font.setBold(True)
+
+        self.lb_title = QLabel(self.parent)
+        self.lb_title.setText("Processing Stage Timings")
+        self.lb_title.setFont(font)
+
+        horiz_spacer = QSpacerItem(2, 20, QSizePolicy.Policy.MinimumExpanding, QSizePolicy.Policy.Minimum)
+
+        self.lb_spec = QLabel(self.parent)
+        self.lb_spec.setText("NA")
+
+        self.cb_enable = QCheckBox(self.parent)
+        self.cb_enable.setText("Enable")
+        self.cb_enable.setChecked(self.enabled)
+        self.cb_enable.stateChanged.connect(self.enable_callback)
+        self.cb_enable.setToolTip("time each stage of spectral post-processing")
+
+        self.pb_save = QPushButton(self.parent)
+        self.pb_save.setText("Save")
+        self.pb_save.clicked.connect(self.save_callback)
+        self.pb_save.setToolTip("save timings to CSV in EnlightenSpectra/today")
+
+        self.pb_copy = QPushButton(self.parent)
+        self.pb_copy.setText("Copy")
+        self.pb_copy.clicked.connect(self.copy_callback)
+        self.pb_copy.setToolTip("copy timings to clipboard")
+
+        self.pb_clear = QPushButton(self.parent)
+        self.pb_clear.setText("Clear")
+        self.pb_clear.clicked.connect(self.clear)
+        self.pb_clear.setToolTip("erase historical timings and start afresh")
+
+        hb = QHBoxLayout()
+        hb.addWidget(self.lb_title)
+        hb.addItem(horiz_spacer)
+        hb.addWidget(self.lb_spec)
+        hb.addWidget(self.cb_enable)
+        hb.addWidget(self.pb_save)
+        hb.addWidget(self.pb_copy)
+        hb.addWidget(self.pb_clear)
+        self.layout.addItem(hb)
+
+        self.table = QTableWidget(self.parent)
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setMinimumHeight(300)
+        self.layout.addWidget(self.table)
+
+        self.lb_pool = QLabel(self.parent)
+        self.lb_pool.setToolTip("scratch buffers allocated (rather than recycled) by post-processing")
+        self.layout.addWidget(self.lb_pool)
+
+        self.layout_parent.addItem(self.layout)
+
+    def enable_callback(self):
+        self.enabled = self.cb_enable.isChecked()
+        self.ctl.config.set(self.SECTION, "enabled", self.enabled)
+
+    def tick(self):
+        try:
+            self.update_table()
+        except:
+            log.error("error updating stage timings", exc_info=1)
+
+        if not self.ctl.shutting_down:
+            self.timer.start(self.TICK_MS)
+
+    def update_table(self):
+        spec = self.ctl.multispec.current_spectrometer() if self.ctl.multispec else None
+        if spec is None:
+            return
+
+        self.lb_spec.setText(spec.label)
+
+        stats = self.get_stats(spec.device_id)
+        self.table.setRowCount(len(stats))
+        for row, (stage, count, p50, p95, max_ms) in enumerate(stats):
+            for col, text in enumerate([ stage, str(count), f"{p50:.2f}", f"{p95:.2f}", f"{max_ms:.2f}" ]):
+                self.table.setItem(row, col, QTableWidgetItem(text))
+
+        pool = spec.app_state.array_pool
+        self.lb_pool.setText(f"Buffer allocations: {pool.last_frame_allocations} last frame, " +
+                             f"{pool.get_allocations_per_frame():.2f} per frame " +
+                             f"({pool.allocations} total, {pool.reused} reused)")
+
+    def copy_callback(self):
+        self.ctl.clipboard.copy_table_widget(self.table)
+
+    def save_callback(self):
+        """ Write current stats for every spectrometer to CSV """
+        ts = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        pathname = os.path.join(self.ctl.save_options.generate_today_dir(), f"stage-timing-{ts}.csv")
+        try:
+            with open(pathname, "w") as outfile:
+                outfile.write("Serial Number,Stage,Count,p50 (ms),p95 (ms),Max (ms)\n")
+                for spec in self.ctl.multispec.get_spectrometers():
+                    sn = spec.settings.eeprom.serial_number
+                    for stage, count, p50, p95, max_ms in self.get_stats(spec.device_id):
+                        outfile.write(f"{sn},{stage},{count},{p50:.3f},{p95:.3f},{max_ms:.3f}\n")
+            self.ctl.marquee.info(f"saved {pathname}")
+        except:
+            log.error(f"unable to save {pathname}", exc_info=1)
+            self.ctl.marquee.error(f"unable to save stage timings")
@@ -0,0 +1,280 @@
+import threading
+import datetime
+import logging
+import os
+
+from collections import deque
+
+from enlighten import common
+from enlighten.EnlightenFeature import EnlightenFeature
+from enlighten.data.SpectrumRingBuffer import SpectrumRingBuffer
+
+from wasatch.Reading import Reading
+
+if common.use_pyside2():
+    from PySide2 import QtCore
+else:
+    from PySide6 import QtCore
+
+log = logging.getLogger(__name__)
+
+class AnalysisCaptureFeature(EnlightenFeature):
+    """
+    A full-rate "analysis capture" mode which processes EVERY Reading generated
+    by each spectrometer, rather than just the latest one as displayed on the
+    graph (see Controller.tick_acquisition).
+
+    While running, every valid Reading enqueued by each WrapperWorker is tapped
+    (via AcquisitionFeature's "enqueued" observer) onto a bounded backlog. A
+    GUI-thread timer drains the backlog, running each Reading through the
+    post-processing chain in Controller.process_reading(capture=True), which
+    skips graphing, plugins, library matching and other UI side-effects.
+
+    Results are stored in a per-spectrometer SpectrumRingBuffer, and optionally
+    appended to a CSV file (one row per spectrum) in the SaveOptions "today"
+    directory.
+
+    Counters are kept of Readings received, processed, skipped (incomplete scan
+    averages, or otherwise rejected by the processing chain), and dropped. Drops
+    are either Readings which overflowed the backlog, or gaps in the Reading
+    session_count (e.g. the spectrometer's own queue overflowed).
+
+    This does NOT change what is graphed, and it does not affect the normal
+    "latest Reading" acquisition path.
+
+    Configuration (section "AnalysisCapture"):
+
+    - capacity: frames held in each ring buffer (default 1000)
+    - max_backlog: maximum unprocessed Readings before dropping (default 1000)
+    - save: whether to also write processed spectra to CSV (default False)
+
+    Toggled with Ctrl-Shift-A.
+    """
+
+    SECTION = "AnalysisCapture"
+    TICK_MS = 20
+
+    def __init__(self, ctl):
+        super().__init__(ctl)
+
+        self.capacity    = self.ctl.config.get_int (self.SECTION, "capacity",    default=1000)
+        self.max_backlog = self.ctl.config.get_int (self.SECTION, "max_backlog", default=1000)
+        self.save        = self.ctl.config.get_bool(self.SECTION, "save")
+
+        self.running = False
+        self.lock = threading.Lock()
+        self.backlog = deque()
+        self.buffers = {}             # device_id -> SpectrumRingBuffer
+        self.files = {}               # device_id -> open file
+        self.last_session_count = {}  # device_id -> int
+        self.start_time = None
+        self.reset_counters()
+
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+
+        self.ctl.acquisition.register_observer(self.enqueued, "enqueued")
+
+    def reset_counters(self):
+        self.received = 0
+        self.processed = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    def stop(self):
+        if self.running:
+            self.stop_capture()
+
+    ############################################################################
+    # public
+    ############################################################################
+
+    def toggle_callback(self):
+        if self.running:
+            self.stop_capture()
+        else:
+            self.start_capture()
+
+    def start_capture(self):
+        if self.running:
+            return
+
+        with self.lock:
+            self.backlog.clear()
+            self.reset_counters()
+            self.buffers = {}
+            self.last_session_count = {}
+            self.start_time = datetime.datetime.now()
+            self.running = True
+
+        log.info(f"analysis capture started (capacity {self.capacity}, max_backlog {self.max_backlog}, save {self.save})")
+        self.ctl.marquee.info("analysis capture started", persist=True, token="analysis_capture")
+        self.timer.start(self.TICK_MS)
+
+    def stop_capture(self):
+        if not self.running:
+            return
+
+        self.running = False
+        self.timer.stop()
+
+        # process anything still outstanding
+        self.drain()
+        self.backlog.clear()
+        self.close_files()
+
+        elapsed_sec = (datetime.datetime.now() - self.start_time).total_seconds()
+        msg = f"analysis capture stopped: {self.summary()} in {elapsed_sec:.1f}sec"
+        log.info(msg)
+        self.ctl.marquee.info(msg, persist=True, token="analysis_capture")
+
+    def summary(self):
+        return f"processed {self.processed}, skipped {self.skipped}, dropped {self.dropped} (received {self.received})"
+
+    def get_buffer(self, device_id=None):
+        """ @returns the SpectrumRingBuffer for the given (or current) spectrometer """
+        if device_id is None:
+            spec = self.ctl.multispec.current_spectrometer()
+            if spec is None:
+                return
+            device_id = spec.device_id
+        return self.buffers.get(device_id, None)
+
+    def get_spectra(self, device_id=None):
+        """ @returns 2D array of processed spectra, oldest first """
+        buf = self.get_buffer(device_id)
+        return buf.get_spectra() if buf else None
+
+    ############################################################################
+    # WrapperWorker thread
+    ############################################################################
+
+    def enqueued(self, value):
+        """
+        AcquisitionFeature observer. This is called from the WrapperWorker thread,
+        so do nothing more than queue a reference.
+        """
+        if not self.running:
+            return
+
+        device_id, response = value
+        reading = response.data if response is not None else None
+        if type(reading) is not Reading or reading.spectrum is None or reading.failure is not None:
+            return
+
+        with self.lock:
+            self.received += 1
+
+            # look for gaps in the device's Reading sequence
+            session_count = reading.session_count
+            last = self.last_session_count.get(device_id, None)
+            if last is not None and session_count > last + 1:
+                self.dropped += session_count - last - 1
+            self.last_session_count[device_id] = session_count
+
+            if len(self.backlog) >= self.max_backlog:
+                self.dropped += 1
+            else:
+                self.backlog.append((device_id, reading))
+
+    ############################################################################
+    # GUI thread
+    ############################################################################
+
+    def tick(self):
+        if not self.running:
+            return
+
+        self.drain()
+
+        if self.running and not self.ctl.shutting_down:
+            self.timer.start(self.TICK_MS)
+
+    def drain(self):
+        # only process what was queued on entry, so we yield back to the event
+        # loop even if Readings are arriving faster than we can process them
+        with self.lock:
+            count = len(self.backlog)
+
+        for _ in range(count):
+            with self.lock:
+                if not self.backlog:
+                    break
+                device_id, reading = self.backlog.popleft()
+            self.process(device_id, reading)
+
+    def process(self, device_id, reading):
+        spec = self.ctl.multispec.get_spectrometer(device_id)
+        if spec is None:
+            self.skipped += 1
+            return
+
+        session_count = reading.session_count
+        try:
+            pr = self.ctl.process_reading(reading, spec=spec, capture=True)
+        except:
+            log.error(f"analysis capture: failed to process Reading {session_count}", exc_info=1)
+            pr = None
+
+        if pr is None or not pr.has_processed():
+            self.skipped += 1
+            return
+
+        spectrum = pr.get_processed(fast=True)
+        timestamp = reading.timestamp.timestamp() if reading.timestamp else 0.0
+
+        if device_id not in self.buffers:
+            self.buffers[device_id] = SpectrumRingBuffer(self.capacity)
+        self.buffers[device_id].add(spectrum, session_count=session_count, timestamp=timestamp)
+
+        if self.save:
+            self.write(spec, pr, spectrum, session_count, timestamp)
+
+        self.processed += 1
+
+    ############################################################################
+    # file i/o
+    ############################################################################
+
+    def write(self, spec, pr, spectrum, session_count, timestamp):
+        device_id = spec.device_id
+        f = self.files.get(device_id, None)
+        if f is None:
+            f = self.open_file(spec, pr)
+            if f is None:
+                return
+            self.files[device_id] = f
+
+        values = ",".join([f"{v:.2f}" for v in spectrum])
+        f.write(f"{session_count},{timestamp:.6f},{values}\n")
+
+    def open_file(self, spec, pr):
+        ts = self.start_time.strftime("%Y%m%d-%H%M%S")
+        sn = spec.settings.eeprom.serial_number
+        pathname = os.path.join(self.ctl.save_options.generate_today_dir(), f"capture-{sn}-{ts}.csv")
+        try:
+            f = open(pathname, "w")
+        except:
+            log.error(f"analysis capture: unable to open {pathname}", exc_info=1)
+            self.save = False
+            return
+
+        # header rows: x-axis
+        for label, axis in [ ("Pixel", pr.get_pixel_axis()),
+                             ("Wavelength", pr.get_wavelengths()),
+                             ("Wavenumber", pr.get_wavenumbers()) ]:
+            if axis is not None:
+                f.write(f"{label},," + ",".join([f"{v:.2f}" for v in axis]) + "\n")
+        f.write("Session Count,Timestamp\n")
+
+        log.info(f"analysis capture: saving {sn} to {pathname}")
+        return f
+
+    def close_files(self):
+        for device_id, f in self.files.items():
+            try:
+                f.close()
+            except:
+                log.error(f"analysis capture: error closing file for {device_id}", exc_info=1)
+        self.files = {}
@@ -22,6 +22,21 @@ from wasatch import utils as wasatch_utils
 
 log = logging.getLogger(__name__)
 
+def copy_processed_reading(pr):
+    """
+    Deep-copy a ProcessedReading, except for read-only dark and reference 
+    snapshots (see SpectrometerApplicationState.set_dark), which are immutable
+    and so can be shared by every Measurement using them.
+    """
+    if pr is None:
+        return None
+
+    memo = {}
+    for a in [ pr.dark, pr.reference ]:
+        if isinstance(a, np.ndarray) and not a.flags.writeable:
+            memo[id(a)] = a
+    return copy.deepcopy(pr, memo)
+
 ##
 # Encapsulates a single saved measurement from one spectrometer, comprising
 # a ProcessedReading (optionally containing the original Reading object that
@@ -218,10 +233,14 @@ class Measurement:
                            'Library Match',
                            'Library Score',
                            'Library Engine',
+                           'Library Mixture',
+                           'Library Mixture Residual',
+                           'Library Match Session Count',
                            'Scan Averaging',
                            'Boxcar',
                            'Technique',
                            'Baseline Correction Algo',
+                           'Baseline Source Session Count',
                            'ROI Pixel Start',
                            'ROI Pixel End',
                            'ROI Start Line',
@@ -252,7 +271,9 @@ class Measurement:
                            'DALAI Model Name',
                            'Image Format',
                            'Session Count',
-                           'Plugin Name']
+                           'Plugin Name',
+                           'Queue Depth',
+                           'Dropped Readings']
 
     EXTRA_HEADER_FIELDS_SET = set(EXTRA_HEADER_FIELDS)
 
@@ -351,7 +372,7 @@ class Measurement:
             # and laser temperature.  For now, assuming we DON'T, and just taking
             # the ProcessedReading. (Taking a deepcopy, because with plug-ins who
             # knows...)
-            self.processed_reading  = copy.deepcopy(spec.app_state.processed_reading)
+            self.processed_reading  = copy_processed_reading(spec.app_state.processed_reading)
             self.technique          = spec.app_state.technique_name
             self.timestamp          = datetime.datetime.now()
             self.baseline_correction_algo = spec.app_state.baseline_correction_algo
@@ -372,7 +393,7 @@ class Measurement:
         elif measurement:
             log.debug("instantiating from existing measurement %s", measurement.measurement_id)
             self.settings          = copy.deepcopy(measurement.settings)
-            self.processed_reading = copy.deepcopy(measurement.processed_reading)
+            self.processed_reading = copy_processed_reading(measurement.processed_reading)
             self.ctl               = measurement.ctl
             self.timestamp         = datetime.datetime.now()
 
@@ -398,7 +419,7 @@ class Measurement:
         # clean for exporting
         m.thumbnail_widget = None
         m.settings = copy.deepcopy(self.settings)
-        m.processed_reading = copy.deepcopy(self.processed_reading)
+        m.processed_reading = copy_processed_reading(self.processed_reading)
 
         return m
 
@@ -875,7 +896,11 @@ class Measurement:
         else: 
             if field == "auto-raman":            return False
             if field == "integration time":      return self.settings.state.integration_time_ms
-            if field == "scan averaging":        return self.settings.state.scans_to_average
+            if field == "scan averaging":
+                # software-averaged (ScanAveragingFeature), where the driver's is 1
+                if reading and reading.averaged and getattr(reading, "noise", None) is not None:
+                    return reading.sum_count
+                return self.settings.state.scans_to_average
             if field == "ccd gain":              return self.settings.state.gain_db if self.settings.is_sig() else self.settings.eeprom.detector_gain
 
         if field == "enlighten version":         return common.VERSION
@@ -891,6 +916,7 @@ class Measurement:
         if field == "temperature":               return reading.detector_temperature_degC if reading else "NA"
         if field == "technique":                 return self.technique
         if field == "baseline correction algo":  return self.baseline_correction_algo
+        if field == "baseline source session count": return getattr(self.processed_reading, "baseline_source_session_count", None)
         if field == "ccd c0":                    return 0 if len(wavecal) < 1 else wavecal[0]
         if field == "ccd c1":                    return 0 if len(wavecal) < 2 else wavecal[1]
         if field == "ccd c2":                    return 0 if len(wavecal) < 3 else wavecal[2]
@@ -907,6 +933,9 @@ class Measurement:
         if field == "library match":             return self.processed_reading.library_matching_compound
         if field == "library score":             return self.processed_reading.library_matching_score
         if field == "library engine":            return self.processed_reading.library_matching_engine
+        if field == "library mixture":           return getattr(self.processed_reading, "library_matching_mixture", None)
+        if field == "library mixture residual":  return getattr(self.processed_reading, "library_matching_mixture_residual", None)
+        if field == "library match session count": return getattr(self.processed_reading, "library_matching_session_count", None)
         if field == "dalai model name":          return self.get_dalai_metadata("dalai_model_name", target=target)
         if field == "dalai model label":         return self.get_dalai_metadata("dalai_model_label", target=target)
         if field == "roi pixel start":           return self.settings.eeprom.multi_wavelength_calibration.get("roi_horizontal_start")
@@ -934,6 +963,8 @@ class Measurement:
         if field == "suffix":                    return self.suffix
         if field == "session count":             return reading.session_count if reading else 0
         if field == "plugin name":               return self.plugin_name
+        if field == "queue depth":               return getattr(self.processed_reading, "queue_depth", 0)
+        if field == "dropped readings":          return getattr(self.processed_reading, "dropped_reading_count", 0)
         if field == "image format":              return reading.image_format if reading else None
         if field == "preset":                    return self.ctl.presets.selected_preset if self.ctl else None
         if field == "laser power mw":            return reading.laser_power_mW if (reading and reading.laser_power_mW is not None and reading.laser_power_mW > 0) else ""
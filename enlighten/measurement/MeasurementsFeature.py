@@ -1039,13 +1039,11 @@ class MeasurementsFeature(EnlightenFeature):
 
             # Generate TEMPORARY interpolation of each Measurement (don't change
             # clipboard object). Keep handle to "first" Measurement, for use in
-            # exporting the x-axis.
-            first = None
-            interpolated = {}
-            for m in self.export_measurements_csv:
-                interpolated[m] = self.ctl.interp.process(m.processed_reading, save=False)
-                if first is None:
-                    first = interpolated[m]
+            # exporting the x-axis. Measurements sharing a wavecal are
+            # interpolated together.
+            prs = self.ctl.interp.process_batch([ m.processed_reading for m in self.export_measurements_csv ], save=False)
+            interpolated = dict(zip(self.export_measurements_csv, prs))
+            first = prs[0] if prs else None
 
             for pixel in range(self.ctl.interp.total_pixels()):
                 row = []
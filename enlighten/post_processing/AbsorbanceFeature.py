@@ -1,5 +1,4 @@
 import logging
-import math
 
 from enlighten.EnlightenFeature import EnlightenFeature
 
@@ -9,14 +8,11 @@ class AbsorbanceFeature(EnlightenFeature):
     """
     Computes absorbance using Beer's Law.
 
-    Note that any required cropping is performed within TransmissionFeature.
+    Note that any required cropping is performed within transmission.
 
     @see [Beer-Lambert Law](https://en.wikipedia.org/wiki/Beer%E2%80%93Lambert_law)
     """
 
-    ## above this it's likely bad data, based on current model performance 
-    MAX_AU = 6.0    
-
     def __init__(self, ctl):
         super().__init__(ctl)
 
@@ -25,37 +21,14 @@ class AbsorbanceFeature(EnlightenFeature):
         Computes absorbance from the current processed spectrum,
         then stores it back into 'processed.'
 
-        @returns False if transmission can't be computed, or value exceeds MAX_AU
-        @todo optimize with Numpy
+        @returns False if transmission can't be computed, or value exceeds 
+                 ProcessingEngine.MAX_AU
         """
-        pr = processed_reading
-
-        if not self.ctl.transmission.process(pr, settings, app_state):
-            log.error("can't compute absorbance w/o transmission")
-            return False
-
-        saturated = False
-        absorbance = []
-        trans = pr.get_processed()
-        for t_perc in trans:
-            au = 0
-            t = t_perc / 100.0
-            if t != 0:
-                if t > 0:
-                    try:
-                        au = -1.0 * math.log10(t)
-                    except:
-                        pass
-                else:
-                    au = AbsorbanceFeature.MAX_AU
-                    saturated = True
-            absorbance.append(au)
-
-        log.debug(f"calling pr.set_processed({absorbance[:5]})")
-        pr.set_processed(absorbance)
-
-        if saturated:
-            self.ctl.marquee.error("absorbance out-of-range")
-            return False # (even though we did update array for graphing)
-
-        return True
+        ok, msg = self.ctl.processing_engine.absorbance(
+            processed_reading, 
+            settings, 
+            reference_is_dark_corrected = app_state.reference_is_dark_corrected,
+            max_perc                    = self.ctl.transmission.get_max_perc())
+        if msg:
+            self.ctl.marquee.error(msg)
+        return ok
@@ -0,0 +1,153 @@
+import threading
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+class AveragingEngine:
+    """
+    Software scan averaging of successive spectra from one detector, updated in
+    O(pixels) per frame, so an averaged spectrum is available after every
+    integration rather than once per N.
+
+    Modes:
+
+    - rolling: mean and variance of the last N spectra, using Welford's
+      online algorithm (adding the new spectrum, and removing the one falling
+      out of the window, from the running mean and sum of squared deviations)
+    - exponential: exponentially-weighted mean and variance with alpha =
+      2 / (N + 1) (i.e. a span of N), which needs no history at all
+
+    Along with the mean, each update yields the per-pixel variance of the
+    individual spectra, and from that the noise (standard error) of the
+    averaged spectrum itself.
+
+    Each Spectrometer has its own instance (SpectrometerApplicationState.
+    averaging_engine). State is discarded when the mode, N or pixel count
+    changes, or on reset (e.g. when acquisition is paused).
+    """
+
+    MODES = [ "rolling", "exponential" ]
+
+    # rolling: recompute the sums from the window this often (in windows), to
+    # stop floating-point drift accumulating from the incremental removals
+    RESYNC_WINDOWS = 64
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def __str__(self):
+        return f"AveragingEngine <mode {self.mode}, count {self.count} of {self.window}>"
+
+    def reset(self):
+        with self.lock:
+            self.mode = None
+            self.window = 0
+            self.count = 0          # spectra currently contributing (rolling: <= window)
+            self.mean = None
+            self.m2 = None          # rolling: sum of squared deviations; exponential: variance
+            self.buffer = None      # rolling: (window, pixels) ring buffer
+            self.index = 0          # rolling: next row to overwrite
+            self.updates = 0        # rolling: since the sums were last recomputed
+
+    def add(self, spectrum, window, mode="rolling"):
+        """
+        @param window (Input) N (spectra averaged, or span of the exponential)
+        @param mode (Input) see MODES
+        @returns tuple of (mean, noise, count), where mean is the averaged
+                 spectrum, noise is the per-pixel standard error of the mean
+                 and count is how many spectra were averaged (exponential:
+                 saturates at window)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"unknown averaging mode {mode}")
+
+        x = np.asarray(spectrum, dtype=np.float64)
+        window = max(1, int(window))
+
+        with self.lock:
+            if mode != self.mode or window != self.window or self.mean is None or len(self.mean) != len(x):
+                self.start(x, window, mode)
+            elif mode == "rolling":
+                self.add_rolling(x)
+            else:
+                self.add_exponential(x)
+
+            return self.mean.copy(), self.get_noise(), self.count
+
+    def start(self, x, window, mode):
+        self.mode = mode
+        self.window = window
+        self.count = 1
+        self.mean = x.copy()
+        self.m2 = np.zeros(len(x))
+        self.index = 0
+        self.updates = 0
+        if mode == "rolling":
+            self.buffer = np.empty((window, len(x)))
+            self.buffer[0] = x
+            self.index = 1 % window
+        else:
+            self.buffer = None
+
+    def add_rolling(self, x):
+        mean, m2 = self.mean, self.m2
+
+        if self.count == self.window:
+            # remove the oldest spectrum (Welford in reverse)
+            old = self.buffer[self.index]
+            n = self.count - 1
+            if n == 0:
+                mean[:] = 0
+                m2[:] = 0
+            else:
+                delta = old - mean
+                mean -= delta / n
+                m2 -= delta * (old - mean)
+            self.count = n
+
+        # add the new one
+        self.count += 1
+        delta = x - mean
+        mean += delta / self.count
+        m2 += delta * (x - mean)
+        np.maximum(m2, 0, out=m2)
+
+        self.buffer[self.index] = x
+        self.index = (self.index + 1) % self.window
+
+        self.updates += 1
+        if self.updates >= self.RESYNC_WINDOWS * self.window:
+            history = self.buffer[:self.count]
+            mean[:] = history.mean(axis=0)
+            m2[:] = np.square(history - mean).sum(axis=0)
+            self.updates = 0
+
+    def add_exponential(self, x):
+        alpha = 2.0 / (self.window + 1)
+        delta = x - self.mean
+        self.mean += alpha * delta
+        self.m2 *= 1 - alpha
+        self.m2 += (1 - alpha) * alpha * np.square(delta)
+        self.count = min(self.count + 1, self.window)
+
+    def get_variance(self):
+        """ @returns per-pixel variance of the individual spectra """
+        if self.mean is None:
+            return None
+        if self.mode == "rolling":
+            return self.m2 / (self.count - 1) if self.count > 1 else np.zeros(len(self.mean))
+        return self.m2.copy()
+
+    def get_noise(self):
+        """ @returns per-pixel standard error of the averaged spectrum """
+        variance = self.get_variance()
+        if variance is None:
+            return None
+        if self.mode == "rolling":
+            return np.sqrt(variance / self.count)
+
+        # an EWMA with weight alpha has the variance of a mean of (2 - alpha) / alpha samples
+        alpha = 2.0 / (self.window + 1)
+        return np.sqrt(variance * alpha / (2 - alpha))
@@ -0,0 +1,77 @@
+import numpy as np
+
+from numpy.lib.stride_tricks import sliding_window_view
+
+class BandedKernel:
+    """
+    A square matrix which is zero more than half_width pixels from the
+    diagonal, such as the Gaussian point-spread function used by
+    Richardson-Lucy deconvolution (ProcessingEngine.generate_gaussian).
+
+    Only the band is stored, as a (pixels, 2 * half_width + 1) array where
+    band[i, k] is the coefficient of dense[i, i + k - half_width] (coefficients
+    falling outside the matrix are zero). Multiplying by a vector is then
+    O(pixels * half_width) rather than O(pixels²).
+
+    The transposed band is also kept, as deconvolution multiplies by both the
+    kernel and its transpose each iteration.
+    """
+
+    def __init__(self, band):
+        self.band = np.ascontiguousarray(band, dtype=np.float64)
+        self.pixels, width = self.band.shape
+        self.half_width = width // 2
+
+        # band_t[j, m] = dense[j + m - half_width, j] = band[j + m - half_width, 2 * half_width - m]
+        hw = self.half_width
+        self.band_t = np.zeros_like(self.band)
+        for m in range(width):
+            offset = m - hw
+            lo, hi = max(0, -offset), min(self.pixels, self.pixels - offset)
+            self.band_t[lo:hi, m] = self.band[lo + offset:hi + offset, 2 * hw - m]
+
+    def __len__(self):
+        return self.pixels
+
+    def __str__(self):
+        return f"BandedKernel <pixels {self.pixels}, half_width {self.half_width}>"
+
+    @property
+    def shape(self):
+        return (self.pixels, self.pixels)
+
+    @property
+    def T(self):
+        transposed = BandedKernel.__new__(BandedKernel)
+        transposed.band, transposed.band_t = self.band_t, self.band
+        transposed.pixels, transposed.half_width = self.pixels, self.half_width
+        return transposed
+
+    def matvec(self, x, out=None, transpose=False, padded=None):
+        """
+        @param padded (Input) optional scratch buffer of pixels + 2 * half_width
+        @returns dense @ x (or dense.T @ x)
+        """
+        hw = self.half_width
+        if padded is None:
+            padded = np.empty(self.pixels + 2 * hw)
+        padded[:hw] = 0
+        padded[hw + self.pixels:] = 0
+        padded[hw:hw + self.pixels] = x
+        windows = sliding_window_view(padded, 2 * hw + 1)
+        band = self.band_t if transpose else self.band
+        return np.einsum("ij,ij->i", band, windows, out=out)
+
+    def __matmul__(self, x):
+        return self.matvec(x)
+
+    def dense(self):
+        """ @returns the equivalent (pixels, pixels) ndarray (for tests and debugging) """
+        hw = self.half_width
+        matrix = np.zeros(self.shape)
+        for k in range(2 * hw + 1):
+            offset = k - hw
+            lo, hi = max(0, -offset), min(self.pixels, self.pixels - offset)
+            rows = np.arange(lo, hi)
+            matrix[rows, rows + offset] = self.band[lo:hi, k]
+        return matrix
@@ -1,5 +1,6 @@
-import numpy as np
+import threading
 import logging
+import time
 
 from superman.baseline import BL_CLASSES, AirPLS
 
@@ -10,6 +11,46 @@ from enlighten.util import unwrap
 
 log = logging.getLogger(__name__)
 
+class BaselineResult:
+    """ A baseline generated from a given Reading. """
+    def __init__(self, baseline, algo_name, session_count, x_axis_len):
+        self.baseline      = baseline
+        self.algo_name     = algo_name
+        self.session_count = session_count  # Reading.session_count of the source spectrum
+        self.x_axis_len    = x_axis_len
+        self.timestamp     = time.monotonic()
+
+class BaselineWorker(threading.Thread):
+    """
+    Generates baselines in the background for BaselineCorrectionFeature's 
+    asynchronous mode. Requests are "latest-wins": each spectrometer has at 
+    most one pending request, and a newer spectrum replaces one which hasn't
+    been started yet. Exits when feature.running is cleared.
+    """
+    def __init__(self, feature):
+        threading.Thread.__init__(self)
+        self.feature = feature
+
+    def run(self):
+        log.debug("BaselineWorker: running")
+        feature = self.feature
+        while True:
+            with feature.condition:
+                while feature.running and not feature.pending:
+                    feature.condition.wait()
+                if not feature.running:
+                    break
+                device_id, request = feature.pending.popitem()
+
+            (spec, spectrum, x_axis, session_count) = request
+            try:
+                result = feature.fit(spec, spectrum, x_axis, session_count)
+                if result is not None:
+                    feature.store_result(device_id, result)
+            except:
+                log.error("BaselineWorker: exception generating baseline", exc_info=1)
+        log.debug("BaselineWorker: exiting")
+
 class BaselineCorrectionFeature(EnlightenFeature):
     """
     Encapsulates baseline correction.
@@ -53,6 +94,20 @@ class BaselineCorrectionFeature(EnlightenFeature):
     I wasn't able to get Mario working, and Wavelet had an unmet dependency (fixed),
     but most are now exposed by ENLIGHTEN.
     
+    @par Asynchronous mode
+
+    Optionally ([baseline_correction] async = True), baselines are generated 
+    by a background BaselineWorker, and each spectrum has subtracted the most
+    recent baseline available for its spectrometer, so that an expensive algo
+    doesn't limit the frame rate. If that baseline is more than max_age_frames
+    Readings or max_age_ms old (or doesn't match the current algo or x-axis),
+    the spectrum is processed synchronously instead. The Reading the baseline 
+    came from is recorded as ProcessedReading.baseline_source_session_count
+    (and saved as "Baseline Source Session Count").
+
+    Readings without a session count (e.g. reprocessed measurements) are 
+    always processed synchronously.
+
     @see https://link.springer.com/content/pdf/10.1007%2Fs13320-018-0512-y.pdf
     @see https://arxiv.org/ftp/arxiv/papers/1306/1306.4156.pdf 
     """
@@ -79,6 +134,21 @@ class BaselineCorrectionFeature(EnlightenFeature):
         self.airpls_max_iters = 500
         self.airpls_conv_thresh = 8e-4
 
+        # carry AirPLS/ALS weights and factorizations between frames (BaselineEngine)
+        self.warm_start = True
+
+        # asynchronous mode (see class comment)
+        self.use_async = False
+        self.max_age_frames = 5
+        self.max_age_ms = 1000
+
+        self.worker = None
+        self.running = False
+        self.condition = threading.Condition()
+        self.pending = {}               # device_id -> latest request for BaselineWorker
+        self.results = {}               # device_id -> latest BaselineResult
+        self.fit_lock = threading.Lock() # superman algos store their last fit on the algo object
+
         # first check whether one should be selected and/or enabled
         self.init_from_config()
 
@@ -155,6 +225,10 @@ class BaselineCorrectionFeature(EnlightenFeature):
         set_field("airpls_max_iters",             self.ctl.config.get_int  (s, "airpls_max_iters",             default=None))
         set_field("airpls_smoothness_param",      self.ctl.config.get_int  (s, "airpls_smoothness_param",      default=None))
         set_field("airpls_conv_thresh",           self.ctl.config.get_float(s, "airpls_conv_thresh",           default=None))
+        set_field("warm_start",                   self.ctl.config.get_bool (s, "warm_start",                   default=None))
+        set_field("use_async",                    self.ctl.config.get_bool (s, "async",                        default=None))
+        set_field("max_age_frames",               self.ctl.config.get_int  (s, "max_age_frames",               default=None))
+        set_field("max_age_ms",                   self.ctl.config.get_int  (s, "max_age_ms",                   default=None))
 
     def init_algos(self):
         """
@@ -261,6 +335,7 @@ class BaselineCorrectionFeature(EnlightenFeature):
         @param pr   (In/Out) ProcessedReading
         @param spec (Input)  Spectrometer
         @note uses cropped spectrum if found
+        @note may be called from a worker thread (see display)
         """
         # log.debug("process: show_curve %s, enabled %s, algo %s, pr %s", self.show_curve, self.enabled, self.algo, pr)
 
@@ -280,16 +355,28 @@ class BaselineCorrectionFeature(EnlightenFeature):
         spectrum = pr.get_processed()
         x_axis = self.ctl.generate_x_axis(spec=spec, cropped=pr.is_cropped())
 
-        baseline = self.generate_baseline(spectrum=spectrum, x_axis=x_axis)
-        if baseline is None:
+        session_count = pr.reading.session_count if pr.reading is not None else None
+        result = None
+        if self.use_async and session_count is not None:
+            result = self.get_async_result(spec, spectrum, x_axis, session_count)
+
+        if result is None:
+            result = self.fit(spec, spectrum, x_axis, session_count)
+            if result is not None and self.use_async and session_count is not None:
+                self.store_result(spec.device_id, result)
+
+        if result is None:
             log.error("unable to generate baseline")
             return 
 
+        baseline = result.baseline
+        pr.baseline_source_session_count = result.session_count
+
         # generate the baseline and optionally display it, even if we're not 
-        # enabled and therefore not applying the corrected baseline
+        # enabled and therefore not applying the corrected baseline (graphed
+        # later on the GUI thread by display)
         if self.show_curve and self.ctl.multispec.is_current_spectrometer(spec):
-            # log.debug("showing baseline: %s", baseline)
-            self.curve.setData(y=baseline, x=x_axis)
+            pr.baseline_curve = (x_axis, baseline)
 
         if not self.enabled:
             # log.debug("not enabled, so returning unmodified spectrum")
@@ -298,26 +385,84 @@ class BaselineCorrectionFeature(EnlightenFeature):
         spec.app_state.baseline_correction_algo = self.current_algo_name
 
         # log.debug("subtracting baseline of %d pixels", len(baseline))
-        corrected = np.subtract(spectrum, baseline)
-        corrected[corrected < 0] = 0
+        self.ctl.processing_engine.subtract_baseline(pr, baseline)
 
-        pr.set_processed(corrected)
+    def display(self, pr, spec):
+        """ Graph any baseline generated by process (GUI thread). """
+        curve_data = getattr(pr, "baseline_curve", None)
+        if curve_data is None or self.curve is None:
+            return
 
-    def generate_baseline(self, spectrum, x_axis):
-        intensities = np.array(spectrum, dtype=np.float64)
-        bands       = np.array(x_axis, dtype=np.float64)
+        if self.show_curve and self.ctl.multispec.is_current_spectrometer(spec):
+            # log.debug("showing baseline: %s", baseline)
+            x_axis, baseline = curve_data
+            self.ctl.graph.set_data(self.curve, y=baseline, x=x_axis)
+
+    def fit(self, spec, spectrum, x_axis, session_count):
+        """ @returns BaselineResult (None on error) """
+        with self.fit_lock:
+            name = self.current_algo_name
+            baseline = self.generate_baseline(spectrum=spectrum, x_axis=x_axis, spec=spec)
+        if baseline is None:
+            return
+        return BaselineResult(baseline, name, session_count, len(x_axis))
 
-        try:
-            fitted = self.algo.fit(
-                bands       = bands, 
-                intensities = intensities, 
-                segment     = False,              # doesn't seem to matter?
-                invert      = False)
-
-            baseline = np.clip(fitted.baseline, -65535, 65535)
-            return baseline
-        except:
-            log.error("exception in baseline_correction.generate_baseline with algo %s", self.current_algo_name, exc_info=1)
+    def get_async_result(self, spec, spectrum, x_axis, session_count):
+        """
+        Queue the spectrum for the BaselineWorker, and return the most recent
+        baseline for this spectrometer, if still usable.
+
+        @returns BaselineResult (None if the caller should block)
+        """
+        device_id = spec.device_id
+
+        if self.worker is None:
+            self.running = True
+            self.worker = BaselineWorker(self)
+            self.worker.daemon = True
+            self.worker.start()
+
+        with self.condition:
+            self.pending[device_id] = (spec, list(spectrum), list(x_axis), session_count)
+            self.condition.notify()
+
+            result = self.results.get(device_id, None)
+
+        if result is None:
+            return
+
+        if result.algo_name != self.current_algo_name or result.x_axis_len != len(x_axis):
+            return
+
+        age_frames = session_count - result.session_count
+        age_ms = (time.monotonic() - result.timestamp) * 1000.0
+        if age_frames < 0 or age_frames > self.max_age_frames or age_ms > self.max_age_ms:
+            log.debug(f"get_async_result: stale baseline ({age_frames} frames, {age_ms:.0f}ms)")
+            return
+
+        return result
+
+    def store_result(self, device_id, result):
+        """ keep the newest baseline (by source Reading) for each spectrometer """
+        with self.condition:
+            latest = self.results.get(device_id, None)
+            if latest is None or latest.session_count is None or result.session_count >= latest.session_count:
+                self.results[device_id] = result
+
+    def stop(self):
+        if self.worker is not None:
+            log.debug("stopping BaselineWorker")
+            with self.condition:
+                self.running = False
+                self.pending = {}
+                self.condition.notify()
+            self.worker = None
+
+    def generate_baseline(self, spectrum, x_axis, spec=None):
+        baseline_engine = None
+        if spec is not None and self.warm_start:
+            baseline_engine = spec.app_state.baseline_engine
+        return self.ctl.processing_engine.generate_baseline(self.algo, spectrum, x_axis, name=self.current_algo_name, baseline_engine=baseline_engine)
 
     def set_enabled(self, value):
         value = value if isinstance(value, bool) else value.lower() == "true"
@@ -0,0 +1,167 @@
+import threading
+import logging
+import numpy as np
+
+from functools import lru_cache
+from scipy.linalg import cholesky_banded, cho_solve_banded
+
+log = logging.getLogger(__name__)
+
+@lru_cache(maxsize=16)
+def _penalty_bands(pixels, smoothness, deriv_order):
+    """
+    @returns upper bands of smoothness * D'D, where D is the deriv_order
+             difference operator, in LAPACK upper banded storage (as built by
+             superman.baseline.common.WhittakerSmoother)
+    """
+    d = np.zeros(deriv_order * 2 + 1, dtype=int)
+    d[deriv_order] = 1
+    d = np.diff(d, n=deriv_order)
+    k = len(d)
+    s = float(smoothness)
+
+    diag_sums = np.vstack([ np.pad(s * np.cumsum(d[-i:] * d[:i]), ((k - i, 0),), "constant") for i in range(1, k + 1) ])
+    upper_bands = np.tile(diag_sums[:, -1:], pixels)
+    upper_bands[:, :k] = diag_sums
+    for i, ds in enumerate(diag_sums):
+        upper_bands[i, -i - 1:] = ds[::-1][:i + 1]
+
+    upper_bands.flags.writeable = False
+    return upper_bands
+
+class BaselineEngine:
+    """
+    Warm-started AirPLS and ALS baselines (Whittaker smoothers with iteratively
+    reweighted penalties), carrying state from one frame to the next.
+
+    A cold start (the first frame, or with warm_start disabled) reproduces the
+    superman implementations. A warm start instead begins from the previous
+    frame's final weights, and so converges (to the same relative threshold)
+    on a baseline which can differ slightly from superman's for the same
+    spectrum; disable warm_start when results must match superman exactly.
+
+    Each Spectrometer has its own instance (SpectrometerApplicationState.
+    baseline_engine), because the state is only meaningful for successive
+    spectra from the same detector:
+
+    - the penalty matrix (smoothness * D'D) is built once per (pixels,
+      smoothness, derivative order), and shared between spectrometers
+    - the reweighting starts from the previous frame's final weights, rather
+      than all-ones, so consecutive similar spectra converge in fewer
+      iterations
+    - the Cholesky factorization of the final system is kept, so that the
+      first (often only) iteration of the next frame, which starts from the
+      same weights, is a banded back-substitution rather than a fresh
+      factorization
+
+    State is discarded when the algorithm, its parameters or the x-axis change.
+    Other superman algorithms aren't supported (see supports).
+    """
+
+    ALGOS = { "AirPLS": 1, "ALS": 2 } # class name -> derivative order of penalty (as in superman)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.warm_start = True
+        self.reset()
+
+        self.fits = 0
+        self.iterations = 0
+        self.factorizations = 0
+
+    def __str__(self):
+        return f"BaselineEngine <fits {self.fits}, iterations {self.iterations}, factorizations {self.factorizations}>"
+
+    def reset(self):
+        self.key = None
+        self.weights = None
+        self.factor = None
+        self.factor_weights = None
+
+    def supports(self, algo):
+        return algo is not None and type(algo).__name__ in self.ALGOS and hasattr(algo, "smoothness_")
+
+    def get_key(self, algo, bands):
+        params = tuple(getattr(algo, attr, None) for attr in ["smoothness_", "asymmetry_", "max_iters_", "conv_thresh_"])
+        axis = (len(bands), float(bands[0]), float(bands[-1])) if len(bands) else None
+        return (type(algo).__name__, params, axis)
+
+    def generate(self, algo, intensities, bands):
+        """
+        @param algo (Input) superman AirPLS or ALS (for its parameters)
+        @returns baseline
+        """
+        intensities = np.asarray(intensities, dtype=np.float64)
+        bands = np.asarray(bands, dtype=np.float64)
+        pixels = len(intensities)
+        name = type(algo).__name__
+
+        with self.lock:
+            key = self.get_key(algo, bands)
+            if key != self.key or not self.warm_start:
+                self.reset()
+                self.key = key
+
+            penalty = _penalty_bands(pixels, float(algo.smoothness_), self.ALGOS[name])
+            weights = self.weights if self.weights is not None else np.ones(pixels)
+
+            if name == "AirPLS":
+                baseline, weights = self.airpls(intensities, penalty, weights, algo.max_iters_, algo.conv_thresh_)
+            else:
+                baseline, weights = self.als(intensities, penalty, weights, algo.asymmetry_, algo.max_iters_, algo.conv_thresh_)
+
+            self.weights = weights
+            self.fits += 1
+            return baseline
+
+    def smooth(self, penalty, w, y):
+        """ solves (W + smoothness * D'D) z = W y, reusing the last factorization if w is unchanged """
+        if self.factor is None or not np.array_equal(w, self.factor_weights):
+            ab = penalty.copy()
+            ab[-1] += w # last row is the diagonal
+            self.factor = cholesky_banded(ab, overwrite_ab=True)
+            self.factor_weights = w.copy()
+            self.factorizations += 1
+        self.iterations += 1
+        return cho_solve_banded((self.factor, False), w * y, overwrite_b=True)
+
+    def airpls(self, intensities, penalty, w, max_iters, conv_thresh):
+        """ @see superman.baseline.airpls.airpls_baseline """
+        w = w.copy()
+        total_intensity = np.abs(intensities).sum()
+        for i in range(1, max_iters + 1):
+            baseline = self.smooth(penalty, w, intensities)
+
+            # compute error (sum of distances below the baseline)
+            corrected = intensities - baseline
+            mask = corrected < 0
+            baseline_error = -corrected[mask]
+            total_error = baseline_error.sum()
+
+            # check convergence as a fraction of total intensity
+            if total_error / total_intensity < conv_thresh:
+                break
+
+            # set peak weights to zero, and baseline weights by error
+            w[~mask] = 0
+            baseline_error /= total_error
+            w[mask] = np.exp(i * baseline_error)
+            w[0] = np.exp(i * baseline_error.min())
+            w[-1] = w[0]
+        else:
+            log.debug(f"airPLS did not converge in {max_iters} iterations")
+        return baseline, w
+
+    def als(self, intensities, penalty, w, asymmetry, max_iters, conv_thresh):
+        """ @see superman.baseline.als.als_baseline """
+        p = asymmetry
+        for i in range(max_iters):
+            baseline = self.smooth(penalty, w, intensities)
+            mask = intensities > baseline
+            new_w = p * mask + (1 - p) * (~mask)
+            if np.linalg.norm(new_w - w) < conv_thresh:
+                break
+            w = new_w
+        else:
+            log.debug(f"ALS did not converge in {max_iters} iterations")
+        return baseline, w
@@ -0,0 +1,101 @@
+import logging
+
+from enlighten.EnlightenFeature import EnlightenFeature
+from enlighten.post_processing.ProcessingPipelineFeature import ProcessingJob
+
+log = logging.getLogger(__name__)
+
+class BatchProcessingFeature(EnlightenFeature):
+    """
+    When multiple spectrometers are connected (e.g. a multichannel rig
+    triggering 8 identical units at once), collects the Readings received
+    during a single Controller.tick_acquisition, and post-processes those of
+    equal pixel count together via Controller.post_process_batch. Stages which
+    can be vectorized (dark correction, boxcar) run once across a 2D array of
+    the batch, while the rest of the chain still runs per-device.
+
+    The resulting ProcessedReadings are then rendered in the order their
+    Readings were received.
+
+    Batching is not used with a single spectrometer, for reprocessed or
+    AnalysisCapture Readings, for Readings delivered by AcquisitionFeature's
+    event-driven callbacks, or when ProcessingPipelineFeature is threaded.
+
+    Batching is opt-in, as it changes the order (and timing) in which 
+    spectrometers are processed and rendered. Currently this is only 
+    configured through enlighten.ini:
+
+        [BatchProcessing]
+        enabled = True
+    """
+
+    SECTION = "BatchProcessing"
+
+    def __init__(self, ctl):
+        super().__init__(ctl)
+
+        self.enabled = self.ctl.config.get_bool(self.SECTION, "enabled", default=False)
+
+        self.collecting = False
+        self.pending = [] # ProcessingJob
+
+    def set_enabled(self, flag):
+        self.enabled = bool(flag)
+        self.ctl.config.set(self.SECTION, "enabled", self.enabled)
+
+    def begin(self):
+        """ Called by Controller.tick_acquisition before polling spectrometers. """
+        self.collecting = self.enabled and self.ctl.multispec.count() > 1
+        self.pending = []
+
+    def defer(self, reading, spec, settings, dark=None, ref=None):
+        """
+        Called by Controller.process_reading.
+
+        @returns True if the Reading was added to the current batch, False if the
+                 caller should process it immediately
+        """
+        if not self.collecting or spec is None or self.ctl.processing_pipeline.threaded:
+            return False
+
+        self.pending.append(ProcessingJob(reading, spec, settings, dark=dark, ref=ref))
+        return True
+
+    def flush(self):
+        """ Called by Controller.tick_acquisition after polling spectrometers. """
+        self.collecting = False
+        jobs, self.pending = self.pending, []
+        if not jobs:
+            return
+
+        # group by pixel count
+        groups = {}
+        for job in jobs:
+            pixels = len(job.reading.spectrum)
+            if pixels not in groups:
+                groups[pixels] = []
+            groups[pixels].append(job)
+
+        for pixels, group in groups.items():
+            try:
+                if len(group) == 1:
+                    job = group[0]
+                    job.pr = self.ctl.post_process_reading(job.reading, job.spec, job.settings, dark=job.dark, ref=job.ref)
+                else:
+                    log.debug(f"batch-processing {len(group)} Readings of {pixels} pixels")
+                    self.ctl.post_process_batch(group)
+            except:
+                log.error(f"error batch-processing {len(group)} Readings of {pixels} pixels", exc_info=1)
+
+        for job in jobs:
+            if self.ctl.shutting_down:
+                return
+
+            # in case the spectrometer was disconnected during the tick
+            spec = job.spec
+            if job.pr is None or self.ctl.multispec.get_spectrometer(spec.device_id) is not spec:
+                continue
+
+            self.ctl.render_processed_reading(job.pr, spec, job.settings)
+
+        self.ctl.cursor.update()
@@ -1,9 +1,10 @@
 import logging
+import numpy as np
 
 from enlighten.ui.ScrollStealFilter import ScrollStealFilter
 from enlighten.EnlightenFeature import EnlightenFeature
+from enlighten.post_processing.SmoothingEngine import SmoothingEngine
 from enlighten.util import unwrap, incr_spinbox, decr_spinbox
-from wasatch.utils import apply_boxcar
 
 log = logging.getLogger(__name__)
 
@@ -11,11 +12,24 @@ class BoxcarFeature(EnlightenFeature):
     """ 
     Encapsulate a high-frequency noise smoothing "boxcar" filter which can be 
     applied at the end of post-processing. 
+
+    The half-width is set on the GUI. The filter itself defaults to a boxcar
+    (moving average), but can be changed to Savitzky-Golay or Gaussian via
+    enlighten.ini (section "Smoothing", keys "method" and "polyorder"); see
+    SmoothingEngine.
     """
 
+    SECTION = "Smoothing"
+
     def __init__(self, ctl):
         super().__init__(ctl)
 
+        self.method    = self.ctl.config.get    (self.SECTION, "method",    default="boxcar")
+        self.polyorder = self.ctl.config.get_int(self.SECTION, "polyorder", default=2)
+        if self.method not in SmoothingEngine.METHODS:
+            log.error(f"unknown smoothing method {self.method} (using boxcar)")
+            self.method = "boxcar"
+
         cfu = ctl.form.ui
 
         self.bt_dn      = cfu.pushButton_boxcar_half_width_dn
@@ -104,14 +118,63 @@ class BoxcarFeature(EnlightenFeature):
         if half_width < 1:
             return
 
-        pr.set_processed(apply_boxcar(pr.get_processed(), half_width))
+        recordable = not self.ctl.page_nav.using_reference()
+        self.ctl.processing_engine.boxcar(pr, half_width, recordable=recordable, pool=spec.app_state.array_pool, 
+                                          method=self.method, polyorder=self.polyorder)
+
+    def process_batch(self, prs, specs):
+        """
+        Batched equivalent of process, smoothing each group of equal-length 
+        spectra with the same half-width in a single call.
 
+        @param prs (In/Out) list of ProcessedReading
+        @param specs (Input) list of Spectrometer (one per ProcessedReading)
+        """
+        groups = {}
+        pools = {} # scratch buffers from the first spectrometer in each group
+        for pr, spec in zip(prs, specs):
+            if pr is None or spec is None:
+                continue
+            half_width = spec.settings.state.boxcar_half_width
+            if half_width < 1:
+                continue
+            if half_width not in groups:
+                groups[half_width] = []
+                pools[half_width] = spec.app_state.array_pool
+            groups[half_width].append(pr)
+
+        fields = [ "processed" ]
         if not self.ctl.page_nav.using_reference():
-            if pr.recordable_dark is not None:
-                pr.recordable_dark = apply_boxcar(pr.recordable_dark, half_width)
-            
-            if pr.recordable_reference is not None:
-                pr.recordable_reference = apply_boxcar(pr.recordable_reference, half_width)
+            fields.extend([ "recordable_dark", "recordable_reference" ])
+
+        for half_width, group in groups.items():
+            self.smooth_batch(group, half_width, fields, pools[half_width])
+
+    def smooth_batch(self, prs, half_width, fields, pool):
+        """ 
+        Smooth the given fields of every pr, stacking all arrays of each length
+        into a single 2D array. 
+        """
+        by_len = {}
+        for pr in prs:
+            for field in fields:
+                a = pr.get_processed() if field == "processed" else getattr(pr, field)
+                if a is None:
+                    continue
+                if len(a) not in by_len:
+                    by_len[len(a)] = ([], [])
+                by_len[len(a)][0].append((pr, field))
+                by_len[len(a)][1].append(a)
+
+        engine = self.ctl.processing_engine.smoothing
+        for pixels, (targets, arrays) in by_len.items():
+            smoothed = engine.smooth_2d(np.array(arrays, dtype=np.float64), half_width, method=self.method, pool=pool, polyorder=self.polyorder)
+            for (pr, field), a in zip(targets, smoothed):
+                if field == "processed":
+                    pr.set_processed(a.tolist())
+                else:
+                    setattr(pr, field, a.tolist())
+            pool.release(smoothed)
 
     def get_half_width(self):
         return int(self.spinbox.value())
@@ -0,0 +1,279 @@
+import logging
+import numpy as np
+
+from scipy.optimize import nnls
+
+log = logging.getLogger(__name__)
+
+class CompiledLibrary:
+    """
+    A spectral library resampled once onto a common wavenumber grid, so that a
+    spectrum can be scored against every compound with one matrix product
+    rather than one interpolation and pearsonr apiece.
+
+    Each library spectrum is linearly resampled onto the grid over its own
+    wavenumber range (so its valid region is the contiguous slice
+    start[i]:end[i]), then mean-centered and normalized to unit norm over that
+    region and stored as a row of the float32 matrix "matrix" (zero outside
+    it).
+
+    Scoring matches the legacy per-compound loop: Pearson correlation over the
+    overlap of the sample's and each compound's wavenumber range. Where the
+    sample covers a compound's whole range, its row is already standardized;
+    where it only partly overlaps, the row's sums over the overlap are
+    corrected from the same product.
+
+    The grid step is the median spacing of the library spectra, and the grid
+    spans all of them (the bundled library is already on a 1cm⁻¹ grid, so
+    resampling it is exact).
+    """
+
+    # overlaps with fewer points than this aren't scored
+    MIN_OVERLAP = 3
+
+    def __init__(self, names, spectra):
+        """
+        @param names (Input) compound names (positional, so not required to
+               be unique)
+        @param spectra (Input) list of (wavenumbers, intensities), one per name
+        """
+        spectra = [ self.clean(x, y) for x, y in spectra ]
+        kept = [ (name, xy) for name, xy in zip(names, spectra) if xy is not None ]
+        if len(kept) < len(spectra):
+            log.error(f"CompiledLibrary: ignoring {len(spectra) - len(kept)} unusable library spectra")
+
+        self.names = [ name for name, _ in kept ]
+        spectra = [ xy for _, xy in kept ]
+
+        if not spectra:
+            self.step = 1.0
+            self.grid = np.zeros(0)
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self.start = self.end = np.zeros(0, dtype=np.int64)
+            return
+
+        step = float(np.median([ np.median(np.diff(x)) for x, _ in spectra ]))
+        lo = min(x[0] for x, _ in spectra)
+        hi = max(x[-1] for x, _ in spectra)
+        self.step = step
+        self.grid = lo + step * np.arange(int(np.floor((hi - lo) / step + 1e-6)) + 1)
+
+        count = len(spectra)
+        self.matrix = np.zeros((count, len(self.grid)), dtype=np.float32)
+        self.start, self.end = self.span([ x[0] for x, _ in spectra ], [ x[-1] for x, _ in spectra ])
+
+        for i, (x, y) in enumerate(spectra):
+            region = slice(self.start[i], self.end[i])
+            self.matrix[i, region] = self.standardize(np.interp(self.grid[region], x, y))
+
+        self.grid.flags.writeable = False
+        self.matrix.flags.writeable = False
+
+    @classmethod
+    def from_arrays(cls, names, step, grid, matrix, start, end):
+        """
+        Wraps an already-compiled library (e.g. memory-mapped from a
+        LibraryCache) without resampling anything.
+        """
+        library = cls.__new__(cls)
+        library.names = list(names)
+        library.step = float(step)
+        library.grid = grid
+        library.matrix = matrix
+        library.start = np.asarray(start, dtype=np.int64)
+        library.end = np.asarray(end, dtype=np.int64)
+        if len(library.names) != len(library.matrix) or len(library.start) != len(library.names):
+            raise ValueError(f"inconsistent compiled library ({len(library.names)} names, {len(library.matrix)} rows)")
+        return library
+
+    def append(self, name, wavenumbers, intensities):
+        """
+        Adds one spectrum on the existing grid (the matrix is reallocated, but
+        nothing else is resampled).
+
+        @returns True if appended, False if the spectrum is unusable or falls
+                 outside the grid (in which case the library should be
+                 recompiled)
+        """
+        xy = self.clean(wavenumbers, intensities)
+        if xy is None or len(self.grid) == 0:
+            return False
+        x, y = xy
+
+        start, end = (int(i) for i in self.span(x[0], x[-1]))
+        if x[0] < self.grid[0] - 1e-6 * self.step or x[-1] > self.grid[-1] + 1e-6 * self.step or end - start < self.MIN_OVERLAP:
+            return False
+
+        row = np.zeros((1, len(self.grid)), dtype=np.float32)
+        row[0, start:end] = self.standardize(np.interp(self.grid[start:end], x, y))
+
+        matrix = np.vstack((self.matrix, row))
+        matrix.flags.writeable = False
+        self.matrix = matrix
+        self.start = np.append(self.start, start)
+        self.end = np.append(self.end, end)
+        self.names.append(name)
+        return True
+
+    def __str__(self):
+        return f"CompiledLibrary <{len(self)} compounds, {len(self.grid)} px>"
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def clean(wavenumbers, intensities):
+        """ @returns finite (wavenumbers, intensities), sorted by wavenumber, or None if too short """
+        x = np.asarray(wavenumbers, dtype=np.float64)
+        y = np.asarray(intensities, dtype=np.float64)
+        if x.ndim != 1 or len(x) != len(y):
+            return None
+
+        finite = np.isfinite(x) & np.isfinite(y)
+        x, y = x[finite], y[finite]
+        if len(x) < CompiledLibrary.MIN_OVERLAP:
+            return None
+
+        if np.any(np.diff(x) <= 0):
+            x, index = np.unique(x, return_index=True)
+            y = y[index]
+        return (x, y) if len(x) >= CompiledLibrary.MIN_OVERLAP else None
+
+    def span(self, first, last):
+        """ @returns (start, end) grid indices of the points within [first, last] (to within rounding) """
+        tolerance = 1e-6 * self.step
+        start = np.searchsorted(self.grid, np.asarray(first) - tolerance, side="left")
+        end   = np.searchsorted(self.grid, np.asarray(last)  + tolerance, side="right")
+        return start, end
+
+    @staticmethod
+    def standardize(y):
+        """ @returns y mean-centered and scaled to unit norm (zeros if flat) """
+        y = y - y.mean()
+        norm = np.sqrt(np.dot(y, y))
+        return y / norm if norm > 0 else y
+
+    def resample(self, wavenumbers, spectrum):
+        """
+        @returns tuple of (y, lo, hi): the sample resampled onto grid[lo:hi]
+                 (the part of the grid it covers) and standardized there, or
+                 None if it doesn't overlap the grid
+        """
+        xy = self.clean(wavenumbers, spectrum)
+        if xy is None or len(self.grid) == 0:
+            return None
+        x, y = xy
+
+        lo, hi = (int(i) for i in self.span(x[0], x[-1]))
+        if hi - lo < self.MIN_OVERLAP:
+            return None
+        return self.standardize(np.interp(self.grid[lo:hi], x, y)), lo, hi
+
+    def score(self, wavenumbers, spectrum, indices=None):
+        """
+        @param indices (Input) optional compounds to score (e.g. candidates
+               from a LibraryIndex), else all of them
+        @returns ndarray of the Pearson correlation of the sample with each
+                 compound over their overlap (NaN where they don't overlap
+                 enough to score)
+        """
+        resampled = self.resample(wavenumbers, spectrum)
+        if resampled is None:
+            return np.full(len(self) if indices is None else len(indices), np.nan)
+        return self.score_resampled(*resampled, indices=indices)
+
+    def score_resampled(self, y, lo, hi, indices=None):
+        """ as score, given the output of resample """
+        if indices is None:
+            matrix, rows_start, rows_end = self.matrix, self.start, self.end
+        else:
+            indices = np.asarray(indices, dtype=np.int64)
+            matrix, rows_start, rows_end = self.matrix[indices], self.start[indices], self.end[indices]
+
+        scores = np.full(len(matrix), np.nan)
+        if len(matrix) == 0:
+            return scores
+
+        # overlap of each compound with the sample
+        start = np.maximum(rows_start, lo)
+        end = np.minimum(rows_end, hi)
+        n = end - start
+
+        # one product yields sum(x*y) and sum(x) over the overlap for every row
+        # (x is zero outside each row's valid region)
+        columns = np.zeros((len(self.grid), 2), dtype=np.float32)
+        columns[lo:hi, 0] = y
+        columns[lo:hi, 1] = 1
+        sums = matrix @ columns
+        sxy = sums[:, 0].astype(np.float64)
+        sx = sums[:, 1].astype(np.float64)
+
+        # sum(y) and sum(y²) over each overlap from prefix sums
+        cy  = np.concatenate(([0], np.cumsum(y)))
+        cy2 = np.concatenate(([0], np.cumsum(y * y)))
+        a = np.clip(start - lo, 0, hi - lo)
+        b = np.clip(end - lo, 0, hi - lo)
+        sy = cy[b] - cy[a]
+        syy = cy2[b] - cy2[a]
+
+        # rows are unit-norm over their whole region; only rows the sample
+        # covers partly need sum(x²) over the overlap
+        sxx = np.ones(len(matrix))
+        partial = np.flatnonzero((n > 0) & ((start > rows_start) | (end < rows_end)))
+        if len(partial):
+            window = columns[:, 1]
+            sxx[partial] = np.square(matrix[partial]) @ window
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+
+        valid = n >= self.MIN_OVERLAP
+        scores[valid] = np.clip(r[valid], -1, 1)
+        return scores
+
+    def unmix(self, y, lo, hi, indices):
+        """
+        Models the sample as a non-negative mixture of the given compounds,
+        by non-negative least squares over the sample's range of the grid
+        (plus a free offset, since rows are centered over their own ranges).
+        Only len(indices) columns are solved, so the cost doesn't grow with
+        the library.
+
+        Rows are unit-norm, so fractions are of the sample's standardized
+        signal rather than of concentration.
+
+        @param y, lo, hi (Input) output of resample
+        @param indices (Input) candidate compounds
+        @returns tuple of (fractions, residual, remainder): fractions 
+                 (summing to 1, unless all are zero) per index, the norm of
+                 what the mixture leaves unexplained relative to the sample's
+                 (0-1), and that remainder itself (on grid[lo:hi])
+        """
+        y = np.asarray(y, dtype=np.float64)
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return np.zeros(0), 1.0, y
+
+        columns = np.empty((hi - lo, len(indices) + 2))
+        columns[:, :len(indices)] = self.matrix[indices, lo:hi].T
+        columns[:, -2] = 1
+        columns[:, -1] = -1
+
+        coefficients, residual = nnls(columns, y)
+        weights = coefficients[:len(indices)]
+        total = weights.sum()
+        fractions = weights / total if total > 0 else weights
+
+        norm = np.sqrt(np.dot(y, y))
+        return fractions, float(residual / norm) if norm > 0 else 1.0, y - columns @ coefficients
+
+    def get_overlap(self, index, wavenumbers):
+        """ @returns slice of the grid where compound index overlaps the given wavenumbers """
+        x = np.asarray(wavenumbers, dtype=np.float64)
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            return slice(0, 0)
+        lo, hi = self.span(x.min(), x.max())
+        lo = max(int(self.start[index]), int(lo))
+        hi = min(int(self.end[index]), int(hi))
+        return slice(lo, max(lo, hi))
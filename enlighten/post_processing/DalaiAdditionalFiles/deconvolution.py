@@ -0,0 +1,118 @@
+# Richardson-Lucy deconvolution shared by the prep_spectra_X/XM/XS modules.
+#
+# The resolution matrix only depends on the (interpolated) wavenumber axis,
+# FWHM and pad width, which rarely change between spectra, so it is generated
+# once (vectorized) and cached. The iterations are vectorized, and use the
+# banded form of the kernel (the Gaussian is truncated at TRUNCATE_SIGMA).
+
+import math
+import logging
+import numpy as np
+
+from functools import lru_cache
+
+from enlighten.post_processing.BandedKernel import BandedKernel
+
+log = logging.getLogger(__name__)
+
+PAD_WIDTH = 3 # multiples of FWHM
+MAX_ITER = 25
+TRUNCATE_SIGMA = 6
+EPS = 1e-5
+
+@lru_cache(maxsize=8)
+def _resolution_kernel(axis_bytes, fwhm, pad_width, banded):
+    wavenumbers_out = np.frombuffer(axis_bytes, dtype=np.float64)
+
+    wavenumberPerPixel = np.diff(wavenumbers_out)
+    wavenumberPerPixel = np.insert(wavenumberPerPixel, 0, wavenumberPerPixel[0])
+    avgWavenumberPerPixel = np.mean(wavenumberPerPixel)
+    avgPixelFWHM = fwhm / avgWavenumberPerPixel
+
+    # pad front and end with first/last pixel
+    padPixels = math.ceil(pad_width * avgPixelFWHM)
+    wavenumberPerPixelPadded = np.concatenate([np.repeat(wavenumberPerPixel[0], padPixels),
+                                               wavenumberPerPixel,
+                                               np.repeat(wavenumberPerPixel[-1], padPixels)])
+    pixelFWHM = fwhm / wavenumberPerPixelPadded
+    pixelSigma = pixelFWHM / (2 * math.sqrt(2 * math.log(2)))
+    pixelSigma2 = pixelSigma * pixelSigma
+
+    numPixelPadded = len(wavenumberPerPixelPadded)
+    pixels = np.arange(numPixelPadded)
+
+    maxSigma = np.max(np.abs(pixelSigma))
+    if banded and np.all(pixelSigma2 != 0) and np.isfinite(maxSigma):
+        halfWidth = max(1, int(math.ceil(TRUNCATE_SIGMA * maxSigma)))
+        if 2 * halfWidth + 1 < numPixelPadded // 2:
+            offsets = np.arange(-halfWidth, halfWidth + 1)
+            band = np.exp(-0.5 * np.square(offsets)[np.newaxis, :] / pixelSigma2[:, np.newaxis])
+            columns = pixels[:, np.newaxis] + offsets[np.newaxis, :]
+            band[(columns < 0) | (columns >= numPixelPadded)] = 0
+            band /= band.sum(axis=1)[:, np.newaxis]
+            return padPixels, BandedKernel(band)
+
+    # dense resolutionH[row, col] = exp(-0.5 * (col - row)² / sigma²[row]), rows normalized
+    with np.errstate(divide="ignore", invalid="ignore"):
+        resolutionH = np.exp(-0.5 * np.square(pixels[np.newaxis, :] - pixels[:, np.newaxis]) / pixelSigma2[:, np.newaxis])
+        resolutionH /= resolutionH.sum(axis=1)[:, np.newaxis]
+
+    # (as before) rows with zero sigma are flat
+    resolutionH[pixelSigma2 == 0] = 1
+
+    resolutionH.flags.writeable = False
+    return padPixels, resolutionH
+
+def get_resolution_kernel(wavenumbers_out, fwhm, pad_width=PAD_WIDTH, banded=True):
+    """
+    @returns tuple of (padPixels, resolutionH), where resolutionH is a
+             BandedKernel (or dense ndarray if not banded) over the padded axis
+    """
+    wavenumbers_out = np.ascontiguousarray(wavenumbers_out, dtype=np.float64)
+    return _resolution_kernel(wavenumbers_out.tobytes(), float(fwhm), pad_width, banded)
+
+def deconvolute_spectrum(wavenumbers_out, cleaned_spectrum, fwhm, pad_width=PAD_WIDTH, max_iter=MAX_ITER, banded=True):
+    cleaned_spectrum = np.asarray(cleaned_spectrum, dtype=np.float64)
+    padPixels, resolutionH = get_resolution_kernel(wavenumbers_out, fwhm, pad_width, banded)
+
+    # pad front and end with first/last pixel
+    spectrumPadded = np.concatenate([np.repeat(cleaned_spectrum[0], padPixels),
+                                     cleaned_spectrum,
+                                     np.repeat(cleaned_spectrum[-1], padPixels)])
+
+    # (fmax rather than maximum, so NaN is clipped like the builtin max)
+    origSpectrumPadded = np.fmax(spectrumPadded, 0)
+    spectrumDeconvPadded = np.fmax(origSpectrumPadded, EPS)
+
+    if isinstance(resolutionH, BandedKernel):
+        padded = np.empty(len(spectrumPadded) + 2 * resolutionH.half_width)
+
+        def matmul(x, out):
+            resolutionH.matvec(x, out=out, padded=padded)
+
+        def matmul_t(x, out):
+            resolutionH.matvec(x, out=out, transpose=True, padded=padded)
+    else:
+        resolutionH_t = resolutionH.T
+
+        def matmul(x, out):
+            np.matmul(resolutionH, x, out=out)
+
+        def matmul_t(x, out):
+            np.matmul(resolutionH_t, x, out=out)
+
+    hTimesX = np.empty_like(spectrumPadded)
+    yOverHtimesX = np.empty_like(spectrumPadded)
+    fullSum = np.empty_like(spectrumPadded)
+
+    for _ in range(max_iter):
+        matmul(spectrumDeconvPadded, hTimesX)
+        # orig spectrum padded, extra zero point, otherwise like R
+        # (yOverHtimesX is shifted by one pixel, as in the original)
+        np.divide(origSpectrumPadded[:-1], hTimesX[:-1], out=yOverHtimesX[1:])
+        yOverHtimesX[0] = yOverHtimesX[1]
+        matmul_t(yOverHtimesX, fullSum)
+        np.multiply(spectrumDeconvPadded, fullSum, out=spectrumDeconvPadded)
+        np.fmax(spectrumDeconvPadded, EPS, out=spectrumDeconvPadded)
+
+    return spectrumDeconvPadded[padPixels:len(cleaned_spectrum) + padPixels]
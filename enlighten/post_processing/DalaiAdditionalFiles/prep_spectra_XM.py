@@ -18,6 +18,8 @@ from scipy.interpolate import interp1d
 
 import logging
 
+from . import deconvolution
+
 log = logging.getLogger(__name__)
 
 # use this routine to prepare spectrum for input
@@ -31,61 +33,11 @@ log = logging.getLogger(__name__)
 # trim = 140 on either side
 
 def deconvolute_spectrum(wavenumbers_out, cleaned_spectrum, fwhm):
-    pad_width = 3 # multiples of FWHM
-    maxIter = 25
-
+    # resolution matrix is cached (see deconvolution.py)
     cleaned_spectrum = np.array(cleaned_spectrum)
     log.debug(f"max spectrum input: {max(cleaned_spectrum)}")
 
-    wavenumberPerPixel = np.diff(wavenumbers_out)
-    wavenumberPerPixel = np.insert(wavenumberPerPixel, 0, wavenumberPerPixel[0])
-    avgWavenumberPerPixel = np.mean(wavenumberPerPixel)
-    avgPixelFWHM = fwhm / avgWavenumberPerPixel
-
-    # pad front and end with first/last pixel
-    padPixels = math.ceil(pad_width * avgPixelFWHM)
-    wavenumberPerPixelPadded = np.append(np.repeat(wavenumberPerPixel[0], padPixels),
-                                         np.append(wavenumberPerPixel, np.repeat(wavenumberPerPixel[-1], padPixels)))
-    pixelFWHM = fwhm / wavenumberPerPixelPadded
-    pixelSigma = pixelFWHM / (2 * math.sqrt(2 * math.log(2)))
-    pixelSigma2 = pixelSigma * pixelSigma
-
-    numPixelPadded = len(wavenumberPerPixelPadded)
-    resolutionH = np.zeros((numPixelPadded, numPixelPadded))
-
-    spectrumPadded = np.append(np.repeat(cleaned_spectrum[0], padPixels),
-                               np.append(cleaned_spectrum, np.repeat(cleaned_spectrum[-1], padPixels)))
-
-    pixels = np.arange(numPixelPadded)
-    for row in pixels:
-        # this produces a H matrix for which the 50th line here (base 0)
-        # corresponds to the 51th line in R (base 1)
-        # is this the reason the spectra are shifted?
-        # resolutionSpectrum = np.exp(-0.5 * np.square(pixels - row) / pixelSigma2[row])
-        # the following makes the H matrix the same as in R - except an extra row 0
-        if pixelSigma2[row] != 0:
-            resolutionSpectrum = np.exp(-0.5 * np.square(pixels - row) / pixelSigma2[row])
-        else:
-            # log.error(f"divide by zero: pixelSigma2[{row}] = {pixelSigma2[row]}")
-            resolutionSpectrum = 1
-        resolutionH[row,] = resolutionSpectrum / np.sum(resolutionSpectrum)
-
-    origSpectrumPadded = np.array([max(0, x) for x in spectrumPadded])
-    eps = 1e-5
-    spectrumDeconvPadded = np.array([max(eps, x) for x in origSpectrumPadded])
-
-    for iter in range(maxIter):
-        hTimesX = np.matmul(resolutionH, spectrumDeconvPadded)
-        # orig spectrum padded, extra zero point, otherwise like R
-        yOverHtimesX = origSpectrumPadded / hTimesX
-        # yOverHtimesX is shifted - need to adjust
-        yOverHtimesX = np.append(yOverHtimesX[0], yOverHtimesX[:-1])
-        fullSum = np.dot(np.transpose(resolutionH), yOverHtimesX)
-        spectrumDeconvPadded = spectrumDeconvPadded * fullSum
-        spectrumDeconvPadded = np.array([max(eps, x) for x in spectrumDeconvPadded])
-
-    keepPixels = range(padPixels, len(wavenumbers_out) + padPixels)
-    spectrumDeconv = spectrumDeconvPadded[keepPixels]
+    spectrumDeconv = deconvolution.deconvolute_spectrum(wavenumbers_out, cleaned_spectrum, fwhm)
     log.debug(f"Deconvolute: max spectrum output: {max(spectrumDeconv)}")
 
     return (spectrumDeconv)
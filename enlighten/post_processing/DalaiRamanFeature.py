@@ -322,6 +322,10 @@ class DalaiRamanFeature(EnlightenFeature):
         return self.enabled
 
     def process(self, pr):
+        """
+        Generates the DALAI spectrum into pr.dalai. This may be called from a
+        worker thread, so graphing is left to display.
+        """
         if not self.enabled:
             return
 
@@ -331,7 +335,6 @@ class DalaiRamanFeature(EnlightenFeature):
                 pr.settings.state.laser_enabled or 
                 (pr.reading.take_one_request and pr.reading.take_one_request.auto_raman_request) ):
             self.ctl.marquee.error("DALAI-RAMAN requires laser")
-            self.curve.setData([])
             return
 
         # note that horizontal ROI has already been applied at this point in the processing pipeline
@@ -340,7 +343,6 @@ class DalaiRamanFeature(EnlightenFeature):
 
         if wavenumbers is None:
             self.ctl.marquee.error("DALAI-RAMAN requires measurements with wavenumber axis")
-            self.curve.setData([])
             return
 
         log.debug(f"Wavenumbers = {len(wavenumbers)}, spectrum = {len(spectrum)}")
@@ -348,10 +350,11 @@ class DalaiRamanFeature(EnlightenFeature):
         unit = self.ctl.graph.get_x_axis_unit()
         if unit != "cm":
             self.ctl.marquee.error("DALAI-RAMAN requires wavenumber axis selected")
-            self.curve.setData([])
             return
 
         AI_wavenumbers, AI_spectrum = self.process_dalai(wavenumbers, spectrum, pr)
+        if AI_wavenumbers is None:
+            return
 
         log.debug(f"AI_wavenumbers {AI_wavenumbers}")
         log.debug(f"AI_spectrum {AI_spectrum}")
@@ -366,8 +369,23 @@ class DalaiRamanFeature(EnlightenFeature):
 
         pr.dalai = child_pr
 
+    def display(self, pr):
+        """
+        Graph the DALAI spectrum generated by process, or clear the curve if
+        none was (GUI thread).
+        """
+        if not self.enabled:
+            return
+
+        child_pr = getattr(pr, "dalai", None)
+        if child_pr is None:
+            self.ctl.alt_graph.set_data(self.curve, y=[])
+            return
+
+        AI_wavenumbers = np.array(child_pr.wavenumbers)
+        AI_spectrum = np.array(child_pr.processed)
+
         # interpolated arrays are for display only; we use non-interpolated data in matching
-        # TODO: perhaps the graphing should actually be done at the same point as the main graph is updated?
         interp = self.ctl.interp
         if interp.enabled and interp.new_axis is not None:
             AI_spectrum_display = np.interp(interp.new_axis, AI_wavenumbers, AI_spectrum)
@@ -376,7 +394,6 @@ class DalaiRamanFeature(EnlightenFeature):
             AI_spectrum_display = AI_spectrum
             AI_wavenumbers_display = AI_wavenumbers
 
-        # MZ: YOU ARE HERE
         # self.curve.setData(x=AI_wavenumbers_display, y=AI_spectrum_display, color=self.COLOR)
         self.ctl.alt_graph.set_data(self.curve, x=AI_wavenumbers_display, y=AI_spectrum_display)
 
@@ -1,6 +1,5 @@
 import datetime
 import logging
-import numpy as np
 
 import pyqtgraph
 
@@ -19,8 +18,8 @@ class DarkFeature(EnlightenFeature):
 
     def __init__(self, ctl):
         """
-        Encapsulates storage and display of dark spectra (but not the actual dark
-        correction).
+        Encapsulates storage and display of dark spectra, and their subtraction
+        from each ProcessedReading (see correct).
         """
         super().__init__(ctl)
 
@@ -141,7 +140,7 @@ class DarkFeature(EnlightenFeature):
                     timestamp = pr.reading.timestamp
 
         if dark is not None:
-            app_state.dark = dark
+            app_state.set_dark(dark)
             app_state.dark_timestamp = timestamp
             app_state.dark_integration_time_ms = spec.settings.state.integration_time_ms
 
@@ -168,7 +167,7 @@ class DarkFeature(EnlightenFeature):
 
         spec = self.ctl.multispec.current_spectrometer()
         if spec is None:
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             self.curve.active = False
             lb.setText("")
             self.ctl.gui.colorize_button(self.button_toggle, False)
@@ -179,7 +178,7 @@ class DarkFeature(EnlightenFeature):
             lb.setText(spec.app_state.dark_timestamp.strftime("%Y-%m-%d %H:%M:%S"))
             self.curve.active = True
         else:
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             lb.setText("")
             self.curve.active = False
 
@@ -253,7 +252,7 @@ class DarkFeature(EnlightenFeature):
             self.ctl.marquee.error("loaded measurement does not have a dark spectrum")
             return
 
-        spec.app_state.dark = np.copy(pr.dark)
+        spec.app_state.set_dark(pr.dark)
         spec.app_state.dark_timestamp = m.timestamp
         self.ctl.marquee.info("dark loaded")
         self.display()
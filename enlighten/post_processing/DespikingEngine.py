@@ -0,0 +1,187 @@
+import threading
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+MAD_SCALE = 0.6745      # Whitaker & Hayes modified z-score (MAD of a normal distribution ~ 0.6745 sigma)
+MIN_TEMPORAL_FRAMES = 3 # a median of fewer frames can't outvote a spike
+
+def modified_z_scores(spectrum):
+    """
+    Whitaker & Hayes modified z-scores of the first differences of a spectrum.
+
+    @returns array the same length as the spectrum, where z[i] scores the step
+             from y[i-1] to y[i] (z[0] is 0)
+    """
+    y = np.asarray(spectrum, dtype=np.float64)
+    z = np.zeros(len(y))
+    if len(y) < 3:
+        return z
+
+    delta = np.diff(y)
+    med = np.median(delta)
+    dev = np.abs(delta - med)
+    mad = np.median(dev)
+    if mad == 0:
+        # e.g. a flat (saturated or synthetic) spectrum: fall back to the mean
+        # absolute deviation (~0.7979 sigma for a normal distribution)
+        mad = dev.mean() * MAD_SCALE / 0.7979
+    if mad == 0:
+        return z
+
+    z[1:] = MAD_SCALE * (delta - med) / mad
+    return z
+
+def replace_with_neighbors(spectrum, mask, window):
+    """
+    Replaces each flagged pixel with the mean of the unflagged pixels within
+    +/- window of it (clamped to the spectrum), via cumulative sums rather than
+    a loop per pixel. Pixels with no unflagged neighbors are left unchanged.
+
+    @param spectrum (In/Out) float64 ndarray
+    @param mask (Input) boolean ndarray of flagged pixels
+    """
+    indices = np.flatnonzero(mask)
+    if len(indices) == 0:
+        return spectrum
+
+    pixels = len(spectrum)
+    keep = ~mask
+    sums = np.zeros(pixels + 1)
+    counts = np.zeros(pixels + 1)
+    np.cumsum(np.where(keep, spectrum, 0), out=sums[1:])
+    np.cumsum(keep, out=counts[1:])
+
+    lo = np.maximum(indices - window, 0)
+    hi = np.minimum(indices + window + 1, pixels)
+    n = counts[hi] - counts[lo]
+    valid = n > 0
+    spectrum[indices[valid]] = (sums[hi] - sums[lo])[valid] / n[valid]
+    return spectrum
+
+def despike_spectral(spectrum, tau=6.5, window=3):
+    """
+    @see Whitaker, Darren, and Kevin Hayes.
+         "A Simple Algorithm for Despiking Raman Spectra." ChemRxiv (2018)
+
+    @param tau (Input) modified z-score above which a step is considered a
+           spike (lower is more sensitive; the paper uses 6.5)
+    @param window (Input) half-width of the neighborhood averaged over spikes
+    @returns tuple of (despiked copy of spectrum, boolean ndarray of spikes)
+    """
+    y = np.array(spectrum, dtype=np.float64)
+    mask = np.abs(modified_z_scores(y)) > tau
+    replace_with_neighbors(y, mask, window)
+    return y, mask
+
+class DespikingEngine:
+    """
+    Removes cosmic-ray spikes from successive spectra of one detector.
+
+    Modes:
+
+    - spectral: Whitaker & Hayes modified z-scores of the first differences
+      of each spectrum on its own (despike_spectral). Needs no history, but
+      can't tell a cosmic ray from a genuinely sharp Raman peak, and misses
+      spikes which are small relative to the spectrum's own noise.
+
+    - temporal: the median of the last "frames" spectra (including this one)
+      at each pixel is a spike-free estimate of the current spectrum, since a
+      cosmic ray rarely hits the same pixel twice. Pixels rising more than
+      "threshold" noise sigmas above that median are replaced by it. Noise is
+      estimated per pixel from the spread across frames, floored at the
+      spread across pixels, so bright peaks (with more shot noise) aren't
+      flagged. Real peaks are present in every frame, so are left alone.
+
+    Each Spectrometer has its own instance (SpectrometerApplicationState.
+    despiking_engine), as the ring buffer only makes sense for successive
+    spectra from the same detector. The buffer is cleared when the pixel
+    count (e.g. horizontal ROI) or number of frames changes, and when too
+    many pixels are flagged at once (i.e. the scene changed, rather than
+    cosmic rays having arrived). Until MIN_TEMPORAL_FRAMES have been
+    collected, temporal mode falls back to spectral.
+    """
+
+    MODES = [ "spectral", "temporal" ]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+        self.spectra = 0
+        self.spikes = 0
+        self.resets = 0
+
+    def __str__(self):
+        return f"DespikingEngine <spectra {self.spectra}, spikes {self.spikes}, resets {self.resets}>"
+
+    def reset(self):
+        self.buffer = None  # (frames, pixels) ring buffer of recent spectra
+        self.count = 0      # spectra added to the buffer (saturates at frames)
+        self.index = 0      # next row to overwrite
+
+    def despike(self, spectrum, mode="spectral", tau=6.5, window=3, frames=5, threshold=6.0, max_fraction=0.05):
+        """
+        @param mode (Input) see MODES
+        @param tau, window (Input) see despike_spectral
+        @param frames (Input) temporal: spectra in the ring buffer
+        @param threshold (Input) temporal: noise sigmas above the median
+        @param max_fraction (Input) temporal: if more than this fraction of
+               pixels is flagged, assume the scene changed and restart
+        @returns tuple of (despiked copy of spectrum, boolean ndarray of spikes)
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"unknown despiking mode {mode}")
+
+        with self.lock:
+            if mode == "temporal":
+                y, mask = self.despike_temporal(spectrum, frames, threshold, max_fraction)
+                if mask is None:
+                    y, mask = despike_spectral(spectrum, tau, window)
+            else:
+                y, mask = despike_spectral(spectrum, tau, window)
+
+            self.spectra += 1
+            self.spikes += int(np.count_nonzero(mask))
+            return y, mask
+
+    def push(self, y, frames):
+        pixels = len(y)
+        if self.buffer is None or self.buffer.shape != (frames, pixels):
+            self.reset()
+            self.buffer = np.empty((frames, pixels))
+        self.buffer[self.index] = y
+        self.index = (self.index + 1) % frames
+        self.count = min(self.count + 1, frames)
+
+    def despike_temporal(self, spectrum, frames, threshold, max_fraction):
+        """ @returns tuple of (despiked, mask), or (None, None) if not enough history """
+        y = np.array(spectrum, dtype=np.float64)
+        self.push(y, max(frames, MIN_TEMPORAL_FRAMES))
+        if self.count < MIN_TEMPORAL_FRAMES:
+            return None, None
+
+        history = self.buffer[:self.count]
+        median = np.median(history, axis=0)
+        residual = y - median
+
+        # noise per pixel (across frames), floored at the noise across pixels
+        spread = 1.4826 * np.median(np.abs(history - median), axis=0)
+        floor = 1.4826 * np.median(np.abs(residual - np.median(residual)))
+        sigma = np.maximum(spread, floor)
+
+        # cosmic rays only ever add counts
+        mask = residual > threshold * sigma
+        if np.count_nonzero(mask) > max_fraction * len(y):
+            log.debug(f"despike_temporal: {np.count_nonzero(mask)} pixels changed (restarting history)")
+            self.reset()
+            self.resets += 1
+            self.push(y, max(frames, MIN_TEMPORAL_FRAMES))
+            return None, None
+
+        y[mask] = median[mask]
+
+        # keep the spike out of the history, so it can't skew later medians
+        self.buffer[self.index - 1] = y
+        return y, mask
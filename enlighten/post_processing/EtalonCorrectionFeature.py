@@ -61,12 +61,4 @@ class EtalonCorrectionFeature(EnlightenFeature):
         if not self.enabled or not pr.settings.etalon_correction:
             return
 
-        try:
-            log.debug("applying etalon correction")
-            spectrum = pr.get_processed()
-            corrected = pr.settings.etalon_correction.apply(spectrum)
-            pr.set_processed(corrected)
-            pr.etalon_corrected = True
-        except:
-            log.error("error applying etalon correction", exc_info=1)
-            pass
+        self.ctl.processing_engine.correct_etalon(pr)
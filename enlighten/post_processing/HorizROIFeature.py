@@ -1,6 +1,5 @@
 import logging
 
-from wasatch.ProcessedReading import ProcessedReading
 from enlighten.util import unwrap
 from enlighten.EnlightenFeature import EnlightenFeature
 
@@ -193,15 +192,8 @@ class HorizROIFeature(EnlightenFeature):
             spec = self.ctl.multispec.current_spectrometer()
             if spec:
                 roi = spec.settings.eeprom.get_horizontal_roi()
-        if roi is None:
-            return spectrum
-
-        orig_len = len(spectrum)
-        if not roi.valid() or roi.start >= orig_len or roi.end >= orig_len:
-            return spectrum
 
-        # log.debug("crop: cropping spectrum of %d pixels to %d (%s)", orig_len, roi.len, roi)
-        return roi.crop(spectrum)
+        return self.ctl.processing_engine.crop(spectrum, roi=roi)
         
     ##
     # Called by Controller.process_reading.
@@ -226,17 +218,7 @@ class HorizROIFeature(EnlightenFeature):
         if settings is None:
             return
 
-        roi = settings.eeprom.get_horizontal_roi()
-        if roi is None:
-            return 
-            
-        prc = ProcessedReading(settings=settings)
-        prc.processed   = self.crop(pr.processed,         roi=roi)
-        prc.wavelengths = self.crop(settings.wavelengths, roi=roi)
-        prc.wavenumbers = self.crop(settings.wavenumbers, roi=roi)
-        prc.first_pixel = roi.start
-
-        pr.cropped = prc
+        self.ctl.processing_engine.crop_reading(pr, settings)
 
     def region_updated_callback(self, spec, left_pixel=None, right_pixel=None):
         self.update_regions(spec)
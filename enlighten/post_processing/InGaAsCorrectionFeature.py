@@ -69,12 +69,4 @@ class InGaAsCorrectionFeature(EnlightenFeature):
         if not pr.settings.ingaas_correction:
             return
 
-        try:
-            log.debug("applying InGaAs correction")
-            spectrum = pr.get_processed()
-            corrected = pr.settings.ingaas_correction.apply(spectrum)
-            pr.set_processed(corrected)
-            pr.ingaas_corrected = True
-        except:
-            log.error("error applying InGaAs correction", exc_info=1)
-            pass
+        self.ctl.processing_engine.correct_ingaas(pr)
@@ -1,9 +1,6 @@
 import logging
 import numpy as np
 
-from wasatch.ProcessedReading import ProcessedReading
-
-from wasatch.utils import generate_excitation, generate_wavenumbers, generate_wavelengths_from_wavenumbers
 from enlighten.ui.ScrollStealFilter import ScrollStealFilter
 from enlighten import common
 from enlighten.util import unwrap
@@ -181,13 +178,6 @@ class InterpolationFeature(EnlightenFeature):
 
         return np.arange(self.start, self.end, self.incr)
 
-    def generate_excitation(self, wavelengths, wavenumbers, settings):
-        if settings is not None:
-            excitation = settings.excitation()
-            if excitation is not None and excitation > 0:
-                return excitation
-        return generate_excitation(wavelengths=wavelengths, wavenumbers=wavenumbers)
-
     def process(self, pr, save=True):
         """ 
         This does dark and reference as well as processed and raw.
@@ -207,93 +197,19 @@ class InterpolationFeature(EnlightenFeature):
             log.debug("Using neither wavelengths nor wavenumbers, returning none.")
             return 
 
-        old_interpolated = None
-        if pr.interpolated:
-            if not save:
-                old_interpolated = pr.interpolated
-            log.debug("re-interpolating (deleting previous interpolation results)")
-            pr.interpolated = None
-
-        wavelengths = pr.get_wavelengths()
-        wavenumbers = pr.get_wavenumbers()
-
-        interpolated = ProcessedReading()
-        old_cropped_axis = None
-        old_detector_axis = None
-
-        if self.use_wavelengths:
-            if wavelengths is None:
-                log.debug("Missing required wavelengths")
-                return
-
-            interpolated.wavelengths = self.new_axis
-            old_cropped_axis = wavelengths
-            old_detector_axis = pr.get_wavelengths("orig")
-
-            # generate corresponding wavenumbers if we can
-            excitation = self.generate_excitation(wavelengths, wavenumbers, pr.settings)
-            if excitation:
-                interpolated.wavenumbers = generate_wavenumbers(excitation=excitation, wavelengths=interpolated.wavelengths)
-
-        elif self.use_wavenumbers:
-            if wavenumbers is None:
-                log.debug("Missing required wavenumbers")
-                return
-
-            interpolated.wavenumbers = self.new_axis
-            old_cropped_axis = wavenumbers
-            old_detector_axis = pr.get_wavenumbers("orig")
-
-            # generate corresponding wavelengths if we can
-            excitation = self.generate_excitation(wavelengths, wavenumbers, pr.settings)
-            if excitation is not None:
-                interpolated.wavelengths = generate_wavelengths_from_wavenumbers(excitation=excitation, wavenumbers=interpolated.wavenumbers)
-
-        if old_cropped_axis is None or old_detector_axis is None:
-            log.debug("Old axis was none, returning none.")
-            return
+        return self.ctl.processing_engine.interpolate(pr, self.new_axis, use_wavenumbers=not self.use_wavelengths, save=save)
 
-        processed = pr.get_processed()
-        if processed is not None:
-            interpolated.processed = np.interp(self.new_axis, old_cropped_axis, processed)
-            log.debug(f"interpolated processed to {len(interpolated.processed)} ({self.new_axis[0]:.2f}, {self.new_axis[-1]:.2f})")
-
-        # Note that we are choosing to interpolate raw. That means this is no longer
-        # really "raw". However, we're storing it in the ".interpolated" record of
-        # ProcessedReading, so that should be fairly clear; they can always access
-        # ProcessedReading.raw directly to get the original data.
-        raw = pr.get_raw()
-        if raw is not None:
-            if len(raw) == len(old_detector_axis):
-                interpolated.raw = np.interp(self.new_axis, old_detector_axis, raw)
-                log.debug(f"interpolated raw to {len(interpolated.raw)}")
-            else:
-                log.debug(f"process: len(old_detector_axis) {len(old_detector_axis)} != len(raw) ({len(raw)})")
-                interpolated.raw = None
-
-        dark = pr.get_dark()
-        if dark is not None:
-            if len(dark) == len(old_detector_axis):
-                interpolated.dark = np.interp(self.new_axis, old_detector_axis, dark)
-                log.debug(f"interpolated dark to {len(interpolated.dark)}")
-            else:
-                log.debug(f"process: len(old_detector_axis) {len(old_detector_axis)} != len(dark) ({len(dark)})")
-                interpolated.dark = None
-
-        reference = pr.get_reference()
-        if reference is not None:
-            if len(reference) == len(old_detector_axis):
-                interpolated.reference = np.interp(self.new_axis, old_detector_axis, reference)
-                log.debug(f"interpolated reference to {len(interpolated.reference)}")
-            else:
-                log.debug(f"process: len(old_detector_axis) {len(old_detector_axis)} != len(reference) ({len(reference)})")
-                interpolated.reference = None
-
-        if save:
-            pr.interpolated = interpolated
-        else:
-            pr.interpolated = old_interpolated
-        return interpolated
+    def process_batch(self, prs, save=True):
+        """ 
+        As process, for many ProcessedReadings (e.g. exported Measurements),
+        interpolating all arrays sharing an x-axis together.
+
+        @returns list of interpolated ProcessedReadings (None where not done)
+        """
+        if not self.enabled or self.new_axis is None or not (self.use_wavelengths or self.use_wavenumbers):
+            return [ None ] * len(prs)
+
+        return self.ctl.processing_engine.interpolate_batch(prs, self.new_axis, use_wavenumbers=not self.use_wavelengths, save=save)
 
     def init_from_config(self):
         log.debug("init_from_config")
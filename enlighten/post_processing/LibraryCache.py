@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+
+from enlighten.post_processing.CompiledLibrary import CompiledLibrary
+
+log = logging.getLogger(__name__)
+
+class LibraryEntry:
+    """
+    One library file: where it came from (so changes can be detected from the
+    manifest without parsing it) and its spectrum (None if it failed to load).
+    """
+
+    def __init__(self, pathname, name, mtime, size, wavenumbers=None, intensities=None):
+        self.pathname = pathname
+        self.name = name
+        self.mtime = mtime
+        self.size = size
+        self.wavenumbers = wavenumbers
+        self.intensities = intensities
+
+    def __str__(self):
+        return f"LibraryEntry <{self.name}, {self.pathname}>"
+
+    def is_loaded(self):
+        return self.wavenumbers is not None and self.intensities is not None
+
+    def is_current(self, name, stat):
+        return self.name == name and self.mtime == stat.st_mtime and self.size == stat.st_size
+
+class LibraryCache:
+    """
+    An on-disk cache of a matching library (the set of library directories
+    searched), so that each CSV only has to be parsed once rather than every
+    session.
+
+    Stored in its own directory (keyed by the library directories) as:
+
+    - manifest.json: version, and per file its pathname, compound name,
+      mtime, size and the offset / length of its spectrum in the raw arrays
+    - wavenumbers, intensities: every file's spectrum, concatenated (.npy)
+    - grid, matrix, start, end: the CompiledLibrary (.npy)
+
+    Arrays are loaded memory-mapped (read-only), so opening a large library
+    costs little more than reading the manifest. Each save writes a new
+    "generation" of arrays and then the manifest, so an interrupted save (or
+    a reader still mapping the previous generation, which Windows won't let
+    us overwrite) leaves the last complete cache usable.
+    """
+
+    VERSION = 1
+
+    ARRAYS = [ "wavenumbers", "intensities", "grid", "matrix", "start", "end" ]
+
+    def __init__(self, cache_dir, library_dirs):
+        """
+        @param cache_dir (Input) parent directory of all library caches
+        @param library_dirs (Input) directories comprising the library
+        """
+        self.library_dirs = [ os.path.abspath(d) for d in library_dirs if d is not None ]
+        digest = hashlib.sha1(repr(self.library_dirs).encode("utf-8")).hexdigest()
+        self.path = os.path.join(cache_dir, digest)
+        self.generation = 0
+
+    def __str__(self):
+        return f"LibraryCache <{self.path}>"
+
+    def get_pathname(self, name, generation=None):
+        if name == "manifest":
+            return os.path.join(self.path, "manifest.json")
+        return os.path.join(self.path, f"{name}-{self.generation if generation is None else generation}.npy")
+
+    def load(self):
+        """
+        @returns tuple of (entries, library): LibraryEntry list in manifest
+                 order, and the CompiledLibrary (None if not cached); both
+                 empty / None if there is no usable cache
+        """
+        pathname = self.get_pathname("manifest")
+        if not os.path.exists(pathname):
+            return [], None
+
+        try:
+            with open(pathname) as f:
+                manifest = json.load(f)
+            if manifest.get("version") != self.VERSION or manifest.get("library_dirs") != self.library_dirs:
+                log.debug(f"ignoring stale {self}")
+                return [], None
+
+            self.generation = manifest["generation"]
+            arrays = { name: np.load(self.get_pathname(name), mmap_mode="r") for name in self.ARRAYS }
+
+            entries = []
+            x, y = arrays["wavenumbers"], arrays["intensities"]
+            for e in manifest["entries"]:
+                entry = LibraryEntry(e["pathname"], e["name"], e["mtime"], e["size"])
+                if e["length"] is not None:
+                    region = slice(e["offset"], e["offset"] + e["length"])
+                    entry.wavenumbers, entry.intensities = x[region], y[region]
+                entries.append(entry)
+
+            library = CompiledLibrary.from_arrays(manifest["compiled_names"], manifest["step"],
+                arrays["grid"], arrays["matrix"], arrays["start"], arrays["end"])
+            log.debug(f"loaded {len(entries)} entries and {library} from {self}")
+            return entries, library
+        except:
+            log.error(f"unable to load {self}", exc_info=1)
+            return [], None
+
+    def save(self, entries, library):
+        """
+        @param entries (Input) every LibraryEntry (including ones which failed
+               to load, so they aren't retried until they change)
+        @param library (Input) CompiledLibrary of the loaded entries
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            previous = self.generation
+            self.generation = previous + 1
+
+            manifest_entries = []
+            offset = 0
+            for entry in entries:
+                length = len(entry.wavenumbers) if entry.is_loaded() else None
+                manifest_entries.append({ "pathname": entry.pathname, "name": entry.name, "mtime": entry.mtime,
+                                          "size": entry.size, "offset": offset, "length": length })
+                offset += length or 0
+
+            loaded = [ entry for entry in entries if entry.is_loaded() ]
+            arrays = {
+                "wavenumbers": np.concatenate([ np.asarray(e.wavenumbers, dtype=np.float64)  for e in loaded ] or [ np.zeros(0) ]),
+                "intensities": np.concatenate([ np.asarray(e.intensities, dtype=np.float64) for e in loaded ] or [ np.zeros(0) ]),
+                "grid":        library.grid,
+                "matrix":      library.matrix,
+                "start":       library.start,
+                "end":         library.end }
+            for name, array in arrays.items():
+                np.save(self.get_pathname(name), np.ascontiguousarray(array))
+
+            manifest = { "version": self.VERSION,
+                         "library_dirs": self.library_dirs,
+                         "generation": self.generation,
+                         "step": library.step,
+                         "compiled_names": library.names,
+                         "entries": manifest_entries }
+            pathname = self.get_pathname("manifest")
+            with open(pathname + ".tmp", "w") as f:
+                json.dump(manifest, f)
+            os.replace(pathname + ".tmp", pathname)
+            log.debug(f"saved {len(entries)} entries and {library} to {self} (generation {self.generation})")
+        except:
+            log.error(f"unable to save {self}", exc_info=1)
+            return
+
+        # best-effort: older generations may still be mapped (and so locked on Windows)
+        for filename in os.listdir(self.path):
+            if filename.endswith(".npy") and not filename.endswith(f"-{self.generation}.npy"):
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:
+                    log.debug(f"unable to remove {filename} (still in use?)")
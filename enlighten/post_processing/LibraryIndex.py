@@ -0,0 +1,73 @@
+import time
+import logging
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+class LibraryIndex:
+    """
+    A low-dimensional (PCA) index over a CompiledLibrary, used to pre-filter
+    the compounds worth scoring exactly, so matching cost stops growing with
+    N x grid pixels.
+
+    CompiledLibrary rows are standardized, so a compound's Pearson score
+    against a sample covering its range is the dot product of the row with
+    the standardized sample. Projecting both onto the library's leading
+    principal components (truncated SVD, which best preserves those dot
+    products) approximates every score with an N x dimensions product; the
+    top candidates are then re-scored exactly by CompiledLibrary.
+
+    Components are trained on at most MAX_TRAINING_ROWS compounds (chosen
+    reproducibly at random), then every compound is projected.
+    """
+
+    MAX_TRAINING_ROWS = 2000
+
+    def __init__(self, library, dimensions=32, seed=0):
+        """
+        @param library (Input) CompiledLibrary
+        @param dimensions (Input) principal components kept
+        """
+        start = time.time()
+        rows = len(library)
+        training = np.arange(rows)
+        if rows > self.MAX_TRAINING_ROWS:
+            training = np.sort(np.random.default_rng(seed).choice(rows, self.MAX_TRAINING_ROWS, replace=False))
+
+        _, _, vt = np.linalg.svd(np.asarray(library.matrix[training], dtype=np.float32), full_matrices=False)
+        self.components = np.ascontiguousarray(vt[:dimensions], dtype=np.float32)
+        self.projections = np.zeros((0, len(self.components)), dtype=np.float32)
+        self.extend(library)
+
+        log.debug(f"built {self} in {(time.time() - start) * 1000:.1f}ms")
+
+    def __str__(self):
+        return f"LibraryIndex <{len(self.projections)} compounds, {len(self.components)} dimensions>"
+
+    def __len__(self):
+        return len(self.projections)
+
+    def extend(self, library):
+        """ projects compounds appended to the library since the index was built (components are kept) """
+        if len(library) > len(self.projections):
+            added = library.matrix[len(self.projections):] @ self.components.T
+            self.projections = np.vstack((self.projections, added.astype(np.float32)))
+
+    def candidates(self, y, lo, hi, count):
+        """
+        @param y, lo, hi (Input) output of CompiledLibrary.resample
+        @param count (Input) candidates to return
+        @returns indices of the count compounds with the highest approximate
+                 scores, in descending order of approximate score
+        """
+        count = min(count, len(self.projections))
+        if count <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        query = self.components[:, lo:hi] @ np.asarray(y, dtype=np.float32)
+        approx = self.projections @ query
+        if count < len(approx):
+            indices = np.argpartition(-approx, count - 1)[:count]
+        else:
+            indices = np.arange(len(approx))
+        return indices[np.argsort(-approx[indices], kind="stable")]
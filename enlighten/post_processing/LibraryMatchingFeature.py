@@ -1,18 +1,14 @@
 import re
 import os
+import threading
 import pandas as pd
 import logging
 
-from functools import cmp_to_key
-from scipy.stats import pearsonr
-from scipy.interpolate import interp1d
-
 from enlighten import common
 from enlighten.EnlightenFeature import EnlightenFeature
+from enlighten.post_processing.Pearson import Pearson
 from enlighten.util import unwrap
 
-from wasatch.CSVLoader import CSVLoader
-
 if common.use_pyside2():
     from PySide2 import QtCore, QtWidgets
 else:
@@ -20,11 +16,93 @@ else:
 
 log = logging.getLogger(__name__)
 
+class MatchResult:
+    """
+    The library match of one ProcessedReading, ready to display. The 
+    ProcessedReading itself isn't labeled until the result is published on
+    the GUI thread (see LibraryMatchingFeature.tick).
+    """
+    def __init__(self, pr, labels, compounds, scores, dataframe=None, curve_x=None, curve_y=None):
+        self.pr               = pr
+        self.labels           = labels # see ProcessingEngine.get_library_match
+        self.compounds        = compounds
+        self.scores           = scores
+        self.dataframe        = dataframe
+        self.curve_x          = curve_x
+        self.curve_y          = curve_y
+        self.compound         = labels["library_matching_compound"]
+        self.score            = labels["library_matching_score"]
+        self.session_count    = labels["library_matching_session_count"]  # Reading.session_count of the matched spectrum
+
+class MatchingWorker(threading.Thread):
+    """
+    Matches ProcessedReadings in the background for LibraryMatchingFeature.
+    Requests are "latest-wins": there is at most one pending ProcessedReading,
+    and a newer one replaces it if it hasn't been started yet. Exits when
+    feature.running is cleared.
+    """
+    def __init__(self, feature):
+        threading.Thread.__init__(self)
+        self.feature = feature
+
+    def run(self):
+        log.debug("MatchingWorker: running")
+        feature = self.feature
+        while True:
+            with feature.condition:
+                while feature.running and feature.pending is None:
+                    feature.condition.wait()
+                if not feature.running:
+                    break
+                pr, feature.pending = feature.pending, None
+
+            try:
+                feature.publish(feature.match(pr))
+            except:
+                log.error("MatchingWorker: exception matching spectrum", exc_info=1)
+        log.debug("MatchingWorker: exiting")
+
 class LibraryMatchingFeature(EnlightenFeature):
     """
     @todo This is currently oriented toward Raman (defaulting to wavenumbers), 
           but there's no reason it couldn't also support wavelengths for non-Raman 
           (absorbance etc).
+
+    @par Asynchronous mode
+
+    By default ([LibraryMatching] async = True), matching runs on a 
+    MatchingWorker thread rather than in Controller.process_reading, so the
+    cost of matching (or of loading the library on first use) never limits
+    the acquisition rate. The worker always takes the most recent
+    ProcessedReading, discarding any it didn't get to, and publishes each
+    MatchResult for tick() to display on the GUI thread.
+
+    @par Mixtures
+
+    Optionally ([LibraryMatching] mixture = True), each spectrum is also
+    modeled as a non-negative mixture of the mixture_candidates best-scoring
+    compounds (Pearson.generate_mixture). Component fractions are shown in a
+    "Mixture" column of the results table, with the residual (unexplained
+    fraction) in the last row, and saved as "Library Mixture" and "Library
+    Mixture Residual".
+
+    @par Metadata
+
+    Each ProcessedReading handed to process() is labeled with the most recent
+    match available (which may come from an earlier frame, so it is saved 
+    with Measurement metadata); ProcessedReading.library_matching_session_count
+    records which Reading that match was computed from. The worker never 
+    modifies a ProcessedReading: its own match is only applied on the GUI 
+    thread, when tick() displays it, so a Measurement saved meanwhile keeps 
+    the previous label.
+
+    @par Threading
+
+    Pearson is only used by match() (on the MatchingWorker, if use_async).
+    GUI callbacks which change it (settings, library directory, compounds 
+    added to the library) queue their change with edit_pearson, and match()
+    applies any queued changes before its next spectrum, so the GUI thread
+    never waits on a match or a library load.
     """
 
     SECTION = "LibraryMatching"
@@ -38,6 +116,10 @@ class LibraryMatchingFeature(EnlightenFeature):
     # user-generated library spectra
     DEFAULT_USER_LIBRARY_DIR = os.path.join(common.get_default_data_dir(), "user_library_spectra")
 
+    # compiled libraries are cached here (keyed by library directories), so
+    # each CSV only has to be parsed once
+    CACHE_DIR = os.path.join(common.get_default_data_dir(), "cache", "library_matching")
+
     TIMER_MS = 10 # tick graph update this long after match results
 
     def __init__(self, ctl):
@@ -73,6 +155,8 @@ class LibraryMatchingFeature(EnlightenFeature):
 
         self.dataframe = None 
         self.has_set_table = False
+        self.last_compound = None
+        self.last_score = None
 
         # start with defaults
         self.enabled = False
@@ -81,13 +165,30 @@ class LibraryMatchingFeature(EnlightenFeature):
         self.min_score = 0.65
         self.max_results = 2
         self.use_dist = True
+        self.cache = True
+        self.use_async = True
+        self.mixture = False
+        self.mixture_candidates = 8
+        self.prefilter_candidates = 256
+        self.prefilter_dimensions = 32
 
         log.debug(f"defaulting to dist_library_dir {self.dist_library_dir}")
         log.debug(f"defaulting to user_library_dir {self.user_library_dir}")
 
         self.init_from_ini()
 
-        self.pearson = Pearson(self)
+        self.condition = threading.Condition()
+        self.pearson_edits = []         # changes to Pearson for match() to apply (see edit_pearson)
+        self.pearson = Pearson(dist_library_dir = self.dist_library_dir,
+                               user_library_dir = self.user_library_dir,
+                               use_dist         = self.use_dist,
+                               min_score        = self.min_score,
+                               error_callback   = self.ctl.marquee.error,
+                               cache_dir        = self.CACHE_DIR if self.cache else None,
+                               prefilter_candidates = self.prefilter_candidates,
+                               prefilter_dimensions = self.prefilter_dimensions,
+                               mixture          = self.mixture,
+                               mixture_candidates = self.mixture_candidates)
 
         self.set_library_dir(self.user_library_dir)
 
@@ -145,6 +246,13 @@ class LibraryMatchingFeature(EnlightenFeature):
         self.metadata_cache = {}
         self.laser_warning_issued = False
 
+        # asynchronous mode (see class comment)
+        self.worker = None
+        self.running = False
+        self.pending = None             # latest ProcessedReading for MatchingWorker
+        self.result = None              # latest MatchResult
+        self.displayed = None           # MatchResult currently displayed
+
         self.timer = QtCore.QTimer()
         self.timer.timeout.connect(self.tick)
         self.timer.setSingleShot(True)
@@ -175,6 +283,13 @@ class LibraryMatchingFeature(EnlightenFeature):
 
     def stop(self):
         self.timer.stop()
+        if self.worker is not None:
+            log.debug("stopping MatchingWorker")
+            with self.condition:
+                self.running = False
+                self.pending = None
+                self.condition.notify()
+            self.worker = None
 
     def toggle_callback(self):
         self.cb_enable.setChecked(not self.enabled)
@@ -182,11 +297,19 @@ class LibraryMatchingFeature(EnlightenFeature):
     def update_settings(self):
         was_enabled = self.enabled
 
+        was_using_dist = self.use_dist
+
         self.enabled = self.cb_enable.isChecked()
         self.use_dist = self.cb_use_dist.isChecked()
         self.min_score = self.ds_min_score.value()
         self.max_results = self.sb_max_results.value()
 
+        if was_using_dist != self.use_dist:
+            # reload (cheap with the cache) with or without the distribution library
+            self.edit_pearson(setattr, self.pearson, "use_dist", self.use_dist)
+            self.edit_pearson(self.pearson.reset)
+        self.edit_pearson(setattr, self.pearson, "min_score", self.min_score)
+
         if was_enabled != self.enabled:
             log.debug(f"update_settings: was_enabled {was_enabled}, now {self.enabled}")
             self.show_widgets(self.enabled)
@@ -215,9 +338,18 @@ class LibraryMatchingFeature(EnlightenFeature):
             self.form_layout.setContentsMargins(0, 0, 0, 0)
 
     def tick(self):
+        """ displays the latest MatchResult (GUI thread) """
         if not self.enabled:
             return
 
+        with self.condition:
+            result = self.result
+        if result is not None and result is not self.displayed:
+            # the matched ProcessedReading carries its own match from now on
+            self.ctl.processing_engine.label_library_match(result.pr, result.labels)
+            self.display(result)
+            self.displayed = result
+
         self.lb_compound.setText(self.last_compound)
         self.lb_score.setText(f"{self.last_score:0.2f}" if self.last_score is not None else "")
         if self.dataframe is not None:
@@ -225,73 +357,153 @@ class LibraryMatchingFeature(EnlightenFeature):
                 self.ctl.scope_table.set_dataframe(self.dataframe)
                 self.has_set_table = True
 
-    def process(self, pr):
-        if not self.enabled:
-            return
-
-        reading = pr.reading
-        if pr.has_dalai():
-            wavenumbers = pr.get_wavenumbers("dalai")
-            spectrum = pr.get_processed("dalai")
-        else:
-            wavenumbers = pr.get_wavenumbers()
-            spectrum = pr.get_processed()
-
-        if self.ctl.page_nav.doing_raman() and not reading.laser_enabled and not self.laser_warning_issued and not self.ctl.page_nav.doing_expert():
-            self.ctl.marquee.error("LibraryMatching in Raman mode requires the laser to be enabled")
-            self.laser_warning_issued = True
+        # keep polling while the worker is busy
+        with self.condition:
+            busy = self.pending is not None or self.result is not self.displayed
+        if busy and self.worker is not None:
+            self.timer.start(self.TIMER_MS)
 
-        # perform matching
-        compounds, scores = self.pearson.process(wavenumbers, spectrum)
-        if compounds is None or scores is None or len(compounds) == 0:
+    def display(self, result):
+        if not result.compounds:
             self.last_compound = None
             self.last_score = None
             self.curve_scope.setVisible(False)
             self.curve_scope_dalai.setVisible(False)
-            self.dataframe = None
-            self.timer.start(self.TIMER_MS)
+            self.dataframe = result.dataframe # mixture only, if any
             return
 
-        if len(compounds) > self.max_results:
-            compounds = compounds[:self.max_results]
-            scores = scores[:self.max_results]
-
-        # spaces improve appearance
-        table_data = {' Compound ': compounds, ' Score ': scores}
-        self.dataframe = pd.DataFrame(data=table_data).round(2)
-        
-        # Changes the displayed score to a percent
-        self.dataframe[' Score '] = (self.dataframe[' Score '] * 100).astype(str) + "%"        
+        log.debug(f"display: matched {result.compound} ({result.score}) from Reading {result.session_count}")
 
-        # if library compound names are pipe-delimited, trim to first sub-field
-        best_compound = compounds[0].split("|")[0].strip()
-        best_score = scores[0]
-        log.debug(f"process: matched {best_compound} ({best_score})")
-
-        # these need to be written to labels in GUI thread
-        self.last_compound = self.wrapped(best_compound)
-        self.last_score = best_score
+        self.dataframe = result.dataframe
+        self.last_compound = self.wrapped(result.compound)
+        self.last_score = result.score
 
         # TODO: determine which curve to use
-        curve = self.curve_scope_dalai if self.ctl.dalai.is_enabled() else self.curve_scope
+        if self.ctl.dalai.is_enabled():
+            graph, curve = self.ctl.alt_graph, self.curve_scope_dalai
+        else:
+            graph, curve = self.ctl.graph, self.curve_scope
 
         # plot best-matching Pearson library spectrum
-        if self.pearson.best_library_spectrum is not None and self.pearson.best_library_wavenumbers is not None:
+        if result.curve_x is not None and result.curve_y is not None:
             # curve.setName(f"Library {best_compound}") 
-            curve.setData(x=self.pearson.best_library_wavenumbers,
-                          y=self.pearson.best_library_spectrum)
+            graph.set_data(curve, y=result.curve_y, x=result.curve_x)
             curve.setVisible(True)
         else:
             curve.setVisible(False)
 
-        # Add to ProcessedReading, so it will be saved with Measurement metadata.
-        pr.library_matching_compound = best_compound
-        pr.library_matching_score = best_score
-        pr.library_matching_engine = "Pearson"
+    def process(self, pr):
+        """
+        Matches the ProcessedReading (in the background, if use_async), and 
+        labels it with the most recent match available.
+        """
+        if not self.enabled:
+            return
+
+        reading = pr.reading
+        if self.ctl.page_nav.doing_raman() and not reading.laser_enabled and not self.laser_warning_issued and not self.ctl.page_nav.doing_expert():
+            self.ctl.marquee.error("LibraryMatching in Raman mode requires the laser to be enabled")
+            self.laser_warning_issued = True
+
+        # label with the latest match available, so it will be saved with 
+        # Measurement metadata (tick relabels it with its own match, if and
+        # when that is published)
+        with self.condition:
+            result = self.result
+        if result is not None:
+            self.ctl.processing_engine.label_library_match(pr, result.labels)
+
+        if self.use_async:
+            self.request(pr)
+        else:
+            result = self.match(pr)
+            self.ctl.processing_engine.label_library_match(pr, result.labels)
+            self.publish(result)
 
         # schedule GUI update
         self.timer.start(self.TIMER_MS)
 
+    def request(self, pr):
+        """ queue the ProcessedReading for the MatchingWorker, replacing any not yet started """
+        if self.worker is None:
+            self.running = True
+            self.worker = MatchingWorker(self)
+            self.worker.daemon = True
+            self.worker.start()
+
+        with self.condition:
+            if self.pending is not None:
+                log.debug(f"request: discarding stale Reading {getattr(self.pending.reading, 'session_count', None)}")
+            self.pending = pr
+            self.condition.notify()
+
+    def match(self, pr):
+        """
+        @note may be called from the MatchingWorker, so doesn't modify the 
+              ProcessedReading (which the GUI thread may be saving)
+        @returns MatchResult (with the results table and best-match curve prepared)
+        """
+        self.apply_pearson_edits()
+
+        compounds, scores, labels = self.ctl.processing_engine.get_library_match(pr, self.pearson, self.max_results)
+        curve_x = self.pearson.best_library_wavenumbers
+        curve_y = self.pearson.best_library_spectrum
+        mixture = self.pearson.mixture_result if self.mixture else None
+        residual = self.pearson.mixture_residual
+
+        if compounds is None and not mixture:
+            return MatchResult(pr, labels, None, None)
+
+        # spaces improve appearance
+        table_data = {' Compound ': compounds or [], ' Score ': scores or []}
+        dataframe = pd.DataFrame(data=table_data).round(2)
+        
+        # Changes the displayed score to a percent
+        dataframe[' Score '] = (dataframe[' Score '] * 100).astype(str) + "%"        
+
+        if mixture:
+            dataframe = self.add_mixture(dataframe, mixture, residual)
+
+        return MatchResult(pr, labels, compounds, scores, dataframe, curve_x, curve_y)
+
+    def add_mixture(self, dataframe, mixture, residual):
+        """
+        Adds a Mixture column (component fractions) to the results table,
+        appending components which weren't single-compound matches, and a 
+        final Residual row.
+        """
+        fractions = { m["Name"]: f"{m['Fraction'] * 100:.1f}%" for m in mixture }
+        dataframe[' Mixture '] = [ fractions.pop(name, "") for name in dataframe[' Compound '] ]
+
+        rows = [ { ' Compound ': name, ' Score ': "", ' Mixture ': fraction } for name, fraction in fractions.items() ]
+        rows.append({ ' Compound ': "(residual)", ' Score ': "", ' Mixture ': f"{residual * 100:.1f}%" })
+        return pd.concat([ dataframe, pd.DataFrame(rows) ], ignore_index=True)
+
+    def edit_pearson(self, func, *args):
+        """
+        Queue a change to Pearson, applied by the next match() (see class 
+        comment). Changes are applied in the order queued.
+
+        @param func (Input) called with args, e.g. self.pearson.reset
+        """
+        with self.condition:
+            self.pearson_edits.append((func, args))
+
+    def apply_pearson_edits(self):
+        """ apply any changes queued by edit_pearson (called by match) """
+        with self.condition:
+            edits, self.pearson_edits = self.pearson_edits, []
+        for func, args in edits:
+            func(*args)
+
+    def publish(self, result):
+        """ 
+        Keep the MatchResult for tick() to display. Requests are matched in 
+        order by a single worker, so this is always the newest.
+        """
+        with self.condition:
+            self.result = result
+
     def set_library_dir(self, path):
         """ 
         This sets the path to the USER library dir, which is normally 
@@ -308,6 +520,8 @@ class LibraryMatchingFeature(EnlightenFeature):
         self.user_library_dir = path
         os.makedirs(self.user_library_dir, exist_ok=True)
 
+        self.edit_pearson(setattr, self.pearson, "user_library_dir", path)
+
         # only colorize the button if the user has selected a non-standard path
         is_custom = self.user_library_dir != self.DEFAULT_USER_LIBRARY_DIR
         self.ctl.gui.colorize_button(self.bt_select_library, is_custom)
@@ -315,8 +529,7 @@ class LibraryMatchingFeature(EnlightenFeature):
         # always show tooltip
         self.bt_select_library.setToolTip(path)
 
-        if self.pearson:
-            self.pearson.reset()
+        self.edit_pearson(self.pearson.reset)
 
     def init_from_ini(self):
         path = self.ctl.config.get(self.SECTION, "user_library_dir", default=None)
@@ -332,6 +545,16 @@ class LibraryMatchingFeature(EnlightenFeature):
         self.min_score = self.ctl.config.get_float(self.SECTION, "min_score", default=0.65)
         self.ds_min_score.setValue(self.min_score)
 
+        self.cache = self.ctl.config.get_bool(self.SECTION, "cache", default=True)
+        self.use_async = self.ctl.config.get_bool(self.SECTION, "async", default=True)
+        self.mixture = self.ctl.config.get_bool(self.SECTION, "mixture", default=False)
+        self.mixture_candidates = self.ctl.config.get_int(self.SECTION, "mixture_candidates", default=8)
+
+        # libraries with more compounds than prefilter_candidates are pre-filtered
+        # by a LibraryIndex of this many dimensions (0 candidates to disable)
+        self.prefilter_candidates = self.ctl.config.get_int(self.SECTION, "prefilter_candidates", default=256)
+        self.prefilter_dimensions = self.ctl.config.get_int(self.SECTION, "prefilter_dimensions", default=32)
+
     def select_library_callback(self):
         """
         Callback for when user clicks "Select Library" button. Since this is
@@ -427,8 +650,8 @@ class LibraryMatchingFeature(EnlightenFeature):
                     else:
                         outfile.write(line)
 
-        log.debug("bouncing matching engine")
-        self.pearson.reset()
+        log.debug("adding to matching engine")
+        self.edit_pearson(self.pearson.add_to_library, new_pathname, f"{label}*")
 
     def wrapped(self, s):
         """
@@ -452,166 +675,3 @@ class LibraryMatchingFeature(EnlightenFeature):
                 lines.append(s)
                 break
         return "\n".join(lines)
-
-class Pearson:
-    def __init__(self, feature):
-        self.feature = feature
-        self.ctl = self.feature.ctl
-        self.reset()
-
-    def reset(self):
-        self.library_spectra = None
-        self.best_library_spectrum = None
-        self.best_library_wavenumbers = None
-
-    def lazy_load_library(self):
-        if self.library_spectra:
-            # log.debug("Pearson.lazy_load_spectra: Library was already loaded")
-            return
-
-        self.compound_names = []  # positional, so not required to be unique
-        self.library_spectra = []
-
-        library_dirs = []
-        if self.feature.use_dist:
-            library_dirs.append(self.feature.dist_library_dir)
-        library_dirs.append(self.feature.user_library_dir)
-
-        # recursively iterate down through each folder tree, looking for .csv files
-        for library_dir in library_dirs:
-            if not os.path.isdir(library_dir):
-                continue
-
-            for (dirpath, _dirnames, filenames) in os.walk(library_dir):
-                for filename in sorted(filenames):
-                    if filename.startswith(".") or not filename.endswith(".csv"):
-                        log.debug(f"Pearson.lazy_load_spectra: ignoring {filename}")
-                        continue
-
-                    basename = filename.removesuffix(".csv")
-                    pathname = os.path.join(dirpath, filename)
-
-                    # append asterisk when matching to user-generated spectra
-                    if library_dir == self.feature.user_library_dir:
-                        basename += "*"
-
-                    self.compound_names.append(basename)
-
-                    log.debug(f"Pearson.lazy_load_spectra: loading {basename} ({pathname})")
-                    try:
-                        # note that we load metadata, but don't do anything with it (even label)
-                        csv_loader = CSVLoader(pathname)
-                        pr, metadata = csv_loader.load_data(scalar_metadata=True)
-                    except:
-                        self.ctl.marquee.error(f"LibraryMatching: error loading {pathname}")
-                        log.error(f"Failed to load library spectrum {pathname}", exc_info=1)
-                        continue
-
-                    df = pd.DataFrame({
-                        'Wavenumber': pr.get_wavenumbers(),
-                        'Intensity': pr.get_processed()
-                    })
-                    self.library_spectra.append(df)
-
-    def process(self, wavenumbers, spectrum):
-        try:
-            self.lazy_load_library()
-
-            match_result = self.generate_result(wavenumbers, spectrum)
-            if match_result is None or len(match_result) == 0:
-                return None, None
-
-            # extract matches from response
-            compounds = []
-            scores = []
-            for result in match_result:
-                compounds.append(result["Name"])
-                scores.append(result["Score"])
-            return compounds, scores
-
-        except Exception:
-            log.debug(f"caught exception during Pearson.process", exc_info=1)
-            return None, None
-
-    def generate_result(self, wavenumbers, spectrum):
-        """
-            a simple correlation routine
-
-            1. find wavenumber overlap
-            2. interpolate to same wavenumber axis
-            3. do Pearson correlation
-
-            library spectra as list of pandas data frames
-              self.library_spectra = list of pd-df
-            expects return to be used as follows:
-               for result in match_result:
-                  compounds.append(result["Name"])
-                  scores.append(result["Score"])
-        """
-
-        pd_spectrum = pd.DataFrame({"Wavenumber": wavenumbers, "Intensity": spectrum})
-        pd_spectrum = pd_spectrum.dropna()
-
-        # we need to find the overlap
-        spectrum_min_wavenumber = pd_spectrum["Wavenumber"].min()
-        spectrum_max_wavenumber = pd_spectrum["Wavenumber"].max()
-
-        best_correlation = -1
-        self.best_library_spectrum = None
-        self.best_library_wavenumbers = None
-
-        matches = []
-        for libraryID in range(len(self.library_spectra)):
-            library_spectrum = self.library_spectra[libraryID]
-
-            library_length = len(library_spectrum["Wavenumber"].to_numpy())
-            library_min_wavenumber = library_spectrum["Wavenumber"].min()
-            library_max_wavenumber = library_spectrum["Wavenumber"].max()
-
-            # this is the overlap region in wavenumbers
-            start_wavenumber = max(spectrum_min_wavenumber, library_min_wavenumber)
-            end_wavenumber = min(spectrum_max_wavenumber, library_max_wavenumber)
-
-            # restrict the range we are interpolating to
-            # if library is wider, we will restrict to sample range
-            # if sample is wider, we wil restrict to library range
-            library_wavenumbers = library_spectrum["Wavenumber"].to_numpy()
-            library_wavenumbers_subset = [i for i in range(library_length) if
-                                          library_wavenumbers[i] >= start_wavenumber and library_wavenumbers[
-                                              i] <= end_wavenumber]
-
-            # now interpolate spectrum to library wavenumbers
-            spectrum_interpolater = interp1d(pd_spectrum["Wavenumber"].to_numpy(), pd_spectrum["Intensity"].to_numpy())
-            library_wavenumbers_interp = library_wavenumbers[library_wavenumbers_subset]
-            spectrum_interp = spectrum_interpolater(library_wavenumbers_interp)
-
-            # and now for the actual match - use Pearson correlation
-            library_spectrum = library_spectrum["Intensity"].to_numpy()
-            library_spectrum = library_spectrum[library_wavenumbers_subset]
-            correlation, _ = pearsonr(library_spectrum, spectrum_interp)
-
-            # track all matches that meet the minimum score
-            if correlation >= self.feature.min_score:
-                matches.append({"Score": correlation, "Name": self.compound_names[libraryID]})
-
-                # track best correlation so we can graph top-matching library spectrum
-                if (best_correlation < correlation):
-                    best_correlation = correlation
-
-                    # scale library intensity to measurement (probably a numpy call for this)
-                    low = min(library_spectrum)
-                    rng = max(library_spectrum) - low
-                    top = max(spectrum_interp)
-                    self.best_library_spectrum = [top * ((v - low) / rng) for v in library_spectrum]
-                    self.best_library_wavenumbers = library_wavenumbers_interp
-
-                    log.debug(f"library_spectrum = {len(self.best_library_spectrum)}, "
-                              f"library_wavenumbers = {len(self.best_library_wavenumbers)}")
-
-        def cmp_score(a, b):
-            if a["Score"] < b["Score"]: return -1
-            if a["Score"] > b["Score"]: return +1
-            return 0
-
-        # sort matches in descending order by score
-        return sorted(matches, key=cmp_to_key(cmp_score), reverse=True)
@@ -0,0 +1,345 @@
+import os
+import time
+import logging
+import numpy as np
+
+from wasatch.CSVLoader import CSVLoader
+
+from enlighten.post_processing.CompiledLibrary import CompiledLibrary
+from enlighten.post_processing.LibraryCache import LibraryCache, LibraryEntry
+from enlighten.post_processing.LibraryIndex import LibraryIndex
+
+log = logging.getLogger(__name__)
+
+class Pearson:
+    """
+    Matches spectra against a library of ENLIGHTEN CSV measurements by Pearson
+    correlation (over the overlapping wavenumber range).
+
+    Library spectra are compiled into a CompiledLibrary (one float32 matrix on
+    a common wavenumber grid), so each spectrum is scored against the whole
+    library with a single matrix product.
+
+    This has no GUI dependencies, so can be used by ProcessingEngine outside
+    ENLIGHTEN; LibraryMatchingFeature keeps its attributes in sync with the
+    GUI. Library spectra are loaded on first use, and after reset(); if given
+    a cache_dir, they are persisted in a LibraryCache so later sessions only
+    parse CSVs which have changed.
+    """
+
+    NAME = "Pearson"
+
+    # mixture components contributing less than this aren't reported
+    MIN_MIXTURE_FRACTION = 0.01
+
+    # candidate refinements when unmixing (see generate_mixture)
+    MIXTURE_ROUNDS = 3
+
+    def __init__(self, dist_library_dir=None, user_library_dir=None, use_dist=True, min_score=0.65, error_callback=None, cache_dir=None,
+                 prefilter_candidates=0, prefilter_dimensions=32, mixture=False, mixture_candidates=8):
+        """
+        @param dist_library_dir (Input) "distribution" library (used if use_dist)
+        @param user_library_dir (Input) user-generated library spectra (compound
+               names are suffixed with "*")
+        @param error_callback (Input) optional callable(msg) for load errors
+        @param cache_dir (Input) optional directory for LibraryCache (else
+               every CSV is parsed on every load)
+        @param prefilter_candidates (Input) if the library has more compounds
+               than this, only this many candidates (pre-filtered by a
+               LibraryIndex) are scored exactly (0 to always score all)
+        @param prefilter_dimensions (Input) LibraryIndex principal components
+        @param mixture (Input) also model each spectrum as a mixture of the
+               top mixture_candidates compounds (see CompiledLibrary.unmix)
+        """
+        self.dist_library_dir = dist_library_dir
+        self.user_library_dir = user_library_dir
+        self.use_dist = use_dist
+        self.min_score = min_score
+        self.error_callback = error_callback
+        self.cache_dir = cache_dir
+        self.prefilter_candidates = prefilter_candidates
+        self.prefilter_dimensions = prefilter_dimensions
+        self.mixture = mixture
+        self.mixture_candidates = mixture_candidates
+        self.reset()
+
+    def reset(self):
+        self.library = None
+        self.index = None
+        self.entries = None
+        self.cache = None
+        self.best_library_spectrum = None
+        self.best_library_wavenumbers = None
+        self.mixture_result = None
+        self.mixture_residual = None
+
+    def get_library_dirs(self):
+        library_dirs = []
+        if self.use_dist:
+            library_dirs.append(self.dist_library_dir)
+        library_dirs.append(self.user_library_dir)
+        return library_dirs
+
+    def find_library_files(self):
+        """ @returns list of (pathname, compound name) for every library CSV """
+        files = []
+
+        # recursively iterate down through each folder tree, looking for .csv files
+        for library_dir in self.get_library_dirs():
+            if library_dir is None or not os.path.isdir(library_dir):
+                continue
+
+            for (dirpath, dirnames, filenames) in os.walk(library_dir):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.startswith(".") or not filename.endswith(".csv"):
+                        log.debug(f"Pearson.find_library_files: ignoring {filename}")
+                        continue
+
+                    basename = filename.removesuffix(".csv")
+                    pathname = os.path.join(dirpath, filename)
+
+                    # append asterisk when matching to user-generated spectra
+                    if library_dir == self.user_library_dir:
+                        basename += "*"
+
+                    files.append((pathname, basename))
+        return files
+
+    def load_entry(self, pathname, name, stat=None):
+        """ @returns LibraryEntry (without a spectrum if the CSV couldn't be loaded) """
+        stat = stat or os.stat(pathname)
+        entry = LibraryEntry(pathname, name, stat.st_mtime, stat.st_size)
+
+        log.debug(f"Pearson.load_entry: loading {name} ({pathname})")
+        try:
+            # note that we load metadata, but don't do anything with it (even label)
+            csv_loader = CSVLoader(pathname)
+            pr, metadata = csv_loader.load_data(scalar_metadata=True)
+            entry.wavenumbers = np.asarray(pr.get_wavenumbers(), dtype=np.float64)
+            entry.intensities = np.asarray(pr.get_processed(), dtype=np.float64)
+        except:
+            if self.error_callback:
+                self.error_callback(f"LibraryMatching: error loading {pathname}")
+            log.error(f"Failed to load library spectrum {pathname}", exc_info=1)
+        return entry
+
+    def compile(self, entries):
+        """ @returns CompiledLibrary of the entries which loaded (so names and spectra stay aligned) """
+        loaded = [ entry for entry in entries if entry.is_loaded() ]
+        start = time.time()
+        library = CompiledLibrary([ e.name for e in loaded ], [ (e.wavenumbers, e.intensities) for e in loaded ])
+        log.debug(f"Pearson.compile: compiled {library} in {(time.time() - start) * 1000:.1f}ms")
+        return library
+
+    def lazy_load_library(self):
+        """
+        Loads and compiles the library. With a cache_dir, only CSVs which are 
+        new or changed (by mtime and size) since the cache was saved are
+        parsed, and if none are, the cached CompiledLibrary is memory-mapped
+        as-is.
+        """
+        if self.library is not None:
+            # log.debug("Pearson.lazy_load_spectra: Library was already loaded")
+            return
+
+        cached_entries, cached_library = [], None
+        if self.cache_dir is not None:
+            self.cache = LibraryCache(self.cache_dir, self.get_library_dirs())
+            cached_entries, cached_library = self.cache.load()
+        cached = { entry.pathname: entry for entry in cached_entries }
+
+        entries = []
+        parsed = 0
+        for pathname, name in self.find_library_files():
+            try:
+                stat = os.stat(pathname)
+            except OSError:
+                log.error(f"unable to stat library spectrum {pathname}", exc_info=1)
+                continue
+
+            entry = cached.get(pathname)
+            if entry is None or not entry.is_current(name, stat):
+                entry = self.load_entry(pathname, name, stat)
+                parsed += 1
+            entries.append(entry)
+
+        changed = parsed > 0 or { e.pathname for e in entries } != set(cached)
+        if changed or cached_library is None:
+            self.library = self.compile(entries)
+            if self.cache is not None:
+                self.cache.save(entries, self.library)
+        else:
+            self.library = cached_library
+
+        self.entries = entries
+        self.build_index()
+        log.debug(f"Pearson.lazy_load_library: {self.library} ({parsed} of {len(entries)} files parsed)")
+
+    def build_index(self):
+        """ builds the pre-filter, if the library is big enough to need one """
+        self.index = None
+        if self.prefilter_candidates and self.library is not None and len(self.library) > self.prefilter_candidates:
+            self.index = LibraryIndex(self.library, dimensions=self.prefilter_dimensions)
+
+    def add_to_library(self, pathname, name=None):
+        """
+        Adds (or updates) one library CSV without reloading the rest: the new
+        spectrum is appended to the compiled library (and cache) if it fits
+        on the existing grid, else the library is recompiled from the 
+        already-loaded spectra.
+
+        @param name (Input) compound name (defaults to the filename, suffixed
+               with "*" as a user-generated spectrum)
+        """
+        if self.library is None:
+            # not loaded yet, so will be found on the next lazy_load_library
+            return
+
+        if name is None:
+            name = os.path.basename(pathname).removesuffix(".csv") + "*"
+
+        entry = self.load_entry(pathname, name)
+        existing = [ i for i, e in enumerate(self.entries) if e.pathname == pathname ]
+        if existing:
+            self.entries[existing[0]] = entry
+            self.library = self.compile(self.entries)
+            self.build_index()
+        else:
+            self.entries.append(entry)
+            if entry.is_loaded() and not self.library.append(name, entry.wavenumbers, entry.intensities):
+                self.library = self.compile(self.entries)
+                self.build_index()
+            elif self.index is not None:
+                self.index.extend(self.library)
+            else:
+                self.build_index()
+
+        if self.cache is not None:
+            self.cache.save(self.entries, self.library)
+        log.debug(f"Pearson.add_to_library: added {name} ({self.library})")
+
+    def process(self, wavenumbers, spectrum):
+        try:
+            self.lazy_load_library()
+
+            match_result = self.generate_result(wavenumbers, spectrum)
+            if match_result is None or len(match_result) == 0:
+                return None, None
+
+            # extract matches from response
+            compounds = []
+            scores = []
+            for result in match_result:
+                compounds.append(result["Name"])
+                scores.append(result["Score"])
+            return compounds, scores
+
+        except Exception:
+            log.debug(f"caught exception during Pearson.process", exc_info=1)
+            return None, None
+
+    def generate_mixture(self, resampled, scores, candidates=None):
+        """
+        Unmixes the sample against the best-scoring compounds (whether or not
+        they meet min_score, as mixtures often won't), storing the components
+        as mixture_result (list of dicts with "Name" and "Fraction", in 
+        descending order of fraction) and mixture_residual.
+
+        A minor component may not score well enough on its own to be a 
+        candidate, so for up to MIXTURE_ROUNDS, candidates which didn't 
+        contribute are swapped for the compounds which best correlate with 
+        whatever the mixture left unexplained (one more product against the
+        library per round). The solve itself only ever involves 
+        mixture_candidates compounds.
+        """
+        y, lo, hi = resampled
+
+        def best(scores, exclude=()):
+            """ @returns library indices in descending order of score (positive only) """
+            with np.errstate(invalid="ignore"):
+                scored = np.flatnonzero(np.isfinite(scores) & (scores > 0))
+            ordered = scored[np.argsort(-scores[scored], kind="stable")]
+            ordered = ordered if candidates is None else candidates[ordered]
+            return [ int(i) for i in ordered if i not in exclude ]
+
+        indices = best(scores)[:self.mixture_candidates]
+        if not indices:
+            return
+
+        solution = None
+        for _ in range(self.MIXTURE_ROUNDS):
+            fractions, residual, remainder = self.library.unmix(y, lo, hi, indices)
+            if solution is None or residual < solution[2]:
+                solution = (indices, fractions, residual)
+
+            used = [ i for i, fraction in zip(indices, fractions) if fraction > 0 ]
+            unexplained = self.library.score_resampled(remainder, lo, hi, indices=candidates)
+            added = best(unexplained, exclude=set(used))[:self.mixture_candidates - len(used)]
+            if not added or set(used + added) == set(indices):
+                break
+            indices = used + added
+
+        indices, fractions, residual = solution
+        order = np.argsort(-fractions, kind="stable")
+        self.mixture_result = [ { "Name": self.library.names[indices[i]], "Fraction": float(fractions[i]) } 
+                                for i in order if fractions[i] >= self.MIN_MIXTURE_FRACTION ]
+        self.mixture_residual = residual
+
+    def generate_result(self, wavenumbers, spectrum):
+        """
+        Scores the spectrum against every compound in the compiled library at
+        once (Pearson correlation over the wavenumber overlap of each), or 
+        only against the candidates pre-filtered by the LibraryIndex, if the
+        library is big enough to have one.
+
+        @returns list of dicts with "Name" and "Score", for the compounds
+                 meeting min_score, in descending order of score
+        """
+        self.best_library_spectrum = None
+        self.best_library_wavenumbers = None
+        self.mixture_result = None
+        self.mixture_residual = None
+
+        resampled = self.library.resample(wavenumbers, spectrum)
+        if resampled is None:
+            return []
+
+        candidates = None
+        if self.index is not None and len(self.index) == len(self.library):
+            candidates = self.index.candidates(*resampled, self.prefilter_candidates)
+
+        scores = self.library.score_resampled(*resampled, indices=candidates)
+        if self.mixture:
+            self.generate_mixture(resampled, scores, candidates)
+
+        with np.errstate(invalid="ignore"):
+            indices = np.flatnonzero(scores >= self.min_score)
+        if len(indices) == 0:
+            return []
+
+        # sort matches in descending order by score (stable, so ties keep library order)
+        indices = indices[np.argsort(-scores[indices], kind="stable")]
+        scores = scores[indices]
+        if candidates is not None:
+            indices = candidates[indices]
+        matches = [ { "Score": float(score), "Name": self.library.names[i] } for i, score in zip(indices, scores) ]
+
+        # scale the top-matching library spectrum to the measurement, so we can graph it
+        best = indices[0]
+        overlap = self.library.get_overlap(best, wavenumbers)
+        x, y = CompiledLibrary.clean(wavenumbers, spectrum)
+        library_wavenumbers = np.asarray(self.library.grid[overlap])
+        library_spectrum = self.library.matrix[best, overlap].astype(np.float64)
+        if len(library_spectrum):
+            low = library_spectrum.min()
+            rng = library_spectrum.max() - low
+            top = np.interp(library_wavenumbers, x, y).max()
+            if rng > 0:
+                self.best_library_spectrum = top * (library_spectrum - low) / rng
+                self.best_library_wavenumbers = library_wavenumbers
+
+                log.debug(f"library_spectrum = {len(self.best_library_spectrum)}, "
+                          f"library_wavenumbers = {len(self.best_library_wavenumbers)}")
+
+        return matches
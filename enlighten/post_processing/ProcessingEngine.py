@@ -0,0 +1,1005 @@
+import math
+import logging
+import threading
+import numpy as np
+
+from weakref import WeakKeyDictionary
+from contextlib import nullcontext
+
+from wasatch.ProcessedReading import ProcessedReading
+from wasatch.utils import generate_excitation, generate_wavenumbers, generate_wavelengths_from_wavenumbers
+
+from enlighten.data.ArrayPool import ArrayPool
+from enlighten.post_processing.BandedKernel import BandedKernel
+from enlighten.post_processing.DespikingEngine import DespikingEngine
+from enlighten.post_processing.InterpolationOperator import get_interpolation_operator
+from enlighten.post_processing.SmoothingEngine import SmoothingEngine
+
+log = logging.getLogger(__name__)
+
+class ProcessingOptions:
+    """
+    Everything (besides the Reading and SpectrometerSettings) which decides
+    what ProcessingEngine.process does to a spectrum.
+
+    Defaults give a minimal chain (dark correction, cropping, boxcar at the
+    spectrometer's configured half-width); anything else is enabled by setting
+    attributes, or passing them as keyword arguments:
+
+        options = ProcessingOptions(baseline_algo=AirPLS(), interp_axis=np.arange(400, 2000, 1.0))
+    """
+
+    def __init__(self, **kwargs):
+        self.horiz_roi                  = True      # crop to the EEPROM horizontal ROI
+        self.etalon_correction          = False     # apply SpectrometerSettings.etalon_correction, if any
+        self.using_reference            = False     # reference-based technique (skips Raman-only stages)
+        self.technique                  = None      # "transmission" or "absorbance" (if using_reference)
+        self.reference_is_dark_corrected = False
+        self.max_transmission_perc      = None      # clamp transmission (%)
+        self.despike_mode               = None      # "spectral" or "temporal" (see DespikingEngine)
+        self.despike_tau                = 6.5       # spectral: modified z-score threshold
+        self.despike_window             = 3         # spectral: half-width averaged over spikes
+        self.despike_frames             = 5         # temporal: spectra in the median
+        self.despike_threshold          = 6.0       # temporal: noise sigmas above the median
+        self.despiking_engine           = None      # DespikingEngine (default: engine's own)
+        self.raman_intensity_correction = False     # apply SRM factors from the EEPROM
+        self.baseline_algo              = None      # any superman baseline algo (e.g. AirPLS())
+        self.baseline_algo_name         = None      # for error messages
+        self.baseline_unit              = "px"      # x-axis used to fit baseline ("px", "nm", "cm")
+        self.baseline_engine            = None      # BaselineEngine (warm-starts AirPLS/ALS across frames)
+        self.richardson_lucy_gaussian   = None      # see ProcessingEngine.generate_gaussian
+        self.richardson_lucy_iterations = 5
+        self.dalai                      = False     # only available through hooks
+        self.boxcar_half_width          = None      # default: SpectrometerState.boxcar_half_width
+        self.smoothing_method           = "boxcar"  # see SmoothingEngine.METHODS
+        self.smoothing_polyorder        = 2         # Savitzky-Golay only
+        self.interp_axis                = None      # new x-axis (default no interpolation)
+        self.interp_use_wavenumbers     = False     # else interp_axis is in wavelengths
+        self.library_matcher            = None      # e.g. Pearson
+        self.library_max_results        = None
+        self.pool                       = None      # ArrayPool (default: engine's own)
+
+        for k, v in kwargs.items():
+            if not hasattr(self, k):
+                raise AttributeError(f"ProcessingOptions has no attribute {k}")
+            setattr(self, k, v)
+
+class ProcessingEngine:
+    """
+    The ENLIGHTEN post-processing chain (dark correction through interpolation
+    and library matching), without Qt or any GUI state, so that the same math
+    can be run on servers, in scripts and in CI:
+
+        engine = ProcessingEngine()
+        pr = engine.process(reading, settings, ProcessingOptions(), dark=dark)
+
+    Controller.post_process_reading delegates to process(), passing "hooks"
+    which replace the default implementation of individual stages with the
+    corresponding business object (e.g. BaselineCorrectionFeature.process),
+    which adds GUI-specific behavior (marquee messages, displayed curves,
+    per-spectrometer caches) around the methods below. Stages are named as in
+    StageTimingFeature; DALAI is only available through its hook.
+
+    Each stage method operates on a ProcessedReading in place, and can be
+    called individually.
+
+    @see docs/ORDER_OF_OPERATIONS.md
+    """
+
+    GAUSSIAN_TRUNCATE_SIGMA = 6 # beyond which the Gaussian is < 2e-8 of its peak
+
+    def __init__(self):
+        self.pool = ArrayPool() # for callers not providing their own
+        self.smoothing = SmoothingEngine()
+        self.despiking = DespikingEngine() # for callers not providing their own
+
+        self.axes = WeakKeyDictionary() # SpectrometerSettings -> { name: (source, read-only ndarray) }
+        self.axes_lock = threading.Lock()
+
+    # ##########################################################################
+    # Chain
+    # ##########################################################################
+
+    def process(self, reading, settings, options=None, dark=None, ref=None, pr=None, hooks=None, timed=None, batched=False):
+        """
+        @param reading  (Input) wasatch.Reading
+        @param settings (Input) SpectrometerSettings
+        @param options  (Input) ProcessingOptions
+        @param dark     (Input) dark to subtract (may be None)
+        @param ref      (Input) reference for transmission / absorbance
+        @param pr       (Input) optional ProcessedReading already generated (and
+                        potentially dark-corrected) from the Reading
+        @param hooks    (Input) optional dict of stage name -> callable(pr),
+                        replacing the default implementation of that stage
+        @param timed    (Input) optional callable(stage) returning a context
+                        manager wrapped around each stage
+        @param batched  (Input) if True, stop before boxcar and interpolation
+                        (see Controller.post_process_batch)
+        @returns ProcessedReading
+        """
+        if options is None:
+            options = ProcessingOptions()
+        if hooks is None:
+            hooks = {}
+        if timed is None:
+            timed = lambda stage: nullcontext()
+        pool = options.pool if options.pool is not None else self.pool
+
+        if pr is None:
+            pr = ProcessedReading(reading, settings=settings)
+        self.share_axes(pr, settings)
+
+        def run(stage, default):
+            func = hooks.get(stage, default)
+            if func is not None:
+                with timed(stage):
+                    func(pr)
+
+        ########################################################################
+        # Dark Correction
+        ########################################################################
+
+        if not pr.dark_corrected:
+            run("correct_dark", lambda pr: self.correct_dark(pr, dark))
+
+        ########################################################################
+        # InGaAs Correction (experimental)
+        ########################################################################
+
+        if settings.ingaas_correction:
+            run("ingaas_correction", lambda pr: self.correct_ingaas(pr))
+
+        ########################################################################
+        # Etalon Correction (experimental)
+        ########################################################################
+
+        if settings.etalon_correction:
+            run("etalon_correction", lambda pr: self.correct_etalon(pr) if options.etalon_correction else None)
+
+        ########################################################################
+        # Cropping
+        ########################################################################
+
+        # This should be done before any processing that involves multiple
+        # pixels, e.g. offset, boxcar, baseline correction, or Richardson-Lucy.
+        # It should be done BEFORE interpolation.
+        run("horiz_roi", lambda pr: self.crop_reading(pr, settings) if options.horiz_roi else None)
+
+        ########################################################################
+        # Despiking
+        ########################################################################
+
+        # Cosmic rays are removed before anything spreads them across
+        # neighboring pixels (intensity correction, baseline, deconvolution,
+        # smoothing), and after cropping so the temporal history matches
+        # the displayed pixels.
+        def despike(pr):
+            if options.despike_mode is not None:
+                self.despike(pr, options.despike_mode, tau=options.despike_tau, window=options.despike_window,
+                             frames=options.despike_frames, threshold=options.despike_threshold,
+                             engine=options.despiking_engine)
+        run("despike", despike)
+
+        ########################################################################
+        # Reference
+        ########################################################################
+
+        # add reference to ProcessedReading whether or not we're actively in a
+        # reference view, so plugins etc can access it
+        pr.reference = ref
+
+        if options.using_reference:
+            if options.technique == "transmission":
+                run("transmission", lambda pr: self.transmission(pr, settings, options.reference_is_dark_corrected, options.max_transmission_perc))
+            elif options.technique == "absorbance":
+                run("absorbance", lambda pr: self.absorbance(pr, settings, options.reference_is_dark_corrected, options.max_transmission_perc))
+
+        ########################################################################
+        # non-reference views
+        ########################################################################
+
+        else:
+
+            # This MUST be done before interpolation.
+            if options.raman_intensity_correction:
+                run("raman_intensity_correction", lambda pr: self.correct_raman_intensity(pr, settings))
+
+            # Dieter goes back and forth on the order of these next two:
+
+            # a potentially better approach might be:
+            # - trim spectrum to useful range
+            # - intensity correction using SRM on nominal wavenumber axis
+            # - BASELINE CORRECTION
+            # - DECONVOLUTION
+            # - wavenumber axis calibration --WP-00413 report, p200
+
+            # If we invert the order of operation, applying the intensity
+            # correction first, then the DECONVOLUTION, and the BASELINE
+            # CORRECTION last, we see a better performance, especially with the
+            # alternate baseline method "ALS". --WP-00413 report, p217
+
+            def baseline(pr):
+                if options.baseline_algo is None:
+                    return
+                x_axis = self.generate_x_axis(settings, unit=options.baseline_unit, cropped=pr.is_cropped())
+                self.correct_baseline(pr, options.baseline_algo, x_axis, name=options.baseline_algo_name, baseline_engine=options.baseline_engine)
+            run("baseline_correction", baseline)
+
+            # on 2020-05-19 Deiter asked this to be moved before cropping
+            # (yet clearly we haven't...)
+            def richardson_lucy(pr):
+                if options.richardson_lucy_gaussian is not None:
+                    self.deconvolve(pr, options.richardson_lucy_gaussian, options.richardson_lucy_iterations, pool)
+            run("richardson_lucy", richardson_lucy)
+
+        ########################################################################
+        # DALAI-RAMAN
+        ########################################################################
+
+        if options.dalai:
+            run("dalai", None)
+
+        ########################################################################
+        # Boxcar Smoothing
+        ########################################################################
+
+        # One could argue whether boxcar should be before or after interpolation;
+        # however, it currently calls ProcessedReading.set_processed which does
+        # NOT update .interpolated, so for now it must remain before.
+
+        if batched:
+            return pr
+
+        def boxcar(pr):
+            half_width = options.boxcar_half_width
+            if half_width is None:
+                half_width = settings.state.boxcar_half_width
+            self.boxcar(pr, half_width, recordable=not options.using_reference, pool=pool, 
+                        method=options.smoothing_method, polyorder=options.smoothing_polyorder)
+        run("boxcar", boxcar)
+
+        ########################################################################
+        # Interpolation
+        ########################################################################
+
+        def interp(pr):
+            if options.interp_axis is not None:
+                self.interpolate(pr, options.interp_axis, use_wavenumbers=options.interp_use_wavenumbers)
+        run("interp", interp)
+
+        ########################################################################
+        # Library Matching
+        ########################################################################
+
+        # (ENLIGHTEN itself matches on the GUI thread, after plugins)
+        if options.library_matcher is not None:
+            run("library_matching", lambda pr: self.match_library(pr, options.library_matcher, options.library_max_results))
+
+        return pr
+
+    # ##########################################################################
+    # Stages
+    # ##########################################################################
+
+    def correct_dark(self, pr, dark):
+        """
+        Equivalent to wasatch.ProcessedReading.correct_dark, except that the dark
+        is referenced rather than copied, so every ProcessedReading corrected
+        against the same (read-only) dark shares it.
+
+        @param pr (In/Out) ProcessedReading
+        @param dark (Input) dark to subtract (may be None)
+        """
+        if pr.dark_corrected:
+            return
+
+        if dark is None:
+            pr.dark = None
+            pr.dark_corrected = False
+        elif len(dark) == len(pr.processed):
+            pr.dark = dark
+            pr.processed -= dark
+            pr.dark_corrected = True
+
+        pr.recordable_reference = np.copy(pr.processed)
+
+    def correct_ingaas(self, pr):
+        if not pr.settings.ingaas_correction:
+            return
+
+        try:
+            log.debug("applying InGaAs correction")
+            spectrum = pr.get_processed()
+            corrected = pr.settings.ingaas_correction.apply(spectrum)
+            pr.set_processed(corrected)
+            pr.ingaas_corrected = True
+        except:
+            log.error("error applying InGaAs correction", exc_info=1)
+
+    def correct_etalon(self, pr):
+        if not pr.settings.etalon_correction:
+            return
+
+        try:
+            log.debug("applying etalon correction")
+            spectrum = pr.get_processed()
+            corrected = pr.settings.etalon_correction.apply(spectrum)
+            pr.set_processed(corrected)
+            pr.etalon_corrected = True
+        except:
+            log.error("error applying etalon correction", exc_info=1)
+
+    def crop(self, spectrum, roi):
+        """
+        Note this can be used for any array, not just spectra.
+
+        @returns the spectrum cropped to the ROI (unchanged if the ROI is
+                 missing or doesn't fit)
+        """
+        if spectrum is None:
+            return
+
+        if roi is None:
+            return spectrum
+
+        orig_len = len(spectrum)
+        if not roi.valid() or roi.start >= orig_len or roi.end >= orig_len:
+            return spectrum
+
+        return roi.crop(spectrum)
+
+    def get_axis(self, settings, name):
+        """
+        @param name (Input) "wavelengths" or "wavenumbers"
+        @returns the SpectrometerSettings' axis as a read-only float64 ndarray,
+                 shared by every caller until the wavecal (i.e. the settings'
+                 list) changes (None if the settings have no such axis)
+        """
+        source = getattr(settings, name, None)
+        if source is None or len(source) == 0:
+            return None
+
+        with self.axes_lock:
+            cached = self.axes.setdefault(settings, {})
+            if name in cached and cached[name][0] is source and len(cached[name][1]) == len(source):
+                return cached[name][1]
+
+            axis = np.array(source, dtype=np.float64)
+            axis.flags.writeable = False
+            cached[name] = (source, axis)
+            return axis
+
+    def share_axes(self, pr, settings):
+        """
+        Replaces the ProcessedReading's private copies of the x-axes with the
+        read-only arrays shared by every ProcessedReading from the same wavecal
+        (see get_axis), so stored Measurements don't each hold their own.
+        """
+        if pr is None or settings is None:
+            return
+        for name in [ "wavelengths", "wavenumbers" ]:
+            axis = self.get_axis(settings, name)
+            current = getattr(pr, name)
+            if axis is None or current is None or current is axis or len(current) != len(axis):
+                continue
+            # (ProcessedReadings generated with these settings copied this axis)
+            if pr.settings is settings or np.array_equal(current, axis):
+                setattr(pr, name, axis)
+
+    def crop_reading(self, pr, settings):
+        """
+        The cropped arrays are numpy views into the full-detector arrays (and
+        the shared x-axes), not copies. Stages must therefore replace cropped
+        arrays (e.g. via set_processed) rather than modify them in place.
+
+        @param pr (In/Out) ProcessedReading
+        @param settings (Input) SpectrometerSettings
+        @returns Nothing (side-effect: populates pr.cropped)
+        """
+        if pr is None or pr.processed is None or settings is None:
+            return
+
+        roi = settings.eeprom.get_horizontal_roi()
+        if roi is None:
+            return
+
+        if not isinstance(pr.processed, np.ndarray):
+            pr.processed = np.array(pr.processed, dtype=np.float64)
+
+        # (settings assigned afterwards, so the constructor doesn't copy the axes)
+        prc = ProcessedReading()
+        prc.settings    = settings
+        prc.processed   = self.crop(pr.processed,                            roi=roi)
+        prc.wavelengths = self.crop(self.get_axis(settings, "wavelengths"), roi=roi)
+        prc.wavenumbers = self.crop(self.get_axis(settings, "wavenumbers"), roi=roi)
+        prc.first_pixel = roi.start
+
+        pr.cropped = prc
+
+    def despike(self, pr, mode="spectral", tau=6.5, window=3, frames=5, threshold=6.0, engine=None):
+        """
+        Removes cosmic-ray spikes from the processed spectrum.
+
+        @param pr (In/Out) ProcessedReading
+        @param mode (Input) see DespikingEngine.MODES
+        @param engine (Input) DespikingEngine holding the temporal history of
+               this spectrometer (default: the ProcessingEngine's own)
+        @returns number of pixels replaced
+        @note supports cropped ProcessedReading
+        """
+        if pr is None or pr.processed is None:
+            return 0
+
+        if engine is None:
+            engine = self.despiking
+
+        despiked, mask = engine.despike(pr.get_processed(), mode=mode, tau=tau, window=window, frames=frames, threshold=threshold)
+        spikes = int(np.count_nonzero(mask))
+        if spikes:
+            pr.set_processed(despiked)
+        return spikes
+
+    def transmission(self, pr, settings=None, reference_is_dark_corrected=False, max_perc=None):
+        """
+        transmission processing is: 100 * (sample - dark) / (reference - dark)
+        (if no dark is available, just use sample / reference)
+
+        @returns tuple of (True if ProcessedReading.processed successfully
+                 updated, error message or None)
+        @note pixels where the reference is zero are reported as 0%
+        """
+        if pr.dark is None:
+            return False, "Please take dark"
+
+        ref = pr.reference
+        if ref is None:
+            return False, "Please take reference"
+
+        # dark-correct reference if not already done
+        if not reference_is_dark_corrected:
+            ref = ref.copy()
+            ref -= pr.dark
+
+        sample = pr.get_processed()
+        if sample is None:
+            log.error("can't compute transmission without a sample")
+            return False, None
+
+        if pr.is_cropped() and settings is not None:
+            roi = settings.eeprom.get_horizontal_roi()
+            ref = self.crop(ref, roi=roi)
+
+        if len(ref) != len(sample):
+            return False, "reference and sample must be same size"
+
+        sample = np.asarray(sample, dtype=np.float64)
+        ref = np.asarray(ref, dtype=np.float64)
+
+        transmission = np.zeros(len(sample))
+        np.divide(sample, ref, out=transmission, where=(ref != 0))
+        transmission *= 100.0
+        if max_perc is not None:
+            np.minimum(transmission, max_perc, out=transmission)
+        has_neg = bool(np.any(transmission < 0))
+
+        pr.set_processed(transmission)
+        log.debug("trans = %s", transmission[0:5])
+        return True, "measurement out-of-range" if has_neg else None
+
+    ## above this it's likely bad data, based on current model performance
+    MAX_AU = 6.0
+
+    def absorbance(self, pr, settings=None, reference_is_dark_corrected=False, max_perc=None):
+        """
+        Computes absorbance (using Beer's Law) from the transmission of the
+        current processed spectrum, then stores it back into 'processed.'
+
+        @returns tuple of (False if transmission can't be computed, or value
+                 exceeds MAX_AU; error message or None)
+        """
+        ok, msg = self.transmission(pr, settings, reference_is_dark_corrected, max_perc)
+        if not ok:
+            log.error("can't compute absorbance w/o transmission")
+            return False, msg
+
+        # zero transmission is reported as 0AU; negative (or NaN) transmission,
+        # and absorbance beyond MAX_AU, as MAX_AU
+        t = np.asarray(pr.get_processed(), dtype=np.float64) / 100.0
+        positive = t > 0
+        invalid = ~positive & (t != 0)
+
+        absorbance = np.zeros(len(t))
+        np.log10(t, out=absorbance, where=positive)
+        absorbance[positive] *= -1.0
+        saturated = bool(np.any(invalid) or np.any(absorbance > self.MAX_AU))
+        np.minimum(absorbance, self.MAX_AU, out=absorbance)
+        absorbance[invalid] = self.MAX_AU
+
+        log.debug(f"calling pr.set_processed({absorbance[:5]})")
+        pr.set_processed(absorbance)
+
+        if saturated:
+            return False, "absorbance out-of-range" # (even though we did update array for graphing)
+
+        return True, msg
+
+    def correct_raman_intensity(self, pr, settings):
+        """
+        Applies the EEPROM's Raman intensity calibration (SRM) to the cropped
+        spectrum. This MUST be done before interpolation.
+
+        @returns True if applied
+        """
+        if pr is None or settings is None or not settings.eeprom.has_raman_intensity_calibration():
+            return False
+
+        factors = settings.raman_intensity_factors
+        if factors is None or len(factors) != len(pr.raw):
+            return False
+
+        if pr.interpolated:
+            log.error("Raman Intensity Correction cannot be applied AFTER interpolation")
+            return False
+
+        if pr.cropped is None:
+            return False
+
+        log.debug("applying SRM correction to ROI")
+        roi = settings.eeprom.get_horizontal_roi()
+
+        # a new array, as cropped.processed may be a view of the full spectrum
+        cropped = np.asarray(pr.cropped.processed, dtype=np.float64)
+        pr.cropped.processed = cropped * np.asarray(factors[roi.start:roi.start + len(cropped)], dtype=np.float64)
+        pr.raman_intensity_corrected = True
+        return True
+
+    def generate_baseline(self, algo, spectrum, x_axis, name=None, baseline_engine=None):
+        """
+        @param algo (Input) superman baseline algorithm (e.g. AirPLS)
+        @param baseline_engine (In/Out) optional BaselineEngine, warm-starting 
+               supported algos (AirPLS, ALS) from the previous frame
+        @returns baseline (None on error)
+        """
+        intensities = np.array(spectrum, dtype=np.float64)
+        bands       = np.array(x_axis, dtype=np.float64)
+
+        try:
+            if baseline_engine is not None and baseline_engine.supports(algo):
+                baseline = baseline_engine.generate(algo, intensities, bands)
+            else:
+                fitted = algo.fit(
+                    bands       = bands,
+                    intensities = intensities,
+                    segment     = False,              # doesn't seem to matter?
+                    invert      = False)
+                baseline = fitted.baseline
+
+            baseline = np.clip(baseline, -65535, 65535)
+            return baseline
+        except:
+            log.error("exception in generate_baseline with algo %s", name, exc_info=1)
+
+    def subtract_baseline(self, pr, baseline):
+        corrected = np.subtract(pr.get_processed(), baseline)
+        corrected[corrected < 0] = 0
+        pr.set_processed(corrected)
+
+    def correct_baseline(self, pr, algo, x_axis, name=None, baseline_engine=None):
+        """
+        @note uses cropped spectrum if found
+        @returns the baseline which was subtracted (None if not)
+        """
+        if pr is None or pr.processed is None or len(pr.processed) < 2 or algo is None:
+            return
+
+        baseline = self.generate_baseline(algo, pr.get_processed(), x_axis, name=name, baseline_engine=baseline_engine)
+        if baseline is None:
+            log.error("unable to generate baseline")
+            return
+
+        self.subtract_baseline(pr, baseline)
+        return baseline
+
+    def generate_gaussian(self, x_axis, fwhm, downgrade=1.0, banded=True):
+        """
+        Generates the Richardson-Lucy point-spread matrix for the given x-axis,
+        where fwhm is the optical resolution in the units of that axis.
+        This is somewhat intensive, so callers should cache it.
+
+        The Gaussian is negligible a few sigma from the diagonal, so by default
+        it is truncated to GAUSSIAN_TRUNCATE_SIGMA and returned as a
+        BandedKernel, making each deconvolution iteration O(pixels * band)
+        rather than O(pixels²). The dense ndarray is returned if banded is
+        False, or if the band would cover most of the matrix anyway.
+
+        @param downgrade how much to downgrade the spectrometer's spec'd (claimed) resolution
+        @returns BandedKernel or ndarray (either can be passed to deconvolve)
+        """
+        if x_axis is None:
+            log.debug("no x-axis")
+            return
+
+        resolution_per_unit = fwhm
+        if resolution_per_unit is None or resolution_per_unit == 0:
+            log.debug("can't apply Richardson-Lucy without estimated optical resolution in FWHM")
+            return
+
+        x_axis = np.asarray(x_axis, dtype=np.float64)
+        num_pixels = len(x_axis)
+        pixel_range = np.arange(num_pixels)
+
+        unit_per_pixel = np.diff(x_axis)
+        unit_per_pixel = np.insert(unit_per_pixel, 0, unit_per_pixel[0])
+        pixel_fwhm = resolution_per_unit / unit_per_pixel
+
+        pixel_sigma = pixel_fwhm / (2.0 * math.sqrt(2.0 * math.log(2.0)))
+        pixel_sigma *= downgrade
+        pixel_sigma_2 = pixel_sigma * pixel_sigma
+
+        if banded:
+            max_sigma = np.max(np.abs(pixel_sigma))
+            if np.isfinite(max_sigma):
+                half_width = max(1, int(math.ceil(self.GAUSSIAN_TRUNCATE_SIGMA * max_sigma)))
+                if 2 * half_width + 1 < num_pixels // 2:
+                    offsets = np.arange(-half_width, half_width + 1)
+                    band = np.exp(-0.5 * (offsets * offsets)[np.newaxis, :] / pixel_sigma_2[:, np.newaxis])
+
+                    # zero coefficients falling outside the matrix, then normalize each row
+                    columns = pixel_range[:, np.newaxis] + offsets[np.newaxis, :]
+                    band[(columns < 0) | (columns >= num_pixels)] = 0
+                    band /= band.sum(axis=1)[:, np.newaxis]
+                    return BandedKernel(band)
+
+        # resolution_h[row, col] = exp(-0.5 * (col - row)² / sigma²[row]), rows normalized
+        distance = (pixel_range[np.newaxis, :] - pixel_range[:, np.newaxis]).astype(np.float64)
+        np.multiply(distance, distance, out=distance)
+        distance *= -0.5
+        distance /= pixel_sigma_2[:, np.newaxis]
+        resolution_h = np.exp(distance, out=distance)
+        resolution_h /= resolution_h.sum(axis=1)[:, np.newaxis]
+
+        return resolution_h
+
+    def deconvolve(self, pr, resolution_h, iterations, pool=None):
+        """
+        Richardson-Lucy deconvolution, sharpening peaks back to their original
+        optical resolution by removing the Gaussian blur point-spread function.
+
+        @param pr (In/Out) ProcessedReading
+        @param resolution_h (Input) see generate_gaussian (BandedKernel or ndarray)
+        @note supports cropped ProcessedReading if available
+        @see https://en.wikipedia.org/wiki/Richardson%E2%80%93Lucy_deconvolution
+        """
+        if pool is None:
+            pool = self.pool
+
+        spectrum = pr.get_processed()
+        pixels = len(spectrum)
+
+        if isinstance(resolution_h, BandedKernel):
+            padded_len = pixels + 2 * resolution_h.half_width
+
+            def matmul(x, out, padded):
+                resolution_h.matvec(x, out=out, padded=padded)
+
+            def matmul_t(x, out, padded):
+                resolution_h.matvec(x, out=out, transpose=True, padded=padded)
+        else:
+            padded_len = 1
+            resolution_h_t = resolution_h.T
+
+            def matmul(x, out, padded):
+                np.matmul(resolution_h, x, out=out)
+
+            def matmul_t(x, out, padded):
+                np.matmul(resolution_h_t, x, out=out)
+
+        # iterate within recycled scratch buffers (set_processed stores a copy)
+        with pool.borrow(pixels, pixels, pixels, pixels, padded_len) as (orig, deconvolved, h_times_x, full_sum, padded):
+
+            # prepare to apply convolution
+            orig[:] = spectrum
+            deconvolved[:] = orig
+
+            # stay positive (and non-zero)! :-)
+            eps = 1e-5 # very small on 65K dynamic range
+            np.maximum(deconvolved, eps, out=deconvolved)
+
+            # apply convolution
+            for _ in range(iterations):
+                matmul(deconvolved, h_times_x, padded)
+                np.divide(orig, h_times_x, out=h_times_x) # y_over_h_times_x
+                matmul_t(h_times_x, full_sum, padded)
+                np.multiply(deconvolved, full_sum, out=deconvolved)
+                np.maximum(deconvolved, eps, out=deconvolved)
+
+            pr.set_processed(deconvolved)
+        pr.deconvolved = True
+
+    def smooth(self, spectrum, half_width, pool=None, method="boxcar", polyorder=2):
+        """ @returns smoothed copy of the spectrum, as a list (like wasatch.utils.apply_boxcar) """
+        if pool is None:
+            pool = self.pool
+        smoothed = self.smoothing.smooth_2d(np.reshape(spectrum, (1, -1)), half_width, method=method, pool=pool, polyorder=polyorder)
+        result = smoothed[0].tolist()
+        pool.release(smoothed)
+        return result
+
+    def boxcar(self, pr, half_width, recordable=True, pool=None, method="boxcar", polyorder=2):
+        """
+        Smooths the processed spectrum (and optionally the recordable dark and
+        reference) with SmoothingEngine. Arrays of equal length are stacked
+        and smoothed in a single pass.
+
+        @param pr (In/Out) ProcessedReading
+        @param recordable (Input) whether to also smooth recordable_dark and
+               recordable_reference (not done for reference-based techniques)
+        @param method (Input) see SmoothingEngine.METHODS
+        @note supports cropped ProcessedReading
+        """
+        if pr is None or half_width < 1:
+            return
+
+        if pool is None:
+            pool = self.pool
+
+        names = [ "processed" ]
+        arrays = [ pr.get_processed() ]
+        if recordable:
+            for name in [ "recordable_dark", "recordable_reference" ]:
+                a = getattr(pr, name)
+                if a is not None and len(a) == len(arrays[0]):
+                    names.append(name)
+                    arrays.append(a)
+
+        stacked = pool.acquire((len(arrays), len(arrays[0])))
+        for i, a in enumerate(arrays):
+            stacked[i] = a
+        smoothed = self.smoothing.smooth_2d(stacked, half_width, method=method, pool=pool, polyorder=polyorder)
+
+        for name, a in zip(names, smoothed):
+            if name == "processed":
+                pr.set_processed(a.tolist())
+            else:
+                setattr(pr, name, a.tolist())
+        pool.release(stacked, smoothed)
+
+        # recordables of a different length (shouldn't happen) are smoothed alone
+        if recordable:
+            for name in [ "recordable_dark", "recordable_reference" ]:
+                a = getattr(pr, name)
+                if a is not None and name not in names:
+                    setattr(pr, name, self.smooth(a, half_width, pool, method=method, polyorder=polyorder))
+
+    def generate_excitation(self, wavelengths, wavenumbers, settings):
+        if settings is not None:
+            excitation = settings.excitation()
+            if excitation is not None and excitation > 0:
+                return excitation
+        return generate_excitation(wavelengths=wavelengths, wavenumbers=wavenumbers)
+
+    def interpolate(self, pr, new_axis, use_wavenumbers=False, save=True):
+        """
+        Interpolates processed, raw, dark and reference onto the new x-axis
+        (in wavelengths, unless use_wavenumbers).
+
+        @param save (Input) if False, pr.interpolated is left unchanged
+        @returns interpolated ProcessedReading (None on error)
+        """
+        if pr is None or new_axis is None:
+            return
+        return self.interpolate_batch([ pr ], new_axis, use_wavenumbers=use_wavenumbers, save=save)[0]
+
+    def interpolate_batch(self, prs, new_axis, use_wavenumbers=False, save=True):
+        """
+        Interpolates each ProcessedReading as interpolate() would. All arrays
+        sharing an x-axis (e.g. raw, dark and reference of every Measurement
+        from one spectrometer) are interpolated together by one cached 
+        InterpolationOperator.
+
+        @returns list of interpolated ProcessedReadings (None on error)
+        """
+        results = [ None ] * len(prs)
+        if new_axis is None:
+            return results
+
+        # old axis bytes -> (old axis, [ (interpolated, attr, array) ])
+        groups = {}
+        keys = {} # id(axis) -> (axis, bytes), as the same axis is usually shared
+
+        def add(axis, interpolated, attr, array):
+            if id(axis) not in keys:
+                keys[id(axis)] = (axis, np.ascontiguousarray(axis, dtype=np.float64).tobytes())
+            key = keys[id(axis)][1]
+            if key not in groups:
+                groups[key] = (np.frombuffer(key, dtype=np.float64), [])
+            groups[key][1].append( (interpolated, attr, array) )
+
+        for i, pr in enumerate(prs):
+            if pr is None:
+                continue
+
+            old_interpolated = None
+            if pr.interpolated:
+                if not save:
+                    old_interpolated = pr.interpolated
+                log.debug("re-interpolating (deleting previous interpolation results)")
+                pr.interpolated = None
+
+            interpolated = self.plan_interpolation(pr, new_axis, use_wavenumbers, add)
+
+            if save:
+                pr.interpolated = interpolated
+            else:
+                pr.interpolated = old_interpolated
+            results[i] = interpolated
+
+        for axis, jobs in groups.values():
+            op = get_interpolation_operator(axis, new_axis)
+            stacked = np.empty((len(jobs), len(axis)))
+            for row, (_, _, array) in enumerate(jobs):
+                stacked[row] = array
+            for (interpolated, attr, _), values in zip(jobs, op.apply(stacked)):
+                setattr(interpolated, attr, values)
+
+        return results
+
+    def plan_interpolation(self, pr, new_axis, use_wavenumbers, add):
+        """
+        Generates the interpolated ProcessedReading's axes, and registers each
+        array to interpolate by calling add(old_axis, interpolated, attr, array).
+
+        @returns interpolated ProcessedReading (arrays not yet populated), or 
+                 None on error
+        """
+        wavelengths = pr.get_wavelengths(fast=True)
+        wavenumbers = pr.get_wavenumbers(fast=True)
+
+        interpolated = ProcessedReading()
+        old_cropped_axis = None
+        old_detector_axis = None
+
+        if not use_wavenumbers:
+            if wavelengths is None:
+                log.debug("Missing required wavelengths")
+                return
+
+            interpolated.wavelengths = new_axis
+            old_cropped_axis = wavelengths
+            old_detector_axis = pr.get_wavelengths("orig", fast=True)
+
+            # generate corresponding wavenumbers if we can
+            excitation = self.generate_excitation(wavelengths, wavenumbers, pr.settings)
+            if excitation:
+                interpolated.wavenumbers = generate_wavenumbers(excitation=excitation, wavelengths=interpolated.wavelengths)
+
+        else:
+            if wavenumbers is None:
+                log.debug("Missing required wavenumbers")
+                return
+
+            interpolated.wavenumbers = new_axis
+            old_cropped_axis = wavenumbers
+            old_detector_axis = pr.get_wavenumbers("orig", fast=True)
+
+            # generate corresponding wavelengths if we can
+            excitation = self.generate_excitation(wavelengths, wavenumbers, pr.settings)
+            if excitation is not None:
+                interpolated.wavelengths = generate_wavelengths_from_wavenumbers(excitation=excitation, wavenumbers=interpolated.wavenumbers)
+
+        if old_cropped_axis is None or old_detector_axis is None:
+            log.debug("Old axis was none, returning none.")
+            return
+
+        processed = pr.get_processed(fast=True)
+        if processed is not None:
+            add(old_cropped_axis, interpolated, "processed", processed)
+
+        # Note that we are choosing to interpolate raw. That means this is no longer
+        # really "raw". However, we're storing it in the ".interpolated" record of
+        # ProcessedReading, so that should be fairly clear; they can always access
+        # ProcessedReading.raw directly to get the original data.
+        for attr, array in [ ("raw", pr.get_raw(fast=True)), ("dark", pr.get_dark(fast=True)), ("reference", pr.get_reference(fast=True)) ]:
+            if array is None:
+                continue
+            if len(array) == len(old_detector_axis):
+                add(old_detector_axis, interpolated, attr, array)
+            else:
+                log.debug(f"interpolate: len(old_detector_axis) {len(old_detector_axis)} != len({attr}) ({len(array)})")
+
+        return interpolated
+
+    def match_library(self, pr, matcher, max_results=None):
+        """
+        Matches the (DALAI, if available) processed spectrum against a library,
+        storing the best match in the ProcessedReading (so it will be saved with
+        Measurement metadata).
+
+        @param matcher (Input) e.g. Pearson (with mixture enabled, the mixture
+               is also stored, as library_matching_mixture / _residual)
+        @returns tuple of (compounds, scores) in descending order of score, or
+                 (None, None) if nothing matched
+        """
+        compounds, scores, labels = self.get_library_match(pr, matcher, max_results)
+        self.label_library_match(pr, labels)
+        return compounds, scores
+
+    def get_library_match(self, pr, matcher, max_results=None):
+        """
+        As match_library, but leaves the ProcessedReading unchanged (so it can
+        be matched on another thread while it is in use).
+
+        @returns tuple of (compounds, scores, labels), where labels is the
+                 dict of ProcessedReading attributes for label_library_match
+        """
+        # which Reading was matched (results may be displayed, or copied to
+        # later ProcessedReadings, after newer Readings have arrived)
+        labels = { "library_matching_compound":         None,
+                   "library_matching_score":            None,
+                   "library_matching_engine":           None,
+                   "library_matching_mixture":          None,
+                   "library_matching_mixture_residual": None,
+                   "library_matching_session_count":    getattr(pr.reading, "session_count", None) }
+
+        if pr.has_dalai():
+            wavenumbers = pr.get_wavenumbers("dalai")
+            spectrum = pr.get_processed("dalai")
+        else:
+            wavenumbers = pr.get_wavenumbers()
+            spectrum = pr.get_processed()
+
+        compounds, scores = matcher.process(wavenumbers, spectrum)
+
+        # mixture analysis (if the matcher supports it) is recorded even if no
+        # single compound matched, as mixtures often won't
+        mixture = getattr(matcher, "mixture_result", None)
+        if mixture:
+            labels["library_matching_mixture"] = "; ".join(f"{m['Name'].split('|')[0].strip()} {m['Fraction'] * 100:.1f}%" for m in mixture)
+            labels["library_matching_mixture_residual"] = matcher.mixture_residual
+
+        if compounds is None or scores is None or len(compounds) == 0:
+            return None, None, labels
+
+        if max_results is not None and len(compounds) > max_results:
+            compounds = compounds[:max_results]
+            scores = scores[:max_results]
+
+        # if library compound names are pipe-delimited, trim to first sub-field
+        labels["library_matching_compound"] = compounds[0].split("|")[0].strip()
+        labels["library_matching_score"] = scores[0]
+        labels["library_matching_engine"] = matcher.NAME
+        return compounds, scores, labels
+
+    def label_library_match(self, pr, labels):
+        """ @param labels (Input) from get_library_match """
+        for attr, value in labels.items():
+            setattr(pr, attr, value)
+
+    # ##########################################################################
+    # Utility
+    # ##########################################################################
+
+    def generate_x_axis(self, settings, unit="px", cropped=False):
+        """
+        @param unit (Input) "px", "nm" or "cm"
+        @param cropped (Input) crop to the horizontal ROI (else chop into
+               detector regions, if configured)
+        @returns a new array (None if the unit isn't supported by the settings)
+        """
+        if   unit == "cm": retval = None if settings.wavenumbers is None else np.copy(settings.wavenumbers)
+        elif unit == "nm": retval = None if settings.wavelengths is None else np.copy(settings.wavelengths)
+        else:              retval = np.array(list(range(settings.pixels())), dtype=np.float32)
+
+        if retval is None:
+            log.debug(f"spectrometer has no {unit} axis")
+            return
+
+        if cropped:
+            return self.crop(retval, roi=settings.eeprom.get_horizontal_roi())
+
+        regions = settings.state.detector_regions
+        if regions:
+            log.debug("generate_x_axis: chopping into regions")
+            retval = regions.chop(retval, flatten=True, orig_roi=settings.eeprom.get_horizontal_roi()) # which region?
+
+        return retval
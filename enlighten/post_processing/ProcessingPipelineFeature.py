@@ -0,0 +1,146 @@
+import threading
+import logging
+
+from queue import Queue
+
+from enlighten import common
+from enlighten.EnlightenFeature import EnlightenFeature
+
+if common.use_pyside2():
+    from PySide2 import QtCore
+else:
+    from PySide6 import QtCore
+
+log = logging.getLogger(__name__)
+
+class ProcessingJob:
+    """ A Reading to be post-processed, and eventually its ProcessedReading. """
+    def __init__(self, reading, spec, settings, dark=None, ref=None):
+        self.reading  = reading
+        self.spec     = spec
+        self.settings = settings
+        self.dark     = dark
+        self.ref      = ref
+        self.pr       = None
+
+    def __repr__(self):
+        return f"ProcessingJob <device_id {self.spec.device_id}, session_count {self.reading.session_count}>"
+
+class ProcessingWorker(threading.Thread):
+    """
+    Runs Controller.post_process_reading on each ProcessingJob from the request
+    queue, in order, emitting each completed job back to the GUI thread. Exits
+    on a poison-pill (None).
+    """
+    def __init__(self, ctl, request_queue, signal):
+        threading.Thread.__init__(self)
+        self.ctl = ctl
+        self.request_queue = request_queue
+        self.signal = signal
+
+    def run(self):
+        log.debug("ProcessingWorker: running")
+        while True:
+            job = self.request_queue.get()
+            if job is None:
+                break
+
+            try:
+                job.pr = self.ctl.post_process_reading(job.reading, job.spec, job.settings, dark=job.dark, ref=job.ref)
+            except:
+                log.error(f"ProcessingWorker: exception processing {job}", exc_info=1)
+                job.pr = None
+
+            self.signal.finished.emit(job)
+        log.debug("ProcessingWorker: exiting")
+
+class ProcessingPipelineFeature(EnlightenFeature):
+    """
+    Optionally moves the post-processing half of Controller.process_reading
+    (dark correction, ROI, Raman intensity correction, baseline correction,
+    Richardson-Lucy, DALAI, boxcar, interpolation) off the GUI thread and onto
+    a single background worker.
+
+    Completed ProcessedReadings are handed back to the GUI thread via a Qt
+    signal, where Controller.render_processed_reading runs plugins, graphing,
+    library matching, TakeOne, BatchCollection and StatusBar updates.
+
+    A single worker thread with a FIFO queue is used, so Readings are rendered
+    in the order submitted (and therefore in order per-device). Plugins and
+    library matching remain on the GUI thread, as both interact directly with
+    widgets and (for plugins) their own request/response queues.
+
+    Reprocessed (loaded) measurements and AnalysisCapture are always processed
+    synchronously.
+
+    Currently this is configured through enlighten.ini (section
+    "ProcessingPipeline", key "threaded").
+    """
+
+    SECTION = "ProcessingPipeline"
+
+    class JobFinished(QtCore.QObject):
+        finished = QtCore.Signal(object)
+
+    def __init__(self, ctl):
+        super().__init__(ctl)
+
+        self.threaded = self.ctl.config.get_bool(self.SECTION, "threaded")
+
+        self.worker = None
+        self.request_queue = None
+        self.in_flight = 0
+
+        # created on the GUI thread, so queued connections will dispatch there
+        self.signal = self.JobFinished()
+        self.signal.finished.connect(self.finished_callback, QtCore.Qt.QueuedConnection)
+
+        log.debug(f"threaded post-processing {self.threaded}")
+
+    def stop(self):
+        if self.worker is not None:
+            log.debug("stopping ProcessingWorker")
+            self.request_queue.put(None)
+            self.worker = None
+
+    def set_threaded(self, flag):
+        self.threaded = bool(flag)
+        self.ctl.config.set(self.SECTION, "threaded", self.threaded)
+        if not self.threaded:
+            self.stop()
+
+    def submit(self, reading, spec, settings, dark=None, ref=None):
+        """
+        Called by Controller.process_reading on the GUI thread.
+
+        @returns True if the Reading was queued for background processing,
+                 False if the caller should process it synchronously
+        """
+        if not self.threaded or spec is None:
+            return False
+
+        if self.worker is None:
+            self.request_queue = Queue()
+            self.worker = ProcessingWorker(self.ctl, self.request_queue, self.signal)
+            self.worker.daemon = True
+            self.worker.start()
+
+        self.in_flight += 1
+        self.request_queue.put(ProcessingJob(reading, spec, settings, dark=dark, ref=ref))
+        return True
+
+    def finished_callback(self, job):
+        """ Receives completed ProcessingJobs on the GUI thread. """
+        self.in_flight -= 1
+
+        if self.ctl.shutting_down or job.pr is None:
+            return
+
+        # don't render Readings from spectrometers disconnected in the meantime
+        spec = job.spec
+        if self.ctl.multispec.get_spectrometer(spec.device_id) is not spec:
+            log.debug(f"finished_callback: dropping {job} from disconnected spectrometer")
+            return
+
+        self.ctl.render_processed_reading(job.pr, spec, job.settings)
+        self.ctl.cursor.update()
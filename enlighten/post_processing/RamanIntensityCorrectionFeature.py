@@ -245,16 +245,7 @@ class RamanIntensityCorrectionFeature(EnlightenFeature):
             self.ctl.marquee.error("Raman Intensity Correction cannot be applied AFTER interpolation")
             return
 
-        if pr.cropped is None:
-            # this shouldn't happen, but just in case
-            # log.debug(f"process: skipping because not cropped")
-            return
-
-        log.debug("applying SRM correction to ROI")
-        roi = spec.settings.eeprom.get_horizontal_roi()
-        for i in range(len(pr.cropped.processed)):
-            pr.cropped.processed[i] *= factors[i + roi.start]
-        pr.raman_intensity_corrected = True
+        self.ctl.processing_engine.correct_raman_intensity(pr, spec.settings)
 
     def set_enable_when_allowed(self, value):
         self.enable_when_allowed = value if isinstance(value, bool) else value.lower() == "true"
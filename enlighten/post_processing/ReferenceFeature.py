@@ -1,5 +1,4 @@
 import logging
-import numpy as np
 
 import pyqtgraph
 
@@ -116,7 +115,7 @@ class ReferenceFeature(EnlightenFeature):
         if pr is not None:
             spectrum = pr.recordable_reference
             if spectrum is not None:
-                app_state.reference = np.copy(spectrum)
+                app_state.set_reference(spectrum)
                 app_state.reference_timestamp = pr.reading.timestamp
                 app_state.reference_is_dark_corrected = pr.dark_corrected
                 app_state.reference_excitation = spec.settings.excitation()
@@ -138,7 +137,7 @@ class ReferenceFeature(EnlightenFeature):
         self.update_enable()
 
         if spec is None:
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             self.curve.active = False
             self.lb_timestamp.setText("")
             self.ctl.gui.colorize_button(self.button_toggle, False)
@@ -149,7 +148,7 @@ class ReferenceFeature(EnlightenFeature):
             self.lb_timestamp.setText(spec.app_state.reference_timestamp.strftime("%Y-%m-%d %H:%M:%S"))
             self.curve.active = True
         else:
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             self.lb_timestamp.setText("")
             self.curve.active = False
 
@@ -206,7 +205,7 @@ class ReferenceFeature(EnlightenFeature):
             self.ctl.marquee.error("loaded measurement does not have a reference spectrum")
             return
 
-        spec.app_state.reference = np.copy(pr.reference)
+        spec.app_state.set_reference(pr.reference)
         spec.app_state.reference_timestamp = m.timestamp
         self.ctl.marquee.info("reference loaded")
         self.display()
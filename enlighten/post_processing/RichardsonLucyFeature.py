@@ -1,8 +1,13 @@
+import os
+import hashlib
 import logging
 import numpy as np
-import math
 
+from collections import OrderedDict
+
+from enlighten import common
 from enlighten.util import unwrap
+from enlighten.post_processing.BandedKernel import BandedKernel
 from enlighten.EnlightenFeature import EnlightenFeature
 
 log = logging.getLogger(__name__)
@@ -12,9 +17,11 @@ log = logging.getLogger(__name__)
 # original optical resolution by removing the Gaussian blur point-spread function.
 #
 # @see https://en.wikipedia.org/wiki/Richardson%E2%80%93Lucy_deconvolution
+# @see ProcessingEngine.deconvolve
 class RichardsonLucyFeature(EnlightenFeature):
 
     SECTION = "RichardsonLucy"
+    CACHE_DIR = os.path.join(common.get_default_data_dir(), "cache", "richardson_lucy")
 
     ##
     # @param iterations how many Richardson-Lucy iterations to run
@@ -57,14 +64,13 @@ class RichardsonLucyFeature(EnlightenFeature):
         # ideal resolution.  Not sure what I was thinking here.
         self.ctl.graph.register_observer(self.change_axis_callback, "change_axis")
 
-        # If the user dis/enables or changes cropping, re-generate guassian.  
-        # (Alternative design would be to include ROI tuple in the cache key.)
-        self.ctl.horiz_roi.register_observer(self.reset)
-
     def update_from_config(self):
         # when are these actually set?
         self.iterations = self.ctl.config.get_int  (self.SECTION, "iterations", default=5)
         self.downgrade  = self.ctl.config.get_float(self.SECTION, "downgrade",  default=1.0)
+        self.banded     = self.ctl.config.get_bool (self.SECTION, "banded",     default=True)
+        self.cache_size = self.ctl.config.get_int  (self.SECTION, "cache_size", default=8)
+        self.persist    = self.ctl.config.get_bool (self.SECTION, "persist",    default=False)
 
     def update_from_gui(self):
         self.enabled = self.cb_enable.isChecked()
@@ -99,26 +105,7 @@ class RichardsonLucyFeature(EnlightenFeature):
         if resolution_h is None:
             return 
 
-        spectrum = pr.get_processed()
-
-        # prepare to apply convolution
-        orig = np.array(spectrum, dtype=np.double)
-        deconvolved = np.copy(orig)
-
-        # stay positive (and non-zero)! :-)
-        eps = 1e-5 # very small on 65K dynamic range
-        deconvolved[deconvolved < eps] = eps 
-
-        # apply convolution
-        for _ in range(self.iterations):
-            h_times_x = np.matmul(resolution_h, deconvolved)
-            y_over_h_times_x = orig / h_times_x
-            full_sum = np.matmul(np.transpose(resolution_h), y_over_h_times_x)
-            deconvolved = deconvolved * full_sum
-            deconvolved[deconvolved < eps] = eps 
-        
-        pr.set_processed(deconvolved)
-        pr.deconvolved = True
+        self.ctl.processing_engine.deconvolve(pr, resolution_h, self.iterations, spec.app_state.array_pool)
 
     ##
     # There are various ways we could decide what unit to use for average 
@@ -129,57 +116,94 @@ class RichardsonLucyFeature(EnlightenFeature):
     # -- regardless of whether the laser is engaged, or we're looking at 
     # an emission source (like we'd know) -- and wavelengths otherwise.
     def get_gaussian(self, spec):
+        if spec is None:
+            return
+
         unit = "cm" if spec.has_excitation() else "nm"
-        key = spec.label + unit
+        x_axis = self.ctl.generate_x_axis(spec=spec, unit=unit, cropped=True)
+        if x_axis is None:
+            log.debug("no x-axis")
+            return 
+
+        # check to see if we've already generated the Gaussian for these inputs
+        # (recently, or in a previous session if persisted)
+        key = self.get_cache_key(spec, unit, x_axis)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
 
-        # check to see if we've already generated the Gaussian for this 
-        # spectrometer in this unit
-        if key not in self.cache:
+        resolution_h = self.load(key)
+        if resolution_h is None:
             log.debug("generating Gaussian for key %s", key)
-            self.cache[key] = self.generate_gaussian(spec, unit)
+            resolution_h = self.ctl.processing_engine.generate_gaussian(x_axis, spec.fwhm, self.downgrade, banded=self.banded)
+            if resolution_h is not None:
+                self.save(key, resolution_h)
 
-        return self.cache[key]
+        self.cache[key] = resolution_h
+        while len(self.cache) > max(1, self.cache_size):
+            self.cache.popitem(last=False)
+
+        return resolution_h
+
+    ##
+    # The Gaussian depends only on the x-axis and the resolution, so key the 
+    # cache on those rather than the spectrometer. The x-axis is keyed by a 
+    # digest of the cropped axis actually used, so it reflects whatever went 
+    # into it (active wavecal, excitation, Raman shift correction, pixel count 
+    # and ROI cropping). Switching the ROI back and forth, or reconnecting a 
+    # unit, then finds the existing kernel.
+    def get_cache_key(self, spec, unit, x_axis):
+        x_axis = np.ascontiguousarray(x_axis, dtype=np.float64)
+        digest = hashlib.sha1(x_axis.tobytes()).hexdigest()
+        return (digest, 
+                len(x_axis), 
+                spec.fwhm, 
+                self.downgrade, 
+                unit, 
+                self.banded)
 
     ##
-    # Generating the Gaussian is somewhat intensive, so cache it.
-    # However, when an input to the Guassian changes (like the user
-    # has changed the ROI), flush so it will be regenerated.
+    # Generating the Gaussian is somewhat intensive, so cache it. Changed
+    # inputs give a new key, so this is only needed to release memory.
     def reset(self):
         log.debug("flushing cache")
-        self.cache = {}
+        self.cache = OrderedDict()
 
-    def generate_gaussian(self, spec, unit):
-        if spec is None:
-            return
+    # ##########################################################################
+    # Persistence
+    # ##########################################################################
 
-        x_axis = self.ctl.generate_x_axis(unit=unit, cropped=True)
-        if x_axis is None:
-            log.debug("no x-axis")
-            return 
+    def get_pathname(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.CACHE_DIR, f"{digest}.npz")
 
-        resolution_per_unit = spec.fwhm
-        if resolution_per_unit is None or resolution_per_unit == 0:
-            log.debug("can't apply Richardson-Lucy without estimated optical resolution in FWHM (%s)", unit)
+    def load(self, key):
+        if not self.persist:
             return
 
-        num_pixels = len(x_axis)
-        pixel_range = np.arange(num_pixels)
-
-        unit_per_pixel = np.diff(x_axis)
-        unit_per_pixel = np.insert(unit_per_pixel, 0, unit_per_pixel[0])
-        pixel_fwhm = resolution_per_unit / unit_per_pixel
+        pathname = self.get_pathname(key)
+        if not os.path.exists(pathname):
+            return
 
-        pixel_sigma = pixel_fwhm / (2.0 * math.sqrt(2.0 * math.log(2.0)))
-        pixel_sigma *= self.downgrade
-        pixel_sigma_2 = pixel_sigma * pixel_sigma
-        resolution_h = np.zeros((num_pixels, num_pixels))
+        try:
+            with np.load(pathname) as npz:
+                if "band" in npz:
+                    return BandedKernel(npz["band"])
+                return npz["dense"]
+        except:
+            log.error(f"unable to load cached Gaussian from {pathname}", exc_info=1)
 
-        for row in pixel_range:
-            tmp = (pixel_range - row).astype(np.double)
-            tmp = tmp * tmp
-            tmp *= -0.5 
-            tmp /= pixel_sigma_2[row]
-            resolution_spectrum = np.exp(tmp)
-            resolution_h[row] = resolution_spectrum / sum(resolution_spectrum)
+    def save(self, key, resolution_h):
+        if not self.persist:
+            return
 
-        return resolution_h
+        pathname = self.get_pathname(key)
+        try:
+            os.makedirs(self.CACHE_DIR, exist_ok=True)
+            if isinstance(resolution_h, BandedKernel):
+                np.savez(pathname, band=resolution_h.band)
+            else:
+                np.savez(pathname, dense=resolution_h)
+            log.debug(f"saved Gaussian to {pathname}")
+        except:
+            log.error(f"unable to save Gaussian to {pathname}", exc_info=1)
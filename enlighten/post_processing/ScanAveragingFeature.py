@@ -1,5 +1,7 @@
 import logging
+import numpy as np
 
+from enlighten.post_processing.AveragingEngine import AveragingEngine
 from enlighten.util import incr_spinbox, decr_spinbox, unwrap
 from enlighten.ui.ScrollStealFilter import ScrollStealFilter
 from enlighten.EnlightenFeature import EnlightenFeature
@@ -7,9 +9,39 @@ from enlighten.EnlightenFeature import EnlightenFeature
 log = logging.getLogger(__name__)
 
 class ScanAveragingFeature(EnlightenFeature):
+    """
+    By default, scan averaging is performed by Wasatch.PY, which sends every
+    individual Reading upstream but only flags every Nth as averaged; the
+    partial Readings are only used to update the "Collected X of N" label.
+
+    Alternately, averaging can be performed in ENLIGHTEN by AveragingEngine
+    (enlighten.ini section "ScanAveraging", key "mode" = rolling or 
+    exponential; default driver). The driver is then told not to average, and
+    every Reading is replaced by the rolling (or exponentially-weighted) 
+    average of the last N, so the graph refreshes each integration. The 
+    per-pixel noise (standard error) of the average is attached to the 
+    ProcessedReading (.noise, in raw counts over the full detector), and the
+    label shows the SNR at the strongest pixel.
+
+    In software mode N is kept in SpectrometerApplicationState.scans_to_average,
+    as SpectrometerState.scans_to_average is shared with (and read by) the 
+    driver, and so must be 1.
+
+    TakeOneRequests (e.g. BatchCollection, AutoRaman) are still averaged 
+    atomically by the driver.
+    """
+
+    SECTION = "ScanAveraging"
+    MODES = [ "driver" ] + AveragingEngine.MODES
+
     def __init__(self, ctl):
         super().__init__(ctl)
 
+        self.mode = self.ctl.config.get(self.SECTION, "mode", default="driver")
+        if self.mode not in self.MODES:
+            log.error(f"unknown scan averaging mode {self.mode} (using driver)")
+            self.mode = "driver"
+
         cfu = ctl.form.ui
 
         self.bt_dn      = cfu.pushButton_scan_averaging_dn
@@ -47,7 +79,7 @@ class ScanAveragingFeature(EnlightenFeature):
         if spec is None:
             return
 
-        self.set_scans_to_average(spec.settings.state.scans_to_average)
+        self.set_scans_to_average(self.get_scans_to_average(spec))
 
     def complete_registrations(self):
         self.ctl.vcr_controls.register_observer(self.reset, "pause")
@@ -58,6 +90,9 @@ class ScanAveragingFeature(EnlightenFeature):
         self.show_label(False)
         self.ctl.multispec.change_device_setting("reset_scan_averaging", True)
 
+        for spec in self.ctl.multispec.get_spectrometers():
+            spec.app_state.averaging_engine.reset()
+
     def set_locked(self, flag):
         for w in [ self.bt_dn,
                    self.bt_up,
@@ -66,12 +101,21 @@ class ScanAveragingFeature(EnlightenFeature):
 
     def update_from_gui(self):
         value = int(self.spinbox.value())
-        self.ctl.multispec.set_state("scans_to_average", value)
+
+        # in software mode, the driver mustn't average at all
+        driver_value = value
+        if self.is_software():
+            self.ctl.multispec.set_app_state("scans_to_average", value)
+            driver_value = 1
+
+        # SpectrometerState is shared with the driver (WasatchDevice reads 
+        # scans_to_average from it directly; other drivers set it themselves)
+        self.ctl.multispec.set_state("scans_to_average", driver_value)
 
         # note: ORDER MATTERS in these two, because they BOTH will set SpectrometerState.scans_to_average
         log.debug("MZ: kludge, disabling onboard scan averaging")
         # self.ctl.multispec.change_device_setting("onboard_scans_to_average", 1)
-        self.ctl.multispec.change_device_setting("scans_to_average", value)
+        self.ctl.multispec.change_device_setting("scans_to_average", driver_value)
 
         spec = self.ctl.multispec.current_spectrometer()
         if spec:
@@ -117,6 +161,10 @@ class ScanAveragingFeature(EnlightenFeature):
             self.label.setVisible(False)
             return
 
+        # software averaging labels itself (see process)
+        if self.is_software():
+            return
+
         # update label
         count = max(1, min(count, spec.settings.state.scans_to_average))
 
@@ -138,7 +186,65 @@ class ScanAveragingFeature(EnlightenFeature):
             spec = self.ctl.multispec.current_spectrometer()
         if spec is None:
             return False
-        return spec.settings.state.scans_to_average > 1
+        return self.get_scans_to_average(spec) > 1
+
+    def is_software(self):
+        """ whether averaging is performed by ENLIGHTEN rather than the driver """
+        return self.mode != "driver"
+
+    def is_partial(self, spec, reading):
+        """ whether the Reading is an incomplete driver-side average (not to be graphed) """
+        return self.enabled(spec) and not self.is_software() and not reading.averaged
+
+    def process(self, reading, spec):
+        """
+        Called by Controller.process_reading for live Readings. In software 
+        mode, replaces the spectrum of the Reading with the average of the last
+        N (attaching .noise), and updates the label with the count and SNR.
+
+        @returns the Reading
+        """
+        if not self.is_software() or spec is None or reading is None or reading.spectrum is None:
+            return reading
+
+        # TakeOneRequests are averaged atomically by the driver (every other
+        # Reading is flagged averaged when the driver isn't averaging, so 
+        # Reading.averaged can't be used to tell)
+        if reading.take_one_request is not None:
+            return reading
+
+        n = self.get_scans_to_average(spec)
+        if n <= 1:
+            return reading
+
+        mean, noise, count = spec.app_state.averaging_engine.add(reading.spectrum, n, mode=self.mode)
+        reading.spectrum = mean
+        reading.averaged = True
+        reading.sum_count = count
+        reading.noise = noise
+
+        if self.ctl.multispec.is_selected(spec.device_id):
+            self.update_software_label(spec, mean, noise, count, n)
+        return reading
+
+    def update_software_label(self, spec, mean, noise, count, n):
+        # SNR of the (dark-corrected, if possible) strongest pixel
+        signal = mean
+        dark = spec.app_state.dark
+        if dark is not None and len(dark) == len(mean):
+            signal = mean - dark
+        pixel = int(np.argmax(signal))
+        snr = signal[pixel] / noise[pixel] if noise[pixel] > 0 else 0
+
+        if self.mode == "rolling":
+            text = f"Averaged {count} of {n}"
+        else:
+            text = f"Exponential {n}"
+        if count > 1:
+            text += f" (SNR {snr:.0f})"
+
+        self.label.setText(text)
+        self.label.setVisible(True)
 
     def set_scans_to_average(self, value):
         value = int(round(float(value)))
@@ -153,8 +259,11 @@ class ScanAveragingFeature(EnlightenFeature):
         self.update_from_gui()
 
     def get_scans_to_average(self, spec=None):
+        """ @returns N (in software mode, as requested, rather than the driver's 1) """
         if spec is None:
             spec = self.ctl.multispec.current_spectrometer()
         if spec is None:
             return 1
+        if self.is_software() and spec.app_state.scans_to_average is not None:
+            return int(spec.app_state.scans_to_average)
         return int(spec.settings.state.scans_to_average)
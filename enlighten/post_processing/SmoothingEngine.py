@@ -0,0 +1,158 @@
+import logging
+import numpy as np
+
+from functools import lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
+
+log = logging.getLogger(__name__)
+
+@lru_cache(maxsize=32)
+def _boxcar_indices(pixels, half_width):
+    """ @returns (lo, hi, width) of each pixel's window into the cumulative sum """
+    i = np.arange(pixels)
+    hw = np.minimum(np.minimum(i, half_width), pixels - 1 - i)
+    lo, hi, width = i - hw, i + hw + 1, (2 * hw + 1).astype(np.float64)
+    for a in (lo, hi, width):
+        a.flags.writeable = False
+    return lo, hi, width
+
+def apply_boxcar_2d(spectra, half_width, pool=None):
+    """
+    Vectorized equivalent of wasatch.utils.apply_boxcar, applied to each row of
+    a 2D array (including the narrower windows near the edges).
+
+    @param spectra (Input) 2D array (count, pixels)
+    @param pool (Input) optional ArrayPool providing scratch buffers
+    @returns 2D array of smoothed spectra (from the pool, if provided, in which
+             case the caller should release it when done)
+    """
+    spectra = np.asarray(spectra, dtype=np.float64)
+    count, pixels = spectra.shape
+    lo, hi, width = _boxcar_indices(pixels, half_width)
+
+    if pool is None:
+        cumsum, tmp, out = np.empty((count, pixels + 1)), np.empty((count, pixels)), np.empty((count, pixels))
+    else:
+        cumsum, tmp, out = pool.acquire((count, pixels + 1)), pool.acquire((count, pixels)), pool.acquire((count, pixels))
+
+    cumsum[:, 0] = 0
+    np.cumsum(spectra, axis=1, out=cumsum[:, 1:])
+
+    np.take(cumsum, hi, axis=1, out=out)
+    np.take(cumsum, lo, axis=1, out=tmp)
+    np.subtract(out, tmp, out=out)
+    np.divide(out, width, out=out)
+
+    if pool is not None:
+        pool.release(cumsum, tmp)
+    return out
+
+@lru_cache(maxsize=32)
+def _savitzky_golay_kernel(half_width, polyorder):
+    """
+    @returns (center, left, right) where center is the convolution kernel for
+             interior pixels, and left/right are the (half_width, window)
+             matrices evaluating the polynomial fit to the first/last window
+             at the edge pixels (like scipy.signal.savgol_filter's default
+             mode="interp")
+    """
+    window = 2 * half_width + 1
+    polyorder = min(polyorder, window - 1)
+
+    # least-squares polynomial fit to a window is linear in y: coeffs = pinv(V) @ y
+    t = np.arange(window, dtype=np.float64)
+    vander = np.vander(t, polyorder + 1)
+    fit = vander @ np.linalg.pinv(vander) # (window, window): smoothed window = fit @ y
+
+    center = fit[half_width].copy()
+    left = fit[:half_width].copy()
+    right = fit[-half_width:].copy()
+    for a in (center, left, right):
+        a.flags.writeable = False
+    return center, left, right
+
+@lru_cache(maxsize=32)
+def _gaussian_kernel(pixels, half_width):
+    """
+    @returns (kernel, norm) where kernel spans +/- 3 sigma over the window, and
+             norm is the reciprocal of the kernel weight falling within the
+             spectrum at each pixel (so edges are renormalized, like boxcar's
+             narrower edge windows)
+    """
+    sigma = half_width / 3.0
+    offsets = np.arange(-half_width, half_width + 1, dtype=np.float64)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    weight = np.convolve(np.ones(pixels), kernel, mode="same")
+    norm = 1.0 / weight
+    for a in (kernel, norm):
+        a.flags.writeable = False
+    return kernel, norm
+
+class SmoothingEngine:
+    """
+    Smooths each row of a 2D array of spectra, so that every spectrum of a
+    given length (processed, recordable dark and recordable reference of one
+    ProcessedReading, or several Readings at once) is filtered in one pass.
+
+    Methods:
+
+    - boxcar: moving average via a single cumulative sum (apply_boxcar_2d),
+      matching wasatch.utils.apply_boxcar
+    - savitzky_golay: local polynomial fit (preserves peak height), matching
+      scipy.signal.savgol_filter(window_length=2*half_width+1, polyorder)
+    - gaussian: Gaussian-weighted moving average over +/- 3 sigma = half_width
+
+    Kernels are cached per half-width (and pixel count, where edge weights
+    depend on it). Savitzky-Golay and Gaussian are O(pixels * half_width) per
+    spectrum.
+    """
+
+    METHODS = [ "boxcar", "savitzky_golay", "gaussian" ]
+
+    def smooth_2d(self, spectra, half_width, method="boxcar", pool=None, polyorder=2):
+        """
+        @param spectra (Input) 2D array (count, pixels)
+        @param pool (Input) optional ArrayPool providing scratch buffers
+        @returns 2D array of smoothed spectra (from the pool, if provided, in
+                 which case the caller should release it when done)
+        """
+        spectra = np.asarray(spectra, dtype=np.float64)
+        count, pixels = spectra.shape
+
+        if method == "boxcar" or method is None:
+            return apply_boxcar_2d(spectra, half_width, pool)
+
+        if method not in self.METHODS:
+            raise ValueError(f"unknown smoothing method {method}")
+
+        # clamp so the window fits within the spectrum
+        half_width = min(half_width, (pixels - 1) // 2)
+        out = np.empty((count, pixels)) if pool is None else pool.acquire((count, pixels))
+        if half_width < 1:
+            out[:] = spectra
+            return out
+
+        if method == "savitzky_golay":
+            center, left, right = _savitzky_golay_kernel(half_width, polyorder)
+            windows = sliding_window_view(spectra, 2 * half_width + 1, axis=1)
+            np.matmul(windows, center, out=out[:, half_width:pixels - half_width])
+            np.matmul(spectra[:, :2 * half_width + 1], left.T, out=out[:, :half_width])
+            np.matmul(spectra[:, -(2 * half_width + 1):], right.T, out=out[:, pixels - half_width:])
+        else:
+            kernel, norm = _gaussian_kernel(pixels, half_width)
+            if pool is None:
+                padded = np.zeros((count, pixels + 2 * half_width))
+            else:
+                padded = pool.acquire((count, pixels + 2 * half_width))
+                padded[:, :half_width] = 0
+                padded[:, pixels + half_width:] = 0
+            padded[:, half_width:pixels + half_width] = spectra
+            windows = sliding_window_view(padded, 2 * half_width + 1, axis=1)
+            np.matmul(windows, kernel[::-1], out=out)
+            np.multiply(out, norm, out=out)
+            if pool is not None:
+                pool.release(padded)
+
+        return out
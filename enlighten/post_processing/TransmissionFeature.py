@@ -5,8 +5,6 @@ from enlighten.EnlightenFeature import EnlightenFeature
 
 log = logging.getLogger(__name__)
 
-##
-# @todo redo process() math with numpy
 class TransmissionFeature(EnlightenFeature):
     
     def __init__(self, ctl):
@@ -27,59 +25,20 @@ class TransmissionFeature(EnlightenFeature):
     # (if no dark is available, just use sample / reference)
     #
     # @returns True if ProcessedReading.processed successfully updated
+    # @see ProcessingEngine.transmission
     def process(self, processed_reading, settings, app_state):
-        pr = processed_reading
-
-        if pr.dark is None:
-            self.ctl.marquee.error("Please take dark")
-            return False
-
-        ref = pr.reference
-        if ref is None:
-            self.ctl.marquee.error("Please take reference")
-            return False
-
-        # dark-correct reference if not already done
-        if not app_state.reference_is_dark_corrected:
-            ref = ref.copy()
-            ref -= pr.dark
-
-        sample = pr.get_processed()
-        if sample is None:
-            log.error("can't compute transmission without a sample")
-            return False
-
-        if pr.is_cropped() and settings is not None:
-            roi = settings.eeprom.get_horizontal_roi()
-            ref = self.ctl.horiz_roi.crop(ref, roi=roi)
-
-        if len(ref) != len(sample):
-            self.ctl.marquee.error("reference and sample must be same size")
-            return False
-
-        transmission = []
-        has_neg = False
-        for i in range(len(sample)):
-            value = 0
-            if ref[i] != 0:
-                try:
-                    value = 100.0 * float(sample[i]) / float(ref[i])
-                except:
-                    log.debug(f"error computing transmission at pixel {i} (sample len {len(sample)}, orig ref len {len(pr.reference)})")
-                    pass
-            if self.max_enabled:
-                value = min(value, self.max_perc)
-            transmission.append(value)
-
-            if value < 0:
-                has_neg = True
-
-        if has_neg:
-            self.ctl.marquee.error("measurement out-of-range")
-
-        pr.set_processed(transmission)
-        log.debug("trans = %s", transmission[0:5])
-        return True
+        ok, msg = self.ctl.processing_engine.transmission(
+            processed_reading, 
+            settings, 
+            reference_is_dark_corrected = app_state.reference_is_dark_corrected,
+            max_perc                    = self.get_max_perc())
+        if msg:
+            self.ctl.marquee.error(msg)
+        return ok
+
+    def get_max_perc(self):
+        """ @returns the configured transmission limit (None if not clamping) """
+        return self.max_perc if self.max_enabled else None
 
     def update_from_gui(self):
         self.max_enabled = self.cb_max_enable.isChecked()
@@ -268,7 +268,7 @@ class CursorFeature(EnlightenFeature):
         curve = spec.curve
         xp = self.cursor.getXPos()
 
-        x_axis = curve.getData()[0]
+        x_axis = self.ctl.graph.get_data(curve)[0]
         if x_axis is None:
             return None
 
@@ -285,8 +285,7 @@ class CursorFeature(EnlightenFeature):
         curve = spec.curve
         xp = self.cursor.getXPos()
 
-        x_axis = curve.getData()[0]
-        spectrum = curve.getData()[-1] 
+        (x_axis, spectrum) = self.ctl.graph.get_data(curve)
         if x_axis is None or spectrum is None:
             return None, None
 
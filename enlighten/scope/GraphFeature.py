@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 
 import pyqtgraph
 
@@ -411,13 +412,14 @@ class GraphFeature(EnlightenFeature):
             log.debug(f"making pen for {name}")
             pen = self.ctl.gui.make_pen(widget=name)
 
-        # pyqtgraph.PlotWidget.plot() returns a PlotDataItem
+        # pyqtgraph.PlotWidget.plot() returns a PlotDataItem (data is drawn 
+        # through RenderSchedulerFeature)
         if in_legend:
-            curve = self.plot.plot(y=y, x=x, pen=pen, name=name)
+            curve = self.plot.plot(pen=pen, name=name)
         else:
-            curve = self.plot.plot(y=y, x=x, pen=pen)
+            curve = self.plot.plot(pen=pen)
 
-        self.update_curve_marker(curve)
+        self.set_data(curve=curve, y=y, x=x)
         log.debug("add_curve: added a %s (%s)", type(curve), str(curve))
 
         # if this new curve is tied to a live Spectrometer or a captured Measurement, 
@@ -467,9 +469,31 @@ class GraphFeature(EnlightenFeature):
 
     ##
     # @see http://www.pyqtgraph.org/documentation/graphicsItems/plotdataitem.html
+    # @see RenderSchedulerFeature
     def set_data(self, curve, y=None, x=None, label=None):
         self.update_curve_marker(curve)
-        curve.setData(y=y, x=x)
+        if self.ctl.render_scheduler:
+            self.ctl.render_scheduler.set_data(curve, y=y, x=x)
+        else:
+            curve.setData(y=y, x=x)
+
+    def get_data(self, curve):
+        """
+        @returns tuple of (x, y) at full resolution (curve.getData() may have
+                 been decimated for display by RenderSchedulerFeature)
+        """
+        full_data = getattr(curve, "full_data", None)
+        if full_data is None:
+            return curve.getData()
+
+        (x, y) = full_data
+        if y is None:
+            return None, None
+
+        # match PlotDataItem.getData
+        y = np.asarray(y)
+        x = np.arange(len(y)) if x is None else np.asarray(x)
+        return x, y
 
     def invert_x_axis(self):
         self.inverted = not self.inverted
@@ -491,7 +515,7 @@ class GraphFeature(EnlightenFeature):
                 curve = spec.curve
                 if curve is None:
                     continue
-                (xData, yData) = curve.getData()
+                (xData, yData) = self.get_data(curve)
                 xData = self.ctl.generate_x_axis(spec=spec)
                 if xData is not None and yData is not None:
                     if len(yData) < len(xData) and self.ctl.horiz_roi:
@@ -514,7 +538,7 @@ class GraphFeature(EnlightenFeature):
                 measurement_id = getattr(curve, "measurement_id")
                 log.debug("curve %s is from measurement %s", name, measurement_id)
 
-                (xData, yData) = curve.getData()
+                (xData, yData) = self.get_data(curve)
                 if yData is None:
                     continue
 
@@ -554,7 +578,7 @@ class GraphFeature(EnlightenFeature):
 
             # iterate over every curve on the graph
             for curve in self.plot.listDataItems():
-                spectrum = curve.getData()[-1]
+                spectrum = self.get_data(curve)[-1]
                 if spectrum is not None:
                     if len(spectrum) == len(x_axis):
                         spectra.append(spectrum)
@@ -566,7 +590,7 @@ class GraphFeature(EnlightenFeature):
             # multiple spectrometers, so x-axis and lengths can vary
             spectra = []
             for curve in self.plot.listDataItems():
-                data = curve.getData()
+                data = self.get_data(curve)
                 x = data[0]
                 y = data[-1]
                 spectra.append(x)
@@ -309,13 +309,13 @@ class RamanShiftCorrectionFeature(EnlightenFeature):
 
         if self.compound_name is None:
             log.debug("no compound_name")
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             return
 
         compound = self.astm_compounds[self.compound_name]
         if len(compound.peaks) < 1:
             log.debug("no peaks")
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             return
 
         ########################################################################
@@ -325,13 +325,13 @@ class RamanShiftCorrectionFeature(EnlightenFeature):
         spec = self.ctl.multispec.current_spectrometer()
         if spec is None:
             log.debug("no spec")
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             return
 
         pr = spec.app_state.processed_reading
         if pr is None:
             log.debug("no pr")
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             return
             
         spectrum = pr.get_processed()
@@ -342,7 +342,7 @@ class RamanShiftCorrectionFeature(EnlightenFeature):
         # log.debug("min = %d, max = %d", min_intensity, max_intensity)
 
         if len(compound.peaks) == 0:
-            self.curve.setData([])
+            self.ctl.graph.set_data(self.curve, y=[])
             return
 
         # relative intensity of 5 should match top of last spectrum
@@ -400,7 +400,7 @@ class RamanShiftCorrectionFeature(EnlightenFeature):
         x.append(x_max_cm)
         y.append(BASE)
 
-        self.curve.setData(x, y)
+        self.ctl.graph.set_data(self.curve, y=y, x=x)
 
     # ##########################################################################
     # Calibration
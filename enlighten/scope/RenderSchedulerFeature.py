@@ -0,0 +1,190 @@
+import time
+import logging
+import numpy as np
+
+from enlighten import common
+from enlighten.EnlightenFeature import EnlightenFeature
+
+if common.use_pyside2():
+    from PySide2 import QtCore, QtGui
+else:
+    from PySide6 import QtCore, QtGui
+
+log = logging.getLogger(__name__)
+
+def decimate_min_max(x, y, bins):
+    """
+    Peak-preserving decimation: splits the curve into (at most) the given
+    number of bins, and represents each by its minimum and maximum (2 points
+    per bin, at the bin's first and last x). Both the x-extent and y-extent of
+    the curve are preserved exactly, so autoranging isn't affected.
+
+    @returns tuple of (x, y) (the originals if already small enough)
+    """
+    y = np.asarray(y, dtype=np.float64)
+    count = len(y)
+    if bins < 1 or count <= 2 * bins:
+        return x, y
+
+    x = np.asarray(x, dtype=np.float64) if x is not None else np.arange(count, dtype=np.float64)
+
+    starts = np.linspace(0, count, bins, endpoint=False).astype(np.intp)
+    ends = np.append(starts[1:], count) - 1
+
+    out_x = np.empty(2 * bins)
+    out_y = np.empty(2 * bins)
+    out_x[0::2] = x[starts]
+    out_x[1::2] = x[ends]
+    out_y[0::2] = np.minimum.reduceat(y, starts)
+    out_y[1::2] = np.maximum.reduceat(y, starts)
+    return out_x, out_y
+
+class RenderSchedulerFeature(EnlightenFeature):
+    """
+    Coalesces graph updates to the display refresh rate, and decimates each
+    curve to the on-screen width of its plot before passing it to pyqtgraph.
+
+    Detectors (e.g. 4096-pixel InGaAs) have far more pixels than the plot has
+    horizontal screen pixels, and with many overlaid traces, repainting them at
+    full resolution dominates CPU. GraphFeature.set_data therefore queues the
+    new data here; each curve is redrawn at most once per frame, with only the
+    latest data queued for it.
+
+    Decimation keeps the minimum and maximum of each bin ("peak-preserving"),
+    so narrow Raman peaks remain visible. Zooming in increases the number of
+    bins (curves are redrawn from full-resolution data when the visible x-range
+    changes). Decimation is skipped while point markers are shown.
+
+    The full-resolution data is retained on the curve (curve.full_data), and
+    should be read via GraphFeature.get_data rather than curve.getData.
+
+    Drawing a spectrometer's curve (decimation and setData) is recorded as
+    its "graphing" stage by StageTimingFeature; Controller.process_reading
+    only times queuing the data ("render queue").
+
+    Configuration (section "RenderScheduler"): enabled (default True),
+    decimate (default True), fps (default 0 = screen refresh rate).
+    """
+
+    SECTION = "RenderScheduler"
+    DEFAULT_FPS = 60
+    MAX_ZOOM = 64 # limit bins when zoomed far into a curve
+
+    def __init__(self, ctl):
+        super().__init__(ctl)
+
+        self.enabled  = self.ctl.config.get_bool(self.SECTION, "enabled",  default=True)
+        self.decimate = self.ctl.config.get_bool(self.SECTION, "decimate", default=True)
+        self.fps      = self.ctl.config.get_int (self.SECTION, "fps",      default=0)
+
+        self.pending = {} # id(curve) -> (curve, forced)
+        self.view_boxes = set() # id(ViewBox) with range callbacks connected
+
+        self.rendered_frames = 0
+        self.coalesced_updates = 0 # updates replaced by newer data before being drawn
+
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.tick)
+
+    def stop(self):
+        self.timer.stop()
+
+    def get_interval_ms(self):
+        fps = self.fps
+        if fps <= 0:
+            screen = QtGui.QGuiApplication.primaryScreen()
+            fps = screen.refreshRate() if screen else 0
+        if fps <= 0:
+            fps = self.DEFAULT_FPS
+        return max(1, int(1000 / fps))
+
+    def set_data(self, curve, y=None, x=None):
+        """ Called by GraphFeature.set_data (GUI thread). """
+        curve.full_data = (x, y)
+
+        # draw disabled updates and clears immediately (dropping any stale
+        # data still queued for the curve)
+        if not self.enabled or y is None or len(y) == 0:
+            self.pending.pop(id(curve), None)
+            self.render(curve, force=True)
+            return
+
+        if id(curve) in self.pending:
+            self.coalesced_updates += 1
+        self.pending[id(curve)] = (curve, True)
+
+        if not self.timer.isActive():
+            self.timer.start(self.get_interval_ms())
+
+    def refresh(self, view_box):
+        """ redraw curves in the ViewBox at the resolution of its new x-range """
+        for item in view_box.addedItems:
+            if getattr(item, "full_data", None) is not None and id(item) not in self.pending:
+                self.pending[id(item)] = (item, False)
+
+        if self.pending and not self.timer.isActive():
+            self.timer.start(self.get_interval_ms())
+
+    def tick(self):
+        pending, self.pending = self.pending, {}
+        for curve, forced in pending.values():
+            try:
+                self.render(curve, force=forced)
+            except:
+                log.error(f"error rendering curve {curve}", exc_info=1)
+        self.rendered_frames += 1
+
+    def render(self, curve, force=True):
+        start = time.perf_counter()
+        x, y = curve.full_data
+
+        bins = self.get_bins(curve, x, y)
+        if not force and bins == getattr(curve, "rendered_bins", None):
+            return
+        curve.rendered_bins = bins
+
+        if bins:
+            x, y = decimate_min_max(x, y, bins)
+        curve.setData(y=y, x=x)
+
+        # spectrometer curves (see GraphFeature.add_curve)
+        device_id = getattr(curve, "device_id", None)
+        stage_timing = self.ctl.stage_timing
+        if device_id is not None and stage_timing and stage_timing.enabled:
+            stage_timing.record(device_id, "graphing", time.perf_counter() - start)
+
+    def get_bins(self, curve, x, y):
+        """ @returns how many bins to decimate the curve into (0 for none) """
+        if not self.decimate or y is None or len(y) == 0:
+            return 0
+
+        if self.ctl.graph and self.ctl.graph.show_marker:
+            return 0
+
+        view_box = curve.getViewBox()
+        if view_box is None:
+            return 0
+        self.connect_view_box(view_box)
+
+        width = int(view_box.width())
+        if width <= 0:
+            return 0
+
+        # increase resolution when zoomed into the curve
+        zoom = 1.0
+        if x is not None and len(x) > 1:
+            (lo, hi) = view_box.viewRange()[0]
+            visible = abs(hi - lo)
+            span = abs(x[-1] - x[0])
+            if visible > 0 and span > visible:
+                zoom = min(span / visible, self.MAX_ZOOM)
+
+        return int(width * zoom)
+
+    def connect_view_box(self, view_box):
+        if id(view_box) in self.view_boxes:
+            return
+        self.view_boxes.add(id(view_box))
+        view_box.sigXRangeChanged.connect(lambda vb, _range: self.refresh(vb))
+        view_box.sigResized.connect(self.refresh)
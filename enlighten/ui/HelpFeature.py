@@ -75,6 +75,7 @@ class HelpFeature(EnlightenFeature):
             Ctrl-T enter integration Time
             Ctrl-X toggle eXpert mode
 
+            Ctrl-Shift-A toggle Analysis capture
             Ctrl-Shift-D toggle DALAI-RAMAN
             Ctrl-Shift-S export all Saved measurements
 
@@ -47,7 +47,9 @@ class StatusBarFeature(EnlightenFeature):
                       [ "Laser Temperature",    cfu.label_StatusBar_laser_temp_name,    cfu.label_StatusBar_laser_temp_value ],
                       [ "Cursor Intensity",     cfu.label_StatusBar_cursor_name,        cfu.label_StatusBar_cursor_value ],
                       [ "Spectrum Count",       cfu.label_StatusBar_count_name,         cfu.label_StatusBar_count_value ],
-                      [ "Battery",              cfu.label_StatusBar_battery_name,       cfu.label_StatusBar_battery_value ] ]:
+                      [ "Battery",              cfu.label_StatusBar_battery_name,       cfu.label_StatusBar_battery_value ],
+                      [ "Queue Depth",          cfu.label_StatusBar_queue_name,         cfu.label_StatusBar_queue_value ],
+                      [ "Dropped",              cfu.label_StatusBar_dropped_name,       cfu.label_StatusBar_dropped_value ] ]:
             (name, label, value) = trio
             self.menu_order.append(name)
             self.widgets[name] = (label, value)
@@ -151,6 +153,12 @@ class StatusBarFeature(EnlightenFeature):
             return
 
         self.set("Spectrum Count", pr.reading.session_count)
+
+        # backpressure counters (see AcquisitionFeature)
+        spec = self.ctl.multispec.get_spectrometer(pr.device_id)
+        if spec is not None:
+            self.set("Queue Depth", spec.app_state.queue_depth)
+            self.set("Dropped", spec.app_state.dropped_reading_count)
         spectrum = pr.get_processed()
 
         if spectrum is not None:
@@ -3,7 +3,10 @@ import pytest
 import logging
 
 import scripts.Enlighten as enlighten
+from wasatch.Reading import Reading
+from wasatch.DeviceID import DeviceID
 from wasatch.MockUSBDevice import MockUSBDevice
+from wasatch.WasatchDevice import WasatchDevice
 
 # The fixture MUST go in this file
 # conftest.py provides shared resources to each test file
@@ -50,6 +53,23 @@ def create_sim_spec(app,name,eeprom,eeprom_overrides=None,spectra_option=None):
     app.controller.attempt_reading(spec_obj)
     return res
 
+# for tests which don't launch ENLIGHTEN: a MockUSBDevice driven directly
+# through WasatchDevice
+@pytest.fixture(scope="module", name="device")
+def device_fixture():
+    device = WasatchDevice(DeviceID(label="MOCK:WP-00887:WP-00887-mock.json"))
+    assert device.connect().data, "unable to connect to MockUSBDevice"
+    yield device
+    device.disconnect()
+
+def acquire_reading(device, attempts=100):
+    for _ in range(attempts):
+        response = device.acquire_data()
+        if response is not None and isinstance(response.data, Reading):
+            return response.data
+        time.sleep(0.01)
+    assert False, "MockUSBDevice didn't return a Reading"
+
 def disconnect_spec(app,spec):
     spec_obj = app.controller.multispec.get_spectrometer(spec)
     #app.controller.multispec.remove_all()
@@ -0,0 +1,47 @@
+import pytest
+import logging
+
+import numpy
+
+from enlighten.post_processing.AveragingEngine import AveragingEngine
+
+log = logging.getLogger(__name__)
+
+# AveragingEngine's running statistics are compared with numpy's batch mean
+# and standard deviation (ScanAveragingFeature is covered by
+# test_scan_averaging).
+
+class TestAveragingEngine:
+
+    # description: software scan averaging (rolling and exponential) matches batch statistics
+    @pytest.mark.regular
+    def test_rolling_and_exponential(self):
+        rng = numpy.random.default_rng(0)
+        pixels, window = 512, 10
+        spectra = 1000 + 100 * rng.standard_normal((2 * AveragingEngine.RESYNC_WINDOWS * window, pixels))
+
+        engine = AveragingEngine()
+        for i, spectrum in enumerate(spectra):
+            mean, noise, count = engine.add(spectrum, window, mode="rolling")
+            if i in [0, 4, window, len(spectra) - 1]:
+                recent = spectra[max(0, i + 1 - window):i + 1]
+                assert count == len(recent)
+                assert numpy.allclose(mean, recent.mean(axis=0))
+                if count > 1:
+                    assert numpy.allclose(noise, recent.std(axis=0, ddof=1) / numpy.sqrt(count))
+
+        # averaging N spectra improves noise ~sqrt(N)
+        assert 2.5 < 100 / numpy.median(noise) < 3.8
+
+        engine = AveragingEngine()
+        alpha = 2 / (window + 1)
+        weights = (1 - alpha) ** numpy.arange(len(spectra) - 1, -1, -1)
+        weights[1:] *= alpha
+        for spectrum in spectra:
+            mean, noise, count = engine.add(spectrum, window, mode="exponential")
+        assert numpy.allclose(mean, weights @ spectra)
+        assert 2.5 < 100 / numpy.median(noise) < 3.8
+
+        # changing N (or pixel count) restarts
+        mean, noise, count = engine.add(spectra[0], 5, mode="exponential")
+        assert count == 1 and numpy.array_equal(mean, spectra[0])
@@ -0,0 +1,126 @@
+import time
+import pytest
+import logging
+import threading
+
+import numpy
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from wasatch.Reading import Reading
+from wasatch.ProcessedReading import ProcessedReading
+
+from enlighten.device.SpectrometerApplicationState import SpectrometerApplicationState
+from enlighten.post_processing import BaselineCorrectionFeature as baseline_correction_module
+from enlighten.post_processing.BaselineCorrectionFeature import BaselineCorrectionFeature
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+
+log = logging.getLogger(__name__)
+
+# These tests don't launch ENLIGHTEN: BaselineCorrectionFeature is given a
+# minimal Controller, and its baselines are generated by a stub which records
+# which spectra the BaselineWorker fitted.
+
+PIXELS = 100
+
+class BlockingBaseline:
+    """
+    Stands in for BaselineCorrectionFeature.generate_baseline, "fitting" each
+    spectrum (whose pixels all equal its session count) only while release is
+    set, so requests can be queued while the worker is busy.
+    """
+    def __init__(self):
+        self.fitted = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, spectrum, x_axis, spec=None):
+        self.started.set()
+        assert self.release.wait(10)
+        self.fitted.append(int(spectrum[0]))
+        return numpy.ones(len(spectrum))
+
+def make_spectrum(session_count):
+    return numpy.full(PIXELS, float(session_count))
+
+@pytest.fixture(name="feature")
+def feature_fixture(monkeypatch):
+    def get(section, key, default=None):
+        return True if key == "async" else default
+
+    ctl = MagicMock()
+    for getter in [ ctl.config.get, ctl.config.get_bool, ctl.config.get_int, ctl.config.get_float ]:
+        getter.side_effect = get
+    ctl.form.ui.comboBox_baselineCorrection_algo.currentText.return_value = "AirPLS"
+    ctl.form.ui.checkBox_baselineCorrection_enable.isChecked.return_value = True
+    ctl.form.ui.checkBox_baselineCorrection_show.isChecked.return_value = False
+    ctl.generate_x_axis.return_value = numpy.linspace(400, 2000, PIXELS)
+    ctl.processing_engine = ProcessingEngine()
+
+    monkeypatch.setattr(baseline_correction_module, "ScrollStealFilter", lambda widget: None)
+    feature = BaselineCorrectionFeature(ctl)
+    feature.generate_baseline = BlockingBaseline()
+    yield feature
+
+    feature.generate_baseline.release.set()
+    feature.stop()
+
+def wait_for_result(feature, device_id, session_count):
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        with feature.condition:
+            result = feature.results.get(device_id, None)
+        if result is not None and result.session_count == session_count:
+            return result
+        time.sleep(0.01)
+    pytest.fail(f"no baseline from Reading {session_count}")
+
+class TestBaselineCorrection:
+
+    # description: BaselineWorker fits only the latest request, and stale baselines make the caller block
+    @pytest.mark.regular
+    def test_baseline_worker(self, feature):
+        assert feature.use_async and feature.enabled
+        stub = feature.generate_baseline
+        spec = SimpleNamespace(device_id="stub", app_state=SpectrometerApplicationState(None, "stub"))
+        x_axis = feature.ctl.generate_x_axis()
+
+        # nothing to use yet, and the worker is busy with the first while the rest arrive
+        assert feature.get_async_result(spec, make_spectrum(1), x_axis, 1) is None
+        assert stub.started.wait(10)
+        for session_count in [ 2, 3, 4 ]:
+            assert feature.get_async_result(spec, make_spectrum(session_count), x_axis, session_count) is None
+
+        stub.release.set()
+        result = wait_for_result(feature, spec.device_id, 4)
+        assert stub.fitted == [ 1, 4 ]
+
+        # keep the worker busy from here on, so the stored result doesn't change
+        stub.release.clear()
+
+        # a recent-enough baseline is subtracted, labeled with its source Reading
+        reading = Reading()
+        reading.session_count = 6
+        reading.spectrum = make_spectrum(6)
+        pr = ProcessedReading(reading)
+        feature.process(pr, spec)
+        assert pr.baseline_source_session_count == 4
+        assert numpy.allclose(pr.processed, 6 - 1)
+        assert stub.fitted == [ 1, 4 ], "process blocked on a fit"
+
+        # ...but not one too many frames old (or newer than the spectrum)
+        assert feature.get_async_result(spec, make_spectrum(4 + feature.max_age_frames), x_axis, 4 + feature.max_age_frames) is result
+        assert feature.get_async_result(spec, make_spectrum(5 + feature.max_age_frames), x_axis, 5 + feature.max_age_frames) is None
+        assert feature.get_async_result(spec, make_spectrum(3), x_axis, 3) is None
+
+        # ...or too many milliseconds old
+        result.timestamp -= (feature.max_age_ms + 1) / 1000.0
+        assert feature.get_async_result(spec, make_spectrum(5), x_axis, 5) is None
+
+        # ...or from another algo or x-axis
+        result.timestamp = time.monotonic()
+        assert feature.get_async_result(spec, make_spectrum(5), x_axis, 5) is result
+        assert feature.get_async_result(spec, make_spectrum(5), x_axis[:-1], 5) is None
+        feature.current_algo_name = "ALS"
+        assert feature.get_async_result(spec, make_spectrum(5), x_axis, 5) is None
@@ -0,0 +1,49 @@
+import pytest
+import logging
+
+import numpy
+
+from superman.baseline import AirPLS
+
+from enlighten.post_processing.BaselineEngine import BaselineEngine
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+
+log = logging.getLogger(__name__)
+
+# Compares BaselineEngine's AirPLS against superman's own fit, on synthetic
+# fluorescence-plus-peaks spectra.
+
+class TestBaselineEngine:
+
+    # description: BaselineEngine matches superman's AirPLS, then warm-starts subsequent frames
+    @pytest.mark.regular
+    def test_warm_start(self):
+        pixels = 2048
+        px = numpy.arange(pixels, dtype=numpy.float64)
+        rng = numpy.random.default_rng(0)
+
+        def make_spectrum():
+            spectrum = 1000 + 5000 * numpy.exp(-((px - 900) / 800) ** 2) + rng.normal(0, 20, pixels)
+            for peak in [300, 700, 1200, 1700]:
+                spectrum += 8000 * numpy.exp(-0.5 * ((px - peak) / 4.0) ** 2)
+            return spectrum
+
+        algo = AirPLS(smoothness_param=20, max_iters=500, conv_thresh=8e-4)
+        engine = ProcessingEngine()
+        baseline_engine = BaselineEngine()
+
+        spectrum = make_spectrum()
+        expected = numpy.clip(algo.fit(px, spectrum).baseline, -65535, 65535)
+        actual = engine.generate_baseline(algo, spectrum, px, baseline_engine=baseline_engine)
+        assert numpy.allclose(actual, expected)
+
+        factorizations = baseline_engine.factorizations
+        count = 20
+        for _ in range(count):
+            spectrum = make_spectrum()
+            expected = algo.fit(px, spectrum).baseline
+            actual = engine.generate_baseline(algo, spectrum, px, baseline_engine=baseline_engine)
+            assert numpy.max(numpy.abs(actual - expected)) < 0.05 * numpy.max(spectrum)
+
+        log.info(f"AirPLS warm start: {baseline_engine}")
+        assert baseline_engine.factorizations - factorizations < count * factorizations
@@ -0,0 +1,110 @@
+import math
+import time
+import pytest
+import logging
+
+import numpy as np
+
+from enlighten.post_processing.DalaiAdditionalFiles import deconvolution
+
+log = logging.getLogger(__name__)
+
+# The per-call implementation formerly in prep_spectra_X/XM/XS, kept as the
+# reference for accuracy and the baseline for timing.
+def legacy_deconvolute_spectrum(wavenumbers_out, cleaned_spectrum, fwhm):
+    pad_width = 3 # multiples of FWHM
+    maxIter = 25
+
+    cleaned_spectrum = np.array(cleaned_spectrum)
+
+    wavenumberPerPixel = np.diff(wavenumbers_out)
+    wavenumberPerPixel = np.insert(wavenumberPerPixel, 0, wavenumberPerPixel[0])
+    avgWavenumberPerPixel = np.mean(wavenumberPerPixel)
+    avgPixelFWHM = fwhm / avgWavenumberPerPixel
+
+    # pad front and end with first/last pixel
+    padPixels = math.ceil(pad_width * avgPixelFWHM)
+    wavenumberPerPixelPadded = np.append(np.repeat(wavenumberPerPixel[0], padPixels),
+                                         np.append(wavenumberPerPixel, np.repeat(wavenumberPerPixel[-1], padPixels)))
+    pixelFWHM = fwhm / wavenumberPerPixelPadded
+    pixelSigma = pixelFWHM / (2 * math.sqrt(2 * math.log(2)))
+    pixelSigma2 = pixelSigma * pixelSigma
+
+    numPixelPadded = len(wavenumberPerPixelPadded)
+    resolutionH = np.zeros((numPixelPadded, numPixelPadded))
+
+    spectrumPadded = np.append(np.repeat(cleaned_spectrum[0], padPixels),
+                               np.append(cleaned_spectrum, np.repeat(cleaned_spectrum[-1], padPixels)))
+
+    pixels = np.arange(numPixelPadded)
+    for row in pixels:
+        # this produces a H matrix for which the 50th line here (base 0)
+        # corresponds to the 51th line in R (base 1)
+        # is this the reason the spectra are shifted?
+        # resolutionSpectrum = np.exp(-0.5 * np.square(pixels - row) / pixelSigma2[row])
+        # the following makes the H matrix the same as in R - except an extra row 0
+        if pixelSigma2[row] != 0:
+            resolutionSpectrum = np.exp(-0.5 * np.square(pixels - row) / pixelSigma2[row])
+        else:
+            # log.error(f"divide by zero: pixelSigma2[{row}] = {pixelSigma2[row]}")
+            resolutionSpectrum = 1
+        resolutionH[row,] = resolutionSpectrum / np.sum(resolutionSpectrum)
+
+    origSpectrumPadded = np.array([max(0, x) for x in spectrumPadded])
+    eps = 1e-5
+    spectrumDeconvPadded = np.array([max(eps, x) for x in origSpectrumPadded])
+
+    for iter in range(maxIter):
+        hTimesX = np.matmul(resolutionH, spectrumDeconvPadded)
+        # orig spectrum padded, extra zero point, otherwise like R
+        yOverHtimesX = origSpectrumPadded / hTimesX
+        # yOverHtimesX is shifted - need to adjust
+        yOverHtimesX = np.append(yOverHtimesX[0], yOverHtimesX[:-1])
+        fullSum = np.dot(np.transpose(resolutionH), yOverHtimesX)
+        spectrumDeconvPadded = spectrumDeconvPadded * fullSum
+        spectrumDeconvPadded = np.array([max(eps, x) for x in spectrumDeconvPadded])
+
+    keepPixels = range(padPixels, len(wavenumbers_out) + padPixels)
+    spectrumDeconv = spectrumDeconvPadded[keepPixels]
+
+    return (spectrumDeconv)
+
+def make_spectrum(pixels=2376, spacing=1.6):
+    wavenumbers = 300 - 184 * spacing + spacing * np.arange(pixels)
+    spectrum = 200 + 20 * np.sin(np.arange(pixels) / 50.0)
+    for center in [500, 1000, 1600, 2200]:
+        spectrum += 5000 * np.exp(-0.5 * ((wavenumbers - center) / 6.0) ** 2)
+    return wavenumbers, spectrum
+
+class TestDalaiDeconvolution:
+
+    # description: cached, vectorized DALAI deconvolution matches the original at two pixel spacings
+    @pytest.mark.regular
+    def test_matches_legacy(self):
+        for spacing, fwhm in [(1.6, 10.0), (1.0, 12.0)]:
+            wavenumbers, spectrum = make_spectrum(spacing=spacing)
+
+            start = time.perf_counter()
+            expected = legacy_deconvolute_spectrum(wavenumbers, spectrum, fwhm)
+            legacy_sec = time.perf_counter() - start
+
+            deconvolution.deconvolute_spectrum(wavenumbers, spectrum, fwhm) # populate cache
+            count = 10
+            start = time.perf_counter()
+            for _ in range(count):
+                actual = deconvolution.deconvolute_spectrum(wavenumbers, spectrum, fwhm)
+            cached_sec = (time.perf_counter() - start) / count
+
+            log.info(f"DALAI deconvolution ({len(spectrum)} px, FWHM {fwhm}): legacy {legacy_sec * 1000:.1f}ms, cached {cached_sec * 1000:.2f}ms ({legacy_sec / cached_sec:.1f}x)")
+            assert np.allclose(actual, expected, rtol=1e-6, atol=1e-6)
+
+            dense = deconvolution.deconvolute_spectrum(wavenumbers, spectrum, fwhm, banded=False)
+            assert np.allclose(dense, expected, rtol=1e-9, atol=1e-9)
+
+    # description: the resolution kernel is reused for the same axis, FWHM and pad width
+    @pytest.mark.regular
+    def test_kernel_cached(self):
+        wavenumbers, _ = make_spectrum()
+        first = deconvolution.get_resolution_kernel(wavenumbers, 10.0)
+        assert deconvolution.get_resolution_kernel(wavenumbers.copy(), 10.0) is first
+        assert deconvolution.get_resolution_kernel(wavenumbers, 11.0) is not first
@@ -0,0 +1,55 @@
+import pytest
+import logging
+
+import numpy
+
+from wasatch.ProcessedReading import ProcessedReading
+
+from enlighten.post_processing.DespikingEngine import DespikingEngine
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+
+log = logging.getLogger(__name__)
+
+# Cosmic-ray removal on synthetic spectra with known spikes, including a real
+# peak narrow enough to be mistaken for one.
+
+class TestDespikingEngine:
+
+    # description: despiking removes cosmic rays; temporal mode leaves sharp real peaks alone
+    @pytest.mark.regular
+    def test_despiking(self):
+        rng = numpy.random.default_rng(0)
+        pixels = 1024
+        x = numpy.arange(pixels)
+        clean = 1000 + 5000 * numpy.exp(-0.5 * ((x - 300) / 8) ** 2) + 20000 * numpy.exp(-0.5 * ((x - 700) / 0.7) ** 2)
+        frames = [ clean + rng.normal(0, 10, pixels) for _ in range(6) ]
+
+        spiky = frames[-1].copy()
+        spiky[[100, 300, 301, 850]] += [ 3000, 4000, 2500, 150 ] # last is within 15 sigma of the noise
+
+        # spectral: obvious spikes are removed, but so is the narrow real peak
+        despiked, mask = DespikingEngine().despike(spiky, mode="spectral")
+        assert mask[100] and mask[300]
+        assert abs(despiked[100] - clean[100]) < 50
+        assert mask[700]
+
+        # temporal: every spike (even small ones) removed, real peaks untouched
+        engine = DespikingEngine()
+        for frame in frames[:-1]:
+            engine.despike(frame, mode="temporal")
+        despiked, mask = engine.despike(spiky, mode="temporal")
+        assert set(numpy.flatnonzero(mask)) == { 100, 300, 301, 850 }
+        assert numpy.all(numpy.abs(despiked - clean) < 60)
+        assert numpy.array_equal(despiked[~mask], spiky[~mask])
+
+        # a scene change restarts the history (falling back to spectral) rather
+        # than "despiking" the new spectrum to the old one
+        despiked, mask = engine.despike(spiky * 2, mode="temporal")
+        assert engine.resets == 1
+        assert numpy.array_equal(despiked, DespikingEngine().despike(spiky * 2)[0])
+
+        # as a stage of the chain (on the cropped spectrum)
+        pr = ProcessedReading()
+        pr.set_processed(spiky.tolist())
+        assert ProcessingEngine().despike(pr) > 0
+        assert abs(pr.get_processed()[100] - clean[100]) < 50
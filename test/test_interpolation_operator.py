@@ -0,0 +1,59 @@
+import time
+import pytest
+import logging
+
+import numpy
+
+from wasatch.ProcessedReading import ProcessedReading
+
+from enlighten.post_processing.InterpolationOperator import InterpolationOperator, get_interpolation_operator
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+
+log = logging.getLogger(__name__)
+
+# The cached sparse interpolation operator is compared with np.interp, alone
+# and through ProcessingEngine.interpolate_batch.
+
+class TestInterpolationOperator:
+
+    # description: cached interpolation operator matches np.interp, batched across ProcessedReadings
+    @pytest.mark.regular
+    def test_operator(self):
+        rng = numpy.random.default_rng(0)
+        old_axis = numpy.sort(rng.uniform(500, 1000, 1024))
+        new_axis = numpy.arange(450, 1050, 0.25) # extends past both ends
+        spectra = rng.normal(1000, 100, (4, 1024))
+
+        op = get_interpolation_operator(old_axis, new_axis)
+        assert op is get_interpolation_operator(old_axis.copy(), new_axis.copy())
+        expected = numpy.array([ numpy.interp(new_axis, old_axis, s) for s in spectra ])
+        assert numpy.allclose(op.apply(spectra), expected)
+        assert numpy.allclose(op.apply(spectra[0]), expected[0])
+        assert numpy.allclose(InterpolationOperator(old_axis[::-1], new_axis).apply(spectra[0]), numpy.interp(new_axis, old_axis[::-1], spectra[0]))
+
+        prs = []
+        for s in spectra:
+            pr = ProcessedReading()
+            pr.processed = s
+            pr.raw = s + 100
+            pr.dark = numpy.full(1024, 100.0)
+            pr.wavelengths = old_axis
+            prs.append(pr)
+
+        engine = ProcessingEngine()
+        results = engine.interpolate_batch(prs, new_axis, save=False)
+        for pr, interpolated, e in zip(prs, results, expected):
+            assert pr.interpolated is None
+            assert numpy.allclose(interpolated.processed, e)
+            assert numpy.allclose(interpolated.raw, e + 100)
+            assert numpy.allclose(interpolated.dark, 100)
+            assert interpolated.reference is None
+
+        start = time.perf_counter()
+        for pr in prs * 25:
+            engine.interpolate(pr, new_axis)
+        elapsed_single = time.perf_counter() - start
+        start = time.perf_counter()
+        engine.interpolate_batch(prs * 25, new_axis)
+        elapsed_batch = time.perf_counter() - start
+        log.info(f"interpolated 100 ProcessedReadings in {1000 * elapsed_single:.1f}ms individually, {1000 * elapsed_batch:.1f}ms batched")
@@ -0,0 +1,336 @@
+import os
+import shutil
+import time
+import pytest
+import logging
+import threading
+
+import numpy
+
+from scipy.stats import pearsonr
+from unittest.mock import MagicMock
+
+from wasatch.Reading import Reading
+from wasatch.ProcessedReading import ProcessedReading
+
+from enlighten.post_processing import LibraryMatchingFeature as library_matching_module
+from enlighten.post_processing.CompiledLibrary import CompiledLibrary
+from enlighten.post_processing.LibraryIndex import LibraryIndex
+from enlighten.post_processing.Pearson import Pearson
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+
+log = logging.getLogger(__name__)
+
+# These tests don't launch ENLIGHTEN: they match synthetic samples against the
+# bundled "distribution" library (enlighten/assets/example_data).
+
+DIST_LIBRARY_DIR = os.path.join(os.path.dirname(__file__), "..", "enlighten", "assets", "example_data", "default_matching_library")
+
+def legacy_scores(library, wavenumbers, spectrum):
+    """ the original per-compound loop: interpolate the sample onto each library axis, then pearsonr """
+    scores = []
+    for x, y in library:
+        subset = (x >= wavenumbers.min()) & (x <= wavenumbers.max())
+        scores.append(pearsonr(y[subset], numpy.interp(x[subset], wavenumbers, spectrum))[0])
+    return numpy.array(scores)
+
+@pytest.fixture(scope="module", name="pearson")
+def pearson_fixture():
+    pearson = Pearson(dist_library_dir=DIST_LIBRARY_DIR, min_score=0.5)
+    pearson.lazy_load_library()
+    assert len(pearson.library) > 0, "unable to load default_matching_library"
+    return pearson
+
+def make_sample(pearson, index, lo, hi, rng):
+    """ @returns (wavenumbers, spectrum) of library compound index on a different axis, plus baseline and noise """
+    row = pearson.library.matrix[index]
+    region = slice(pearson.library.start[index], pearson.library.end[index])
+    wavenumbers = numpy.linspace(lo, hi, 1013)
+    spectrum = 5000 * numpy.interp(wavenumbers, pearson.library.grid[region], row[region]) + 1000
+    return wavenumbers, spectrum + rng.normal(0, 20, len(spectrum))
+
+class StubPearson:
+    """
+    Records what it is asked to do, "matching" each spectrum to a compound 
+    named for its first pixel. The first spectrum isn't matched until 
+    release is set, so requests can be queued while the worker is busy.
+    """
+    NAME = "Stub"
+
+    def __init__(self, **kwargs):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.worker_only = True
+        self.best_library_wavenumbers = None
+        self.best_library_spectrum = None
+        self.mixture_result = None
+        self.mixture_residual = None
+
+    def reset(self):
+        self.worker_only &= threading.current_thread() is not threading.main_thread()
+        self.calls.append("reset")
+
+    def process(self, wavenumbers, spectrum):
+        self.worker_only &= threading.current_thread() is not threading.main_thread()
+        self.started.set()
+        assert self.release.wait(10)
+
+        compound = f"compound {int(spectrum[0])}"
+        self.calls.append(compound)
+        self.best_library_wavenumbers = wavenumbers
+        self.best_library_spectrum = spectrum
+        return [ compound ], [ 0.9 ]
+
+def make_processed_reading(session_count):
+    reading = Reading()
+    reading.session_count = session_count
+    reading.spectrum = numpy.full(100, float(session_count))
+    pr = ProcessedReading(reading)
+    pr.wavenumbers = numpy.linspace(400, 2000, 100)
+    return pr
+
+def snapshot(pr):
+    return { k: (v.tolist() if isinstance(v, numpy.ndarray) else v) for k, v in vars(pr).items() }
+
+@pytest.fixture(name="feature")
+def feature_fixture(tmp_path, monkeypatch):
+    def get(section, key, default=None):
+        return str(tmp_path) if key == "user_library_dir" else default
+
+    ctl = MagicMock()
+    ctl.config.get.side_effect = get
+    ctl.config.get_bool.side_effect = get
+    ctl.config.get_int.side_effect = get
+    ctl.config.get_float.side_effect = get
+    ctl.processing_engine = ProcessingEngine()
+
+    monkeypatch.setattr(library_matching_module, "Pearson", StubPearson)
+    feature = library_matching_module.LibraryMatchingFeature(ctl)
+    yield feature
+    feature.pearson.release.set()
+    feature.stop()
+
+class TestLibraryMatching:
+
+    # description: compiled single-product scores match the legacy per-compound pearsonr loop
+    @pytest.mark.regular
+    def test_compiled_scores(self, pearson):
+        rng = numpy.random.default_rng(0)
+        library = pearson.library
+        rows = [ (library.grid[s:e], library.matrix[i, s:e].astype(numpy.float64)) for i, (s, e) in enumerate(zip(library.start, library.end)) ]
+
+        # sample wider than the library, and narrower (partial overlap)
+        for lo, hi in [ (200, 2500), (700, 1800) ]:
+            wavenumbers, spectrum = make_sample(pearson, 7, lo, hi, rng)
+            scores = library.score(wavenumbers, spectrum)
+            assert numpy.allclose(scores, legacy_scores(rows, wavenumbers, spectrum), atol=1e-4)
+            assert numpy.argmax(scores) == 7
+
+        # no overlap at all
+        assert numpy.all(numpy.isnan(library.score(numpy.linspace(5000, 6000, 100), numpy.ones(100))))
+
+    # description: compounds with different axes and ranges share one grid, scoring as the per-compound loop does
+    @pytest.mark.regular
+    def test_irregular_library(self):
+        names, spectra = [], []
+        for i in range(200):
+            x = numpy.arange(200 + i, 2000 + 2 * i, 0.8 + 0.004 * i)
+            names.append(f"compound {i}")
+            spectra.append((x, numpy.exp(-0.5 * ((x - 300 - 7 * i) / 15) ** 2) + 0.2 * numpy.exp(-0.5 * ((x - 1500) / 400) ** 2)))
+        spectra.append(([ 1, 2 ], [ 1, 2 ])) # too short to use
+        names.append("unusable")
+
+        library = CompiledLibrary(names, spectra)
+        assert len(library) == 200 and "unusable" not in library.names
+
+        wavenumbers = numpy.linspace(600, 1900, 1024)
+        spectrum = numpy.exp(-0.5 * ((wavenumbers - 1000) / 15) ** 2) + 0.2 * numpy.exp(-0.5 * ((wavenumbers - 1500) / 400) ** 2)
+        scores = library.score(wavenumbers, spectrum)
+        expected = legacy_scores([ (numpy.asarray(x), numpy.asarray(y)) for x, y in spectra[:200] ], wavenumbers, spectrum)
+        assert numpy.argmax(scores) == numpy.argmax(expected) == 100
+        assert numpy.allclose(scores, expected, atol=0.01)
+
+        count = 100
+        start = time.perf_counter()
+        for _ in range(count):
+            library.score(wavenumbers, spectrum)
+        compiled = (time.perf_counter() - start) / count
+
+        start = time.perf_counter()
+        legacy_scores([ (numpy.asarray(x), numpy.asarray(y)) for x, y in spectra[:200] ], wavenumbers, spectrum)
+        legacy = time.perf_counter() - start
+
+        log.info(f"scored {len(library)} compounds in {compiled * 1000:.2f}ms compiled vs {legacy * 1000:.2f}ms legacy")
+
+    # description: Pearson reports sorted matches and a scaled best-match curve
+    @pytest.mark.regular
+    def test_pearson_process(self, pearson):
+        wavenumbers, spectrum = make_sample(pearson, 12, 250, 2400, numpy.random.default_rng(2))
+        compounds, scores = pearson.process(wavenumbers, spectrum)
+
+        assert compounds[0] == pearson.library.names[12]
+        assert scores == sorted(scores, reverse=True) and min(scores) >= pearson.min_score
+        assert len(pearson.best_library_wavenumbers) == len(pearson.best_library_spectrum)
+        assert numpy.isclose(max(pearson.best_library_spectrum), numpy.interp(pearson.best_library_wavenumbers, wavenumbers, spectrum).max())
+
+    # description: LibraryCache re-parses only changed CSVs, memory-maps the rest, and appends added spectra
+    @pytest.mark.regular
+    def test_library_cache(self, tmp_path, monkeypatch):
+        library_dir = tmp_path / "library"
+        library_dir.mkdir()
+        filenames = sorted(os.listdir(DIST_LIBRARY_DIR))[:6]
+        for filename in filenames[:5]:
+            shutil.copy(os.path.join(DIST_LIBRARY_DIR, filename), library_dir)
+
+        parsed = []
+        load_entry = Pearson.load_entry
+
+        def counting_load_entry(self, pathname, name, stat=None):
+            parsed.append(name)
+            return load_entry(self, pathname, name, stat)
+        monkeypatch.setattr(Pearson, "load_entry", counting_load_entry)
+
+        def load():
+            parsed.clear()
+            pearson = Pearson(user_library_dir=str(library_dir), cache_dir=str(tmp_path / "cache"))
+            pearson.lazy_load_library()
+            return pearson
+
+        first = load()
+        assert len(first.library) == 5 and len(parsed) == 5
+
+        # nothing changed: compiled matrix is mapped straight from the cache
+        second = load()
+        assert parsed == []
+        assert isinstance(second.library.matrix, numpy.memmap)
+        assert second.library.names == first.library.names
+        assert numpy.array_equal(second.library.matrix, first.library.matrix)
+
+        # one file changed: only it is re-parsed
+        changed = library_dir / filenames[0]
+        changed.write_text(changed.read_text() + "\n")
+        third = load()
+        assert parsed == [ filenames[0].removesuffix(".csv") + "*" ]
+        assert numpy.allclose(third.library.matrix, first.library.matrix)
+
+        # added spectra are appended (parsing only the new file), and cached for the next session
+        pathname = str(library_dir / filenames[5])
+        shutil.copy(os.path.join(DIST_LIBRARY_DIR, filenames[5]), pathname)
+        parsed.clear()
+        third.add_to_library(pathname)
+        assert len(parsed) == 1
+        assert len(third.library) == 6 and third.library.names[-1] == filenames[5].removesuffix(".csv") + "*"
+
+        fourth = load()
+        assert parsed == []
+        assert fourth.library.names == third.library.names
+
+    # description: LibraryIndex pre-filter recalls the exact top matches of default_matching_library (recall and latency are logged)
+    @pytest.mark.regular
+    def test_prefilter_recall(self, pearson):
+        library = pearson.library
+        index = LibraryIndex(library, dimensions=32)
+        candidates, max_results = 10, 2
+
+        # each compound, contaminated by another, on a different axis
+        rng = numpy.random.default_rng(3)
+        queries = []
+        for i in range(len(library)):
+            other = rng.integers(len(library))
+            wavenumbers, spectrum = make_sample(pearson, i, 350, 2250, rng)
+            queries.append((wavenumbers, spectrum + rng.uniform(500, 2500) * numpy.interp(wavenumbers, library.grid, library.matrix[other])))
+
+        found = expected = 0
+        brute = filtered = 0
+        for wavenumbers, spectrum in queries:
+            start = time.perf_counter()
+            scores = library.score(wavenumbers, spectrum)
+            brute += time.perf_counter() - start
+
+            start = time.perf_counter()
+            resampled = library.resample(wavenumbers, spectrum)
+            indices = index.candidates(*resampled, candidates)
+            exact = library.score_resampled(*resampled, indices=indices)
+            filtered += time.perf_counter() - start
+
+            top = [ i for i in numpy.argsort(-scores)[:max_results] if scores[i] >= 0.65 ]
+            expected += len(top)
+            found += len(set(top) & set(indices))
+            assert numpy.allclose(exact, scores[indices])
+
+        recall = found / expected
+        log.info(f"pre-filter top-{candidates} of {len(library)} ({len(index.components)} dimensions): recall {recall:.3f} " + 
+                 f"over {expected} matches, {filtered / len(queries) * 1000:.3f}ms vs {brute / len(queries) * 1000:.3f}ms brute-force")
+        assert recall >= 0.95
+
+        # Pearson only pre-filters libraries bigger than prefilter_candidates
+        matcher = Pearson(dist_library_dir=DIST_LIBRARY_DIR, prefilter_candidates=candidates)
+        matcher.lazy_load_library()
+        assert matcher.index is not None
+        compounds, scores = matcher.process(*queries[5])
+        assert compounds == pearson.process(*queries[5])[0][:len(compounds)]
+
+    # description: NNLS mixture of the top candidates recovers component fractions
+    @pytest.mark.regular
+    def test_mixture(self, pearson):
+        library = pearson.library
+        rng = numpy.random.default_rng(4)
+        matcher = Pearson(dist_library_dir=DIST_LIBRARY_DIR, mixture=True, mixture_candidates=8)
+        matcher.lazy_load_library()
+
+        # in the second, the minor component doesn't score in the top 8 on its own
+        for a, b, fraction in [ (20, 45, 0.7), (3, 50, 0.6) ]:
+            region = slice(max(library.start[a], library.start[b]), min(library.end[a], library.end[b]))
+            wavenumbers = numpy.asarray(library.grid[region])
+            spectrum = 5000 * (fraction * library.matrix[a, region] + (1 - fraction) * library.matrix[b, region]) + 1000
+            spectrum += rng.normal(0, 2, len(spectrum))
+
+            start = time.perf_counter()
+            matcher.process(wavenumbers, spectrum)
+            elapsed = time.perf_counter() - start
+
+            fractions = { m["Name"]: m["Fraction"] for m in matcher.mixture_result }
+            log.info(f"mixture of {len(library)}-compound library: {matcher.mixture_result} (residual {matcher.mixture_residual:.4f}) in {elapsed * 1000:.2f}ms")
+            assert abs(fractions[library.names[a]] - fraction) < 0.02
+            assert abs(fractions[library.names[b]] - (1 - fraction)) < 0.02
+            assert matcher.mixture_residual < 0.05
+            assert [ m["Fraction"] for m in matcher.mixture_result ] == sorted(fractions.values(), reverse=True)
+
+        # a pure compound is (almost) all one component
+        fractions, residual, _ = library.unmix(library.matrix[a].astype(numpy.float64), 0, len(library.grid), [ a, b ])
+        assert fractions[0] > 0.99 and residual < 0.01
+
+    # description: MatchingWorker discards stale requests, always matches the latest, and leaves ProcessedReadings alone
+    @pytest.mark.regular
+    def test_matching_worker(self, feature):
+        pearson = feature.pearson
+        prs = [ make_processed_reading(i) for i in range(4) ]
+        before = [ snapshot(pr) for pr in prs ]
+
+        # the worker is busy with the first while the rest arrive
+        feature.request(prs[0])
+        assert pearson.started.wait(10)
+        pearson.calls.clear() # set_library_dir's initial reset
+        for pr in prs[1:]:
+            feature.request(pr)
+
+        # changes to Pearson are queued (not waiting on the match) for the next
+        feature.edit_pearson(pearson.reset)
+        assert "reset" not in pearson.calls
+
+        pearson.release.set()
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            with feature.condition:
+                result = feature.result
+                idle = feature.pending is None
+            if idle and result is not None and result.pr is prs[-1]:
+                break
+            time.sleep(0.01)
+
+        assert pearson.calls == [ "compound 0", "reset", "compound 3" ]
+        assert pearson.worker_only
+        assert result.compound == "compound 3" and result.session_count == 3
+        assert list(result.dataframe[' Compound ']) == [ "compound 3" ]
+        assert [ snapshot(pr) for pr in prs ] == before
@@ -0,0 +1,93 @@
+import time
+import pytest
+import logging
+
+import numpy
+
+from contextlib import contextmanager
+
+from wasatch.ProcessedReading import ProcessedReading
+from wasatch.utils import apply_boxcar
+
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine, ProcessingOptions
+
+from conftest import acquire_reading
+
+log = logging.getLogger(__name__)
+
+# These tests don't launch ENLIGHTEN: they drive a MockUSBDevice directly
+# through WasatchDevice, and post-process its Readings with ProcessingEngine.
+# The engines behind individual stages have their own test modules.
+
+class TestProcessingEngine:
+
+    # description: dark correction and boxcar match the original (wasatch) math
+    @pytest.mark.regular
+    def test_dark_and_boxcar(self, device):
+        settings = device.settings
+        reading = acquire_reading(device)
+        spectrum = numpy.array(reading.spectrum, dtype=numpy.float64)
+        dark = numpy.full(len(spectrum), 100.0)
+
+        options = ProcessingOptions(horiz_roi=False, boxcar_half_width=3)
+        pr = ProcessingEngine().process(reading, settings, options, dark=dark)
+
+        expected = apply_boxcar(list(spectrum - dark), 3)
+        assert pr.dark_corrected
+        assert numpy.allclose(pr.get_processed(), expected)
+
+    # description: stages run in ENLIGHTEN's order of operations
+    @pytest.mark.regular
+    def test_stage_order(self, device):
+        stages = []
+
+        @contextmanager
+        def timed(stage):
+            stages.append(stage)
+            yield
+
+        reading = acquire_reading(device)
+        ProcessingEngine().process(reading, device.settings, ProcessingOptions(), timed=timed)
+
+        assert stages == [ "correct_dark", "horiz_roi", "despike", "baseline_correction", "richardson_lucy", "boxcar", "interp" ]
+
+    # description: transmission and absorbance (including zero, negative and saturated pixels)
+    @pytest.mark.regular
+    def test_transmission_absorbance(self):
+        def make_pr():
+            pr = ProcessedReading()
+            pr.dark = numpy.full(6, 100.0)
+            pr.reference = numpy.array([ 1100, 1100, 100, 1100, 1100, 1100 ], dtype=numpy.float64)
+            pr.processed = numpy.array([ 500, 1000, 500, 0, -50, 1e-5 ], dtype=numpy.float64)
+            return pr
+
+        engine = ProcessingEngine()
+        pr = make_pr()
+        ok, msg = engine.transmission(pr)
+        assert ok and msg == "measurement out-of-range"
+        assert numpy.allclose(pr.get_processed(), [ 50, 100, 0, 0, -5, 1e-6 ])
+
+        pr = make_pr()
+        ok, msg = engine.absorbance(pr, max_perc=80)
+        assert not ok and msg == "absorbance out-of-range"
+        assert numpy.allclose(pr.get_processed(), [ -numpy.log10(0.5), -numpy.log10(0.8), 0, 0, engine.MAX_AU, engine.MAX_AU ])
+
+    # description: headless throughput of the full chain (spectra/sec are logged)
+    @pytest.mark.regular
+    def test_throughput(self, device):
+        settings = device.settings
+        readings = [ acquire_reading(device) for _ in range(10) ]
+        dark = numpy.full(len(readings[0].spectrum), 100.0)
+
+        x_axis = numpy.arange(settings.pixels(), dtype=numpy.float64)
+        options = ProcessingOptions(richardson_lucy_gaussian=ProcessingEngine().generate_gaussian(x_axis, 5.0), boxcar_half_width=2)
+
+        engine = ProcessingEngine()
+        count = 200
+        start = time.perf_counter()
+        for i in range(count):
+            pr = engine.process(readings[i % len(readings)], settings, options, dark=dark)
+        elapsed = time.perf_counter() - start
+
+        log.info(f"processed {count} spectra of {settings.pixels()} pixels in {elapsed:.3f}sec ({count / elapsed:.1f} spectra/sec)")
+        assert pr.deconvolved
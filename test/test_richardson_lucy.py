@@ -0,0 +1,48 @@
+import time
+import pytest
+import logging
+
+import numpy
+
+from wasatch.ProcessedReading import ProcessedReading
+
+from enlighten.post_processing.BandedKernel import BandedKernel
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+
+log = logging.getLogger(__name__)
+
+# Richardson-Lucy deconvolution with a banded Gaussian kernel, on synthetic
+# spectra with a non-linear wavenumber axis.
+
+class TestRichardsonLucy:
+
+    # description: banded kernel reproduces the dense-matrix deconvolution at 1024-4096 pixels
+    @pytest.mark.regular
+    def test_banded_kernel(self):
+        engine = ProcessingEngine()
+        for pixels in [1024, 2048, 4096]:
+            px = numpy.arange(pixels)
+            wavelengths = 800 + 164.0 * px / pixels + 1e-6 * px * px
+            wavenumbers = 1e7 / 785 - 1e7 / wavelengths
+
+            spectrum = 1000 + 50 * numpy.sin(px / 7.0)
+            for peak in [0.1, 0.35, 0.75]:
+                spectrum += 5e4 * numpy.exp(-0.5 * ((px - peak * pixels) / 3.0) ** 2)
+
+            banded = engine.generate_gaussian(wavenumbers, 10.0)
+            dense = engine.generate_gaussian(wavenumbers, 10.0, banded=False)
+            assert isinstance(banded, BandedKernel)
+            assert numpy.allclose(banded.dense(), dense, rtol=0, atol=1e-8)
+
+            results = {}
+            for name, kernel in [("dense", dense), ("banded", banded)]:
+                start = time.perf_counter()
+                for _ in range(5):
+                    pr = ProcessedReading()
+                    pr.set_processed(spectrum.copy())
+                    engine.deconvolve(pr, kernel, 5)
+                results[name] = (numpy.array(pr.get_processed()), (time.perf_counter() - start) / 5)
+
+            (expected, dense_sec), (actual, banded_sec) = results["dense"], results["banded"]
+            log.info(f"Richardson-Lucy at {pixels} px ({banded}): dense {dense_sec * 1000:.2f}ms, banded {banded_sec * 1000:.2f}ms ({dense_sec / banded_sec:.1f}x)")
+            assert numpy.allclose(actual, expected, rtol=1e-6)
@@ -0,0 +1,97 @@
+import pytest
+import logging
+
+import numpy
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from wasatch.TakeOneRequest import TakeOneRequest
+from wasatch.SpectrometerRequest import SpectrometerRequest
+
+from enlighten.device.SpectrometerApplicationState import SpectrometerApplicationState
+from enlighten.post_processing import ScanAveragingFeature as scan_averaging_module
+from enlighten.post_processing.ScanAveragingFeature import ScanAveragingFeature
+
+from conftest import acquire_reading
+
+log = logging.getLogger(__name__)
+
+# These tests don't launch ENLIGHTEN: ScanAveragingFeature is given a minimal
+# Controller whose only spectrometer is a MockUSBDevice driven directly through
+# WasatchDevice, sharing its SpectrometerSettings as ENLIGHTEN does.
+
+SCANS_TO_AVERAGE = 5
+
+class SingleSpectrometerMultispec:
+    """ the parts of MultispecFeature used by ScanAveragingFeature, for one spectrometer """
+    def __init__(self, spec):
+        self.spec = spec
+
+    def current_spectrometer(self):
+        return self.spec
+
+    def get_spectrometers(self):
+        return [ self.spec ]
+
+    def is_selected(self, device_id):
+        return device_id == self.spec.device_id
+
+    def set_state(self, field, value):
+        setattr(self.spec.settings.state, field, value)
+
+    def set_app_state(self, field, value, all_=False):
+        setattr(self.spec.app_state, field, value)
+
+    def change_device_setting(self, setting, value=0, all_=False):
+        # as dispatched by WrapperWorker
+        self.spec.device.handle_requests([ SpectrometerRequest(setting, args=[value]) ])
+
+@pytest.fixture(name="feature")
+def feature_fixture(device, monkeypatch):
+    spec = SimpleNamespace(device=device, device_id=device.device_id, settings=device.settings,
+                           app_state=SpectrometerApplicationState(None, device.device_id))
+
+    ctl = MagicMock()
+    ctl.config.get.return_value = "rolling"
+    ctl.form.ui.spinBox_scan_averaging.value.return_value = SCANS_TO_AVERAGE
+    ctl.multispec = SingleSpectrometerMultispec(spec)
+
+    monkeypatch.setattr(scan_averaging_module, "ScrollStealFilter", lambda widget: None)
+    feature = ScanAveragingFeature(ctl)
+    yield feature
+
+    # leave the shared device unaveraged
+    device.settings.state.scans_to_average = 1
+
+class TestScanAveraging:
+
+    # description: software averaging stops the driver averaging, and averages every WasatchDevice Reading itself
+    @pytest.mark.regular
+    def test_software_averaging(self, device, feature):
+        spec = feature.ctl.multispec.spec
+        feature.update_from_gui()
+
+        # the driver reads scans_to_average from the (shared) SpectrometerState
+        assert device.settings.state.scans_to_average == 1
+        assert feature.get_scans_to_average(spec) == SCANS_TO_AVERAGE
+        assert feature.enabled(spec)
+
+        raw = []
+        for i in range(2 * SCANS_TO_AVERAGE):
+            reading = acquire_reading(device)
+            assert reading.sum_count <= 1, "driver is still summing"
+            raw.append(numpy.array(reading.spectrum, dtype=numpy.float64))
+
+            reading = feature.process(reading, spec)
+            count = min(i + 1, SCANS_TO_AVERAGE)
+            assert reading.averaged and reading.sum_count == count
+            assert reading.noise is not None
+            assert numpy.allclose(reading.spectrum, numpy.mean(raw[-count:], axis=0))
+            assert not feature.is_partial(spec, reading)
+
+        # TakeOneRequests are left to the driver
+        reading = acquire_reading(device)
+        spectrum = list(reading.spectrum)
+        reading.take_one_request = TakeOneRequest(scans_to_average=SCANS_TO_AVERAGE)
+        assert feature.process(reading, spec).spectrum == spectrum
@@ -0,0 +1,44 @@
+import pytest
+import logging
+
+import numpy
+
+from wasatch.ProcessedReading import ProcessedReading
+from wasatch.utils import apply_boxcar
+
+from scipy.signal import savgol_filter
+
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine
+from enlighten.post_processing.SmoothingEngine import SmoothingEngine
+
+log = logging.getLogger(__name__)
+
+# SmoothingEngine is checked against the reference implementations it
+# replaces (wasatch.utils.apply_boxcar and scipy.signal.savgol_filter).
+
+class TestSmoothingEngine:
+
+    # description: SmoothingEngine matches wasatch boxcar and scipy Savitzky-Golay, smoothing processed/dark/reference jointly
+    @pytest.mark.regular
+    def test_methods(self):
+        rng = numpy.random.default_rng(0)
+        spectra = 1000 + rng.normal(0, 50, (3, 1024))
+        engine = SmoothingEngine()
+
+        for half_width in [1, 2, 5, 12]:
+            boxcar = engine.smooth_2d(spectra, half_width, method="boxcar")
+            sg = engine.smooth_2d(spectra, half_width, method="savitzky_golay", polyorder=3)
+            gaussian = engine.smooth_2d(spectra, half_width, method="gaussian")
+            for i, spectrum in enumerate(spectra):
+                assert numpy.allclose(boxcar[i], apply_boxcar(list(spectrum), half_width))
+                assert numpy.allclose(sg[i], savgol_filter(spectrum, 2 * half_width + 1, min(3, 2 * half_width)))
+            assert numpy.all(numpy.std(gaussian, axis=1) < numpy.std(spectra, axis=1))
+            assert numpy.allclose(engine.smooth_2d(numpy.full((1, 100), 7.0), half_width, method="gaussian"), 7.0)
+
+        pr = ProcessedReading()
+        pr.set_processed(spectra[0].tolist())
+        pr.recordable_dark = spectra[1].tolist()
+        pr.recordable_reference = spectra[2].tolist()
+        ProcessingEngine().boxcar(pr, 3, method="savitzky_golay")
+        for a, spectrum in zip([pr.get_processed(), pr.recordable_dark, pr.recordable_reference], spectra):
+            assert numpy.allclose(a, savgol_filter(spectrum, 7, 2))
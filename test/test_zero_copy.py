@@ -0,0 +1,90 @@
+import pytest
+import logging
+
+import numpy
+
+from wasatch.ROI import ROI
+
+from enlighten.post_processing.ProcessingEngine import ProcessingEngine, ProcessingOptions
+
+from conftest import acquire_reading
+
+log = logging.getLogger(__name__)
+
+# Checks that horizontal ROI cropping (and the getters used when graphing)
+# share memory with the full-detector arrays rather than copying them. Like
+# test_processing_engine, these drive a MockUSBDevice through WasatchDevice.
+
+ROI_START = 100
+ROI_END = 899
+
+@pytest.fixture(name="settings")
+def settings_fixture(device, monkeypatch):
+    monkeypatch.setattr(device.settings.eeprom, "get_horizontal_roi", lambda: ROI(ROI_START, ROI_END))
+    return device.settings
+
+def process(engine, device, settings):
+    options = ProcessingOptions(horiz_roi=True, boxcar_half_width=0)
+    return engine.process(acquire_reading(device), settings, options)
+
+class TestZeroCopy:
+
+    # description: cropped processed and x-axes are views of the full arrays
+    @pytest.mark.regular
+    def test_crop_is_view(self, device, settings):
+        engine = ProcessingEngine()
+        pr = process(engine, device, settings)
+
+        assert pr.is_cropped()
+        assert len(pr.cropped.processed) == ROI_END - ROI_START + 1
+        assert numpy.shares_memory(pr.cropped.processed, pr.processed)
+        assert numpy.shares_memory(pr.cropped.wavelengths, pr.wavelengths)
+        assert numpy.array_equal(pr.cropped.wavelengths, settings.wavelengths[ROI_START:ROI_END + 1])
+        if settings.wavenumbers:
+            assert numpy.shares_memory(pr.cropped.wavenumbers, pr.wavenumbers)
+
+    # description: successive ProcessedReadings share one read-only copy of each x-axis
+    @pytest.mark.regular
+    def test_shared_axes(self, device, settings):
+        engine = ProcessingEngine()
+        pr1 = process(engine, device, settings)
+        pr2 = process(engine, device, settings)
+
+        assert pr1.wavelengths is pr2.wavelengths
+        assert not pr1.wavelengths.flags.writeable
+        assert numpy.shares_memory(pr1.cropped.wavelengths, pr2.cropped.wavelengths)
+
+        # a new wavecal yields a new axis
+        original = settings.wavelengths
+        try:
+            settings.wavelengths = [ x + 1 for x in original ]
+            assert engine.get_axis(settings, "wavelengths")[0] == original[0] + 1
+        finally:
+            settings.wavelengths = original
+        assert engine.get_axis(settings, "wavelengths")[0] == original[0]
+
+    # description: fast getters (used when graphing) return the views themselves
+    @pytest.mark.regular
+    def test_fast_getters(self, device, settings):
+        pr = process(ProcessingEngine(), device, settings)
+
+        assert pr.get_processed(fast=True) is pr.cropped.processed
+        assert pr.get_wavelengths(fast=True) is pr.cropped.wavelengths
+        assert numpy.shares_memory(pr.get_processed(fast=True), pr.processed)
+        assert numpy.shares_memory(pr.get_processed("cropped", fast=True), pr.get_processed("orig", fast=True))
+
+    # description: stages replace cropped arrays rather than writing through the view
+    @pytest.mark.regular
+    def test_copy_on_write(self, device, settings, monkeypatch):
+        engine = ProcessingEngine()
+        pr = process(engine, device, settings)
+        full = pr.processed.copy()
+
+        factors = numpy.linspace(1, 2, settings.pixels())
+        monkeypatch.setattr(settings.eeprom, "has_raman_intensity_calibration", lambda: True)
+        monkeypatch.setattr(settings, "raman_intensity_factors", factors)
+
+        assert engine.correct_raman_intensity(pr, settings)
+        assert numpy.array_equal(pr.processed, full)
+        assert not numpy.shares_memory(pr.cropped.processed, pr.processed)
+        assert numpy.allclose(pr.cropped.processed, full[ROI_START:ROI_END + 1] * factors[ROI_START:ROI_END + 1])